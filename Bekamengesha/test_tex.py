@@ -1,5 +1,20 @@
 import subprocess
 import os
+import shutil
+import sys
+import tempfile
+
+# The LaTeX renderer lives in test_pn
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "test_pn"))
+from latex_render import FORMAT_DIR, ensure_format, format_env
+
+PDF_HEADER = r"""\documentclass{article}
+\usepackage{amsmath}
+\usepackage{amsfonts}
+\usepackage{amssymb}
+\usepackage{graphicx} % For graphics if needed, good to include
+\pagestyle{empty} % No page numbers
+"""
 
 def render_latex_to_pdf(latex_expression, filename="output"):
     """
@@ -10,41 +25,44 @@ def render_latex_to_pdf(latex_expression, filename="output"):
         filename (str): The base name for the output PDF file (e.g., "my_equation").
                         The actual file will be filename.pdf.
     """
-    # Create a minimal LaTeX document
-    latex_document = f"""
-\\documentclass{{article}}
-\\usepackage{{amsmath}}
-\\usepackage{{amsfonts}}
-\\usepackage{{amssymb}}
-\\usepackage{{graphicx}} % For graphics if needed, good to include
-\\pagestyle{{empty}} % No page numbers
-
+    # Create a minimal LaTeX document; the header comes from a precompiled format when one can be built
+    latex_body = f"""
 \\begin{{document}}
 {latex_expression}
 \\end{{document}}
 """
 
-    tex_filename = f"{filename}.tex"
     pdf_filename = f"{filename}.pdf"
+    # Compile in a private directory so concurrent calls never share .tex/.aux/.log files
+    workdir = tempfile.mkdtemp(prefix="render_latex_")
+    tex_path = os.path.join(workdir, "document.tex")
 
     try:
+        format_name = ensure_format("pdflatex", PDF_HEADER, FORMAT_DIR)
+        command = ["pdflatex", "-interaction=nonstopmode"]
+        if format_name:
+            command.append(f"-fmt={format_name}")
+
         # Write the LaTeX document to a .tex file
-        with open(tex_filename, "w") as f:
-            f.write(latex_document)
+        with open(tex_path, "w") as f:
+            f.write(latex_body if format_name else PDF_HEADER + latex_body)
 
-        print(f"LaTeX file '{tex_filename}' created.")
+        print(f"LaTeX file for '{filename}' created.")
 
         # Compile the LaTeX file to PDF using pdflatex
         # We redirect stdout and stderr to avoid cluttering the console
         # You might want to remove this for debugging
         process = subprocess.run(
-            ["pdflatex", "-interaction=nonstopmode", tex_filename],
+            command + ["document.tex"],
+            cwd=workdir,
+            env=format_env(FORMAT_DIR),
             capture_output=True,
             text=True
         )
 
         if process.returncode == 0:
-            print(f"Successfully compiled '{tex_filename}' to '{pdf_filename}'.")
+            shutil.copyfile(os.path.join(workdir, "document.pdf"), pdf_filename)
+            print(f"Successfully compiled '{filename}' to '{pdf_filename}'.")
             # You can optionally open the PDF here
             # For Windows: os.startfile(pdf_filename)
             # For macOS: subprocess.run(["open", pdf_filename])
@@ -55,7 +73,6 @@ def render_latex_to_pdf(latex_expression, filename="output"):
             print(process.stdout)
             print("--- pdflatex stderr ---")
             print(process.stderr)
-            print(f"Check '{filename}.log' for more details.")
 
     except FileNotFoundError:
         print("Error: 'pdflatex' command not found.")
@@ -64,9 +81,7 @@ def render_latex_to_pdf(latex_expression, filename="output"):
         print(f"An unexpected error occurred: {e}")
     finally:
         # Clean up auxiliary files generated by pdflatex
-        for ext in [".aux", ".log", ".out", ".fls", ".fdb_latexmk"]:
-            if os.path.exists(f"{filename}{ext}"):
-                os.remove(f"{filename}{ext}")
+        shutil.rmtree(workdir, ignore_errors=True)
         print(f"Cleaned up auxiliary files for '{filename}'.")
 
 
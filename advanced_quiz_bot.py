@@ -1,3 +1,4 @@
+import asyncio
 import logging
 import os
 import re
@@ -7,6 +8,16 @@ from telegram.ext import Application, CommandHandler, PollAnswerHandler, Context
 from pinecone import Pinecone
 import google.generativeai as genai
 import json
+from mastery import MasteryModel, QuizBank
+from group_quiz import GroupQuiz
+from single_flight import SingleFlight, normalize_key
+from retrieval import speculative_retrieve
+from reranker import rerank
+from context_compression import compress_chunks
+from lexical_index import load_index
+from context_packs import load_packs
+from model_router import router
+from query_planner import planner
 
 # --- 1. SETUP AND INITIALIZATION ---
 
@@ -26,10 +37,30 @@ genai.configure(api_key=GEMINI_API_KEY)
 
 
 # --- Pinecone and Gemini Model Setup ---
-model = genai.GenerativeModel('gemini-2.5-flash')
+# Models are picked per call site by model_router
+router.api_key = GEMINI_API_KEY
 index_name = "biology"
 logging.info(f"Connected to Pinecone for index: {index_name}")
-logging.info("Gemini Model initialized.")
+
+# --- Lexical Index ---
+# BM25 over the same records as Pinecone, fused with dense hits; build it with `python lexical_index.py`
+lexical_index = load_index()
+
+# --- Precomputed Context Packs ---
+# Topics matching a textbook section header skip live retrieval; build them with `python context_packs.py`
+context_packs = load_packs()
+
+# --- Adaptive Quiz State ---
+mastery_model = MasteryModel()
+mastery_model.load()
+quiz_bank = QuizBank()
+quiz_bank.load()
+WEAKNESS_BOOST = 0.2  # Score bonus for chunks from topics the user is weak in
+QUIZ_LENGTH = 5
+
+# --- Request Coalescing ---
+# Identical topics requested at the same time share one retrieval and one quiz generation
+inflight = SingleFlight()
 
 # --- LOGGING FOR QUIZ OUTCOMES ---
 LOG_FILE = "boot.log"
@@ -45,7 +76,13 @@ def log_quiz_result(user_id, chat_id, username, quiz_data):
 async def generate_search_queries(user_query: str) -> list[str]:
     """
     Generates conceptual search queries based on the user's topic.
+    Topics and questions the local query planner can handle skip the model call.
     """
+    planned_queries = planner.plan(user_query)
+    if planned_queries:
+        router.skip("query_expansion", "planned locally")
+        return planned_queries
+
     system_prompt = f"""
     You are a sophisticated query generation expert for a vector database. Your task is to analyze the user's question and generate a conceptual search query.
 
@@ -64,7 +101,7 @@ async def generate_search_queries(user_query: str) -> list[str]:
     **Conceptual Search Queries:**
     """
     try:
-        response = await model.generate_content_async(system_prompt)
+        response = await router.generate("query_expansion", system_prompt)
         queries = [query.strip() for query in response.text.strip().split('\n') if query.strip()]
         logging.info(f"Original query: '{user_query}' | Generated {len(queries)} conceptual queries: {queries}")
         if not queries:
@@ -74,81 +111,87 @@ async def generate_search_queries(user_query: str) -> list[str]:
         logging.error(f"Error during conceptual query generation: {e}")
         return [user_query]
 
-async def process_query_for_context(user_query: str) -> tuple[str, list]:
+async def retrieve_hits(user_query: str) -> list | None:
     """
-    Orchestrates the query workflow to retrieve context from Pinecone.
-    Returns both the context and the source information.
+    Searches every namespace with the raw topic while conceptual queries are generated,
+    then with the conceptual queries unless the raw topic alone was confident enough.
+    Returns the de-duplicated hits, or None if Pinecone could not be reached.
     """
-    search_queries = await generate_search_queries(user_query)
     dense_index = pc.Index(index_name)
-    sources = []  # Store source information
-
     try:
-        index_stats = dense_index.describe_index_stats()
-        namespaces = list(index_stats.namespaces.keys())
+        return await speculative_retrieve(dense_index, user_query, generate_search_queries, PINECONE_API_KEY, lexical_index)
     except Exception as e:
-        logging.error(f"Could not connect to Pinecone index '{index_name}'. Error: {e}")
-        return "", []
+        logging.error(f"Error searching Pinecone index '{index_name}': {e}")
+        return None
 
-    all_hits = []
-    seen_ids = set()
+async def process_query_for_context(user_query: str, user_mastery: dict | None = None) -> tuple[str, list]:
+    """
+    Orchestrates the query workflow to retrieve context from Pinecone.
+    Returns both the context and the source information.
+    If `user_mastery` ({topic: mastery}) is given, chunks from weak topics are ranked higher.
+    Topics that match a section header use its precomputed context pack instead
+    of live retrieval; the weak-topic boost applies to both.
+    """
+    def rank_score(scored_hit):
+        hit, score = scored_hit
+        if user_mastery:
+            topic = hit.get('fields', {}).get('topic')
+            score += WEAKNESS_BOOST * (1 - user_mastery.get(topic, 1.0))
+        return score
+
+    pack_hits = context_packs.lookup(user_query) if context_packs is not None else None
+    if pack_hits:
+        logging.info(f"Using the precomputed context pack for '{user_query}'.")
+        # Pack scores are already normalized to [0, 1], so weak topics get the same boost as after a rerank
+        sorted_hits = sorted(((hit, hit.get('_score', 0)) for hit in pack_hits), key=rank_score, reverse=True)
+    else:
+        all_hits = await inflight.do(("retrieve", normalize_key(user_query)), retrieve_hits, user_query)
+        if not all_hits:
+            return "", []
 
-    try:
-        for query in search_queries:
-            logging.info(f"Searching with conceptual query: '{query}'")
-            for ns in namespaces:
-                results = dense_index.search(
-                    namespace=ns,
-                    query={
-                        "top_k": 5,
-                        "inputs": {
-                            'text': query
-                        }
-                    }
-                )
-
-                for hit in results.get('result', {}).get('hits', []):
-                    doc_id = hit.get('_id')
-                    if doc_id and doc_id not in seen_ids:
-                        seen_ids.add(doc_id)
-                        all_hits.append(hit)
+        # Rerank the merged candidates against the query before boosting weak topics; cross-encoder
+        # inference is CPU-bound, so it runs off the event loop and other chats are not blocked
+        scored_hits = await asyncio.to_thread(rerank, user_query, all_hits)
+        sorted_hits = sorted(scored_hits, key=rank_score, reverse=True)
+    top_4_hits = [hit for hit, _ in sorted_hits[:4]]
 
-    except Exception as e:
-        logging.error(f"Error searching Pinecone index '{index_name}': {e}")
-        return "", []
-
-    if all_hits:
-        sorted_hits = sorted(all_hits, key=lambda k: k.get('_score', 0), reverse=True)
-        top_4_hits = sorted_hits[:4]
-
-        all_contexts = []
-        for hit in top_4_hits:
-            # Store source information
-            source_info = {
-                'id': hit.get('_id'),
-                'score': round(hit.get('_score', 0), 2),
-                'page_number': hit.get('fields', {}).get('page_number', 'N/A'),
-                'topic': hit.get('fields', {}).get('topic', 'N/A')
-            }
-            sources.append(source_info)
-            
-            formatted_result = (
-                f"TEXT_CONTENT: {hit.get('fields', {}).get('chunk_text', 'N/A')}\n\n"
-            )
-            all_contexts.append(formatted_result)
-        
-        full_context = "\n".join(all_contexts)
-        return full_context, sources
-    else:
-        return "", []
+    # Keep only the sentences relevant to the topic, without near-duplicates across chunks
+    compressed = compress_chunks(user_query, [hit.get('fields', {}).get('chunk_text', '') for hit in top_4_hits])
+
+    sources = []  # Store source information
+    all_contexts = []
+    for hit, chunk_text in zip(top_4_hits, compressed):
+        if not chunk_text:
+            continue
+        # Store source information
+        source_info = {
+            'id': hit.get('_id'),
+            'score': round(hit.get('_score', 0), 2),
+            'page_number': hit.get('fields', {}).get('page_number', 'N/A'),
+            'topic': hit.get('fields', {}).get('topic', 'N/A')
+        }
+        sources.append(source_info)
+
+        formatted_result = (
+            f"TEXT_HEADER: {hit.get('fields', {}).get('topic', 'N/A')}\n"
+            f"TEXT_CONTENT: {chunk_text}\n\n"
+        )
+        all_contexts.append(formatted_result)
+
+    full_context = "\n".join(all_contexts)
+    return full_context, sources
 
 async def generate_quiz_from_context(context: str) -> list | None:
     """
     Generates a quiz from the provided context using the Gemini API.
+    Concurrent calls with the same context share one generation, so the result must not be mutated.
     """
+    return await inflight.do(("quiz", context), _generate_quiz, context)
+
+async def _generate_quiz(context: str) -> list | None:
     system_prompt = f"""
-    ->You are a quiz generation AI. Based on the provided context, create a multiple-choice quiz with 5 questions.
-    ->The output must be a valid JSON array of objects, where each object has "question", "options" (an array of 4 strings), and "correct_option_id" (0-indexed integer).
+    ->You are a quiz generation AI. Based on the provided context, create a multiple-choice quiz with {QUIZ_LENGTH} questions.
+    ->The output must be a valid JSON array of objects, where each object has "question", "options" (an array of 4 strings), "correct_option_id" (0-indexed integer) and "topic" (the TEXT_HEADER of the context the question is based on, copied exactly).
     ->You must ask these questions as if you were coming up with them yourself, don't say "as stated in the text..." or "as mentioned in the text..." or anything like that.
     ->Each option(alternative to the quizes) must be less than a 100 characters long.
     **Context:**
@@ -157,7 +200,7 @@ async def generate_quiz_from_context(context: str) -> list | None:
     **JSON Output:**
     """
     try:
-        response = await model.generate_content_async(system_prompt)
+        response = await router.generate("quiz_generation", system_prompt)
         text_response = response.text.strip()
         json_match = re.search(r'\[.*\]', text_response, re.DOTALL)
         if json_match:
@@ -176,7 +219,9 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     await update.message.reply_text(
         "Welcome to the Advanced Quiz Bot!\n\n"
         "To start a quiz on a specific topic, use the command: /quiz <topic>\n"
-        "For example: /quiz cells"
+        "For example: /quiz cells\n\n"
+        "Send /quiz on its own to review the topics you find hardest.\n\n"
+        "In a group, /groupquiz <topic> starts one quiz for everyone and /endquiz shows the final results."
     )
 
 async def quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
@@ -190,9 +235,15 @@ async def quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     else:
         chat_id = context.user_data.get("last_chat_id")
 
+    user_id = update.effective_user.id if update.effective_user else None
+
     if not topic:
-        if chat_id:
-            await context.bot.send_message(chat_id, "Please provide a topic for the quiz. Usage: /quiz <topic>")
+        weak_topics = mastery_model.weakest_topics(user_id) if user_id else []
+        if not weak_topics:
+            if chat_id:
+                await context.bot.send_message(chat_id, "Please provide a topic for the quiz. Usage: /quiz <topic>")
+            return
+        await review_quiz(chat_id, weak_topics, context)
         return
 
     if chat_id:
@@ -202,7 +253,8 @@ async def quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     # Store the topic for potential replay
     context.user_data["current_topic"] = topic
 
-    retrieved_context, sources = await process_query_for_context(topic)
+    user_mastery = mastery_model.snapshot(user_id) if user_id else None
+    retrieved_context, sources = await process_query_for_context(topic, user_mastery)
     if not retrieved_context:
         if chat_id:
             await context.bot.send_message(chat_id, "I'm sorry, I couldn't find enough information to create a quiz on that topic.")
@@ -216,6 +268,37 @@ async def quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
         if chat_id:
             await context.bot.send_message(chat_id, "I'm sorry, I was unable to generate a quiz. Please try another topic.")
         return
+    quiz_bank.add(quiz_questions, default_topic=topic)
+    await start_quiz(chat_id, quiz_questions, context)
+
+async def review_quiz(chat_id: int, weak_topics: list[str], context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Starts a quiz targeting the user's weakest topics, preferring questions from the quiz bank."""
+    if chat_id:
+        await context.bot.send_message(chat_id, f"Starting a review quiz on your weakest topics: {', '.join(weak_topics)}")
+    context.user_data["last_chat_id"] = chat_id
+    context.user_data["current_topic"] = " ".join(weak_topics)
+
+    answered = {answer["question"] for answer in context.user_data.get("answers", []) if answer.get("correct")}
+    quiz_questions = quiz_bank.pick(weak_topics, QUIZ_LENGTH, exclude=answered)
+    context.user_data["sources"] = []
+
+    if len(quiz_questions) < QUIZ_LENGTH:
+        # Top up from the retrieval index using the weak topic headers as the query
+        retrieved_context, sources = await process_query_for_context("; ".join(weak_topics))
+        generated = await generate_quiz_from_context(retrieved_context) if retrieved_context else None
+        if generated:
+            quiz_bank.add(generated, default_topic=weak_topics[0])
+            quiz_questions += generated[:QUIZ_LENGTH - len(quiz_questions)]
+            context.user_data["sources"] = sources
+
+    if not quiz_questions:
+        if chat_id:
+            await context.bot.send_message(chat_id, "I'm sorry, I was unable to build a review quiz. Please try /quiz <topic>.")
+        return
+    await start_quiz(chat_id, quiz_questions, context)
+
+async def start_quiz(chat_id: int, quiz_questions: list, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Resets the user's quiz state and sends the first question."""
     context.user_data["quiz_questions"] = quiz_questions
     context.user_data["current_question"] = 0
     context.user_data["score"] = 0
@@ -243,10 +326,70 @@ async def send_question(chat_id: int, context: ContextTypes.DEFAULT_TYPE) -> Non
             "chat_id": chat_id,
             "correct_option_id": question_data["correct_option_id"],
             "question": question_data["question"],
-            "options": question_data["options"]
+            "options": question_data["options"],
+            "topic": question_data.get("topic") or context.user_data.get("current_topic")
         }
         logging.info(f"Sent question to chat_id {chat_id}")
 
+async def group_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Generates one quiz and posts it to the whole chat, scoring every participant separately."""
+    topic = " ".join(context.args)
+    chat_id = update.effective_chat.id
+    if not topic:
+        await context.bot.send_message(chat_id, "Please provide a topic for the group quiz. Usage: /groupquiz <topic>")
+        return
+
+    running = context.chat_data.get("group_quiz")
+    if running and not running.finished:
+        await context.bot.send_message(chat_id, f"A group quiz on '{running.topic}' is already running. Use /endquiz to finish it first.")
+        return
+
+    await context.bot.send_message(chat_id, f"Generating a group quiz about '{topic}'. This might take a moment...")
+    retrieved_context, sources = await process_query_for_context(topic)
+    quiz_questions = await generate_quiz_from_context(retrieved_context) if retrieved_context else None
+    if not quiz_questions:
+        await context.bot.send_message(chat_id, "I'm sorry, I was unable to generate a quiz. Please try another topic.")
+        return
+    quiz_bank.add(quiz_questions, default_topic=topic)
+
+    session = GroupQuiz(chat_id, topic, quiz_questions, sources)
+    context.chat_data["group_quiz"] = session
+    for question_data in quiz_questions:
+        message = await context.bot.send_poll(
+            chat_id=chat_id,
+            question=question_data["question"],
+            options=question_data["options"],
+            type=Poll.QUIZ,
+            correct_option_id=question_data["correct_option_id"],
+            is_anonymous=False,
+            explanation=f"The correct answer is {question_data['options'][question_data['correct_option_id']]}."
+        )
+        context.bot_data[message.poll.id] = {
+            "chat_id": chat_id,
+            "correct_option_id": question_data["correct_option_id"],
+            "question": question_data["question"],
+            "options": question_data["options"],
+            "topic": question_data.get("topic") or topic,
+            "group_quiz": session
+        }
+    leaderboard = await context.bot.send_message(chat_id, session.render_leaderboard())
+    session.leaderboard_message_id = leaderboard.message_id
+    logging.info(f"Started group quiz on '{topic}' in chat_id {chat_id} with {len(quiz_questions)} questions")
+
+async def end_group_quiz(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
+    """Finishes the running group quiz and posts the final leaderboard."""
+    session = context.chat_data.get("group_quiz")
+    if not session or session.finished:
+        await context.bot.send_message(update.effective_chat.id, "There is no group quiz running in this chat.")
+        return
+    await session.finish(context.bot)
+    log_quiz_result(None, session.chat_id, None, {
+        "group_topic": session.topic,
+        "total_questions": len(session.questions),
+        "scores": {str(user_id): entry for user_id, entry in session.scores.items()},
+        "sources": session.sources
+    })
+
 async def receive_poll_update(update: Update, context: ContextTypes.DEFAULT_TYPE) -> None:
     """Receive the poll answer and send the next question."""
     try:
@@ -256,10 +399,24 @@ async def receive_poll_update(update: Update, context: ContextTypes.DEFAULT_TYPE
         logging.warning(f"Received answer for an unknown poll_id: {update.poll_answer.poll_id}")
         return
 
+    user = update.poll_answer.user
     user_answer_index = update.poll_answer.option_ids[0] if update.poll_answer.option_ids else None
     user_answer = quiz_data["options"][user_answer_index] if user_answer_index is not None else None
     correct = user_answer_index == quiz_data["correct_option_id"]
+    if quiz_data.get("topic"):
+        mastery_model.update(user.id, quiz_data["topic"], correct)
+        mastery_model.maybe_save()
+        quiz_bank.maybe_save()
+
+    session = quiz_data.get("group_quiz")
+    if session is not None:
+        # Group quizzes score every participant here; all questions are already posted
+        if not session.finished and user_answer_index is not None:
+            session.record_answer(user.id, user.username or user.full_name, correct)
+            session.schedule_refresh(context.bot)
+        return
     context.user_data["answers"].append({
+        "topic": quiz_data.get("topic"),
         "question": quiz_data["question"],
         "options": quiz_data["options"],
         "user_answer": user_answer,
@@ -331,16 +488,23 @@ async def button_handler(update: Update, context: ContextTypes.DEFAULT_TYPE) ->
             text="Please use /quiz <topic> to start a new quiz on a different topic."
         )
 
+async def save_adaptive_state(application: Application) -> None:
+    """Persist the mastery model and quiz bank on shutdown."""
+    mastery_model.save()
+    quiz_bank.save()
+
 def main() -> None:
     """Run the bot."""
     if not BOT_TOKEN:
         logging.error("No BOT_TOKEN found in environment variables!")
         return
 
-    application = Application.builder().token(BOT_TOKEN).build()
+    application = Application.builder().token(BOT_TOKEN).post_shutdown(save_adaptive_state).build()
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("quiz", quiz))
+    application.add_handler(CommandHandler("groupquiz", group_quiz))
+    application.add_handler(CommandHandler("endquiz", end_group_quiz))
     application.add_handler(PollAnswerHandler(receive_poll_update))
     application.add_handler(CallbackQueryHandler(button_handler))
 
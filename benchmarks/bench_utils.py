@@ -0,0 +1,108 @@
+import functools
+import inspect
+import json
+import os
+import time
+
+# --- BENCHMARK CONFIGURATION ---
+REGRESSION_TOLERANCE = 0.10  # A stage is flagged when its p95 is this much slower than the baseline
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values: list[float], q: float) -> float:
+    """Nearest-rank percentile; 0.0 for no samples."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(q / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class StageTimer:
+    """Collects wall-clock samples per named stage, by wrapping the functions that implement each stage."""
+
+    def __init__(self):
+        self.samples: dict[str, list[float]] = {}
+
+    def add(self, stage: str, seconds: float) -> None:
+        self.samples.setdefault(stage, []).append(seconds)
+
+    def wrap(self, stage: str, func):
+        """Returns `func` timed under `stage`; works for both coroutine functions and plain functions."""
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.add(stage, time.perf_counter() - started)
+            return timed_async
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(stage, time.perf_counter() - started)
+        return timed
+
+    def patch(self, owner, name: str, stage: str | None = None) -> None:
+        """Replaces `owner.name` with a timed wrapper, so callers that look it up at call time are measured."""
+        setattr(owner, name, self.wrap(stage or name, getattr(owner, name)))
+
+
+def summarize(samples: dict[str, list[float]], wall_seconds: float, completed: int) -> dict:
+    stages = {}
+    for stage, values in sorted(samples.items()):
+        stages[stage] = {"count": len(values), **{f"p{q}": percentile(values, q) for q in PERCENTILES}}
+    return {
+        "stages": stages,
+        "completed": completed,
+        "wall_seconds": wall_seconds,
+        "throughput": completed / wall_seconds if wall_seconds else 0.0,
+    }
+
+
+def load_baseline(path: str) -> dict | None:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, summary: dict, settings: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"settings": settings, **summary}, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def print_report(summary: dict, baseline: dict | None = None, tolerance: float = REGRESSION_TOLERANCE) -> list[str]:
+    """Prints per-stage percentiles (in ms) with the change against `baseline`; returns the regressed stages."""
+    base_stages = (baseline or {}).get("stages", {})
+    regressions = []
+    print(f"{'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'p95 vs base':>14}")
+    for stage, stats in summary["stages"].items():
+        change = ""
+        base = base_stages.get(stage)
+        if base and base.get("p95"):
+            delta = (stats["p95"] - base["p95"]) / base["p95"]
+            change = f"{delta:+.0%}"
+            if delta > tolerance:
+                regressions.append(stage)
+                change += " !"
+        print(
+            f"{stage:<28}{stats['count']:>7}"
+            f"{stats['p50'] * 1000:>10.1f}{stats['p95'] * 1000:>10.1f}{stats['p99'] * 1000:>10.1f}{change:>14}"
+        )
+    line = f"throughput: {summary['throughput']:.2f} req/s ({summary['completed']} in {summary['wall_seconds']:.2f}s)"
+    if baseline and baseline.get("throughput"):
+        line += f", baseline {baseline['throughput']:.2f} req/s"
+    print(line)
+    if baseline is None:
+        print("No baseline to compare against; run with --save-baseline to store one.")
+    elif regressions:
+        print(f"Regressions over {tolerance:.0%}: {', '.join(regressions)}")
+    return regressions
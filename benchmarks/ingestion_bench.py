@@ -0,0 +1,290 @@
+"""
+Ingestion throughput benchmark over the bundled sample PDF.
+
+Runs each extraction stage the ingestion scripts use against
+pdf_files/2017 Bio EUEE @BrightAcademy9_12.pdf and reports pages/sec,
+MB/sec, peak RSS and traced allocation peak per stage. Peak RSS is a
+process-wide high-water mark, so each stage's is taken from a fresh
+process that runs only that stage. The LLM is stubbed, so only local work
+is measured and no API key is needed.
+
+    python benchmarks/ingestion_bench.py
+    python benchmarks/ingestion_bench.py --repeat 5 --save-baseline
+    python benchmarks/ingestion_bench.py --stages preprocess_text chunk_text_by_paragraph --check
+"""
+import argparse
+import functools
+import importlib.util
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+
+# Shared helpers live at the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.join(REPO_ROOT, "parse_pdf"))  # The extract scripts import their sibling modules
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_utils import REGRESSION_TOLERANCE, load_baseline, percentile, save_baseline
+
+# --- BENCHMARK CONFIGURATION ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+SAMPLE_PDF = os.path.join(REPO_ROOT, "pdf_files", "2017 Bio EUEE @BrightAcademy9_12.pdf")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines", "ingestion.json")
+MAX_CHARS_PER_CALL = 90000   # Same batch size extract_text.py sends to the model
+SENTENCES_PER_CHUNK = 5
+OVERLAP_SENTENCES = 1
+STUB_RESPONSE = "[]"
+
+
+@functools.lru_cache(maxsize=None)
+def load_script(relative_path: str, name: str):
+    """Imports a repository script by path, once; several share names (parse_pdf.py, prac.py) across folders."""
+    spec = importlib.util.spec_from_file_location(name, os.path.join(REPO_ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def stub_llm() -> None:
+    """Answers every model call with an empty JSON list instead of calling Gemini."""
+    from model_router import router
+    router.generate_sync = lambda site, prompt, api_key=None, **kwargs: SimpleNamespace(text=STUB_RESPONSE)
+
+
+def peak_rss_mb() -> float:
+    # On Linux, ru_maxrss survives exec, so a spawned child would report its parent's peak; VmHWM does not
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+# --- STAGES ---
+# Each stage takes the shared inputs and returns (pages processed, bytes processed, output).
+
+def stage_pdfplumber_marked(inputs):
+    import pdfplumber
+    extract_text = load_script("parse_pdf/extract_text.py", "extract_text")
+    with pdfplumber.open(inputs.pdf_path) as pdf:
+        pages = pdf.pages[:inputs.max_pages]
+        text = extract_text.extract_and_mark_page_text(pages)
+    return len(pages), inputs.pdf_bytes, text
+
+
+def stage_pdfplumber_pages(inputs):
+    import pdfplumber
+    extract_tables = load_script("parse_pdf/extract_tables.py", "extract_tables")
+    with pdfplumber.open(inputs.pdf_path) as pdf:
+        pages = pdf.pages[:inputs.max_pages]
+        text = extract_tables.extract_text_from_pages(pages)
+    return len(pages), inputs.pdf_bytes, text
+
+
+def stage_segmenter(inputs):
+    import pdfplumber
+    layout = load_script("parse_pdf/layout.py", "layout")
+    with pdfplumber.open(inputs.pdf_path) as pdf:
+        pages = pdf.pages[:inputs.max_pages]
+        records, _ = layout.segment_sections((page.page_number, layout.page_lines(page)) for page in pages)
+    return len(pages), inputs.pdf_bytes, records
+
+
+def stage_pypdf2(inputs):
+    parse_pdf = load_script("training_repo/parse_pdf.py", "training_parse_pdf")
+    if inputs.max_pages is None:
+        text = parse_pdf.extract_text_from_pdf(inputs.pdf_path)
+    else:
+        # extract_text_from_pdf always reads the whole file; stop its page iterator at --pages instead
+        texts = []
+        for number, page_text in parse_pdf.iter_pdf_pages(inputs.pdf_path):
+            if number > inputs.max_pages:
+                break
+            texts.append(page_text)
+            if number == inputs.max_pages:
+                break
+        text = "".join(texts)
+    return inputs.page_count, inputs.pdf_bytes, text
+
+
+def stage_llm_batches(inputs):
+    extract_text = load_script("parse_pdf/extract_text.py", "extract_text")
+    text = inputs.marked_text
+    results = []
+    for i in range(0, len(text), MAX_CHARS_PER_CALL):
+        results.append(extract_text.get_structured_data_from_gemini("offline-benchmark", text[i:i + MAX_CHARS_PER_CALL]))
+    return inputs.page_count, len(text.encode("utf-8")), results
+
+
+def stage_preprocess(inputs):
+    pocess_json = load_script("parse_pdf/pocess_json.py", "pocess_json")
+    processed = [pocess_json.preprocess_text(page) for page in inputs.page_texts]
+    return inputs.page_count, sum(len(page.encode("utf-8")) for page in inputs.page_texts), processed
+
+
+def stage_chunking(inputs):
+    parse_pdf = load_script("training_repo/parse_pdf.py", "training_parse_pdf")
+    chunks = parse_pdf.chunk_text_by_paragraph(inputs.plain_text, SENTENCES_PER_CHUNK, OVERLAP_SENTENCES)
+    return inputs.page_count, len(inputs.plain_text.encode("utf-8")), chunks
+
+
+SCRIPTS = [
+    ("parse_pdf/extract_text.py", "extract_text"),
+    ("parse_pdf/extract_tables.py", "extract_tables"),
+    ("parse_pdf/layout.py", "layout"),
+    ("parse_pdf/pocess_json.py", "pocess_json"),
+    ("training_repo/parse_pdf.py", "training_parse_pdf"),
+]
+
+STAGES = {
+    "pdfplumber extract_and_mark_page_text": stage_pdfplumber_marked,
+    "pdfplumber extract_text_from_pages": stage_pdfplumber_pages,
+    "section segmenter (layout + headers)": stage_segmenter,
+    "pypdf2 extract_text_from_pdf": stage_pypdf2,
+    "llm batching (stubbed)": stage_llm_batches,
+    "preprocess_text": stage_preprocess,
+    "chunk_text_by_paragraph": stage_chunking,
+}
+
+
+def prepare_inputs(pdf_path: str, max_pages: int | None):
+    """Extracts the page texts once, so the text-only stages measure just themselves."""
+    import pdfplumber
+    with pdfplumber.open(pdf_path) as pdf:
+        pages = pdf.pages[:max_pages]
+        page_texts = [page.extract_text() or "" for page in pages]
+        page_numbers = [page.page_number for page in pages]
+    marked_text = "".join(
+        f"\n\n--- PAGE {number} ---\n\n" + text for number, text in zip(page_numbers, page_texts) if text
+    )
+    return SimpleNamespace(
+        pdf_path=pdf_path,
+        pdf_bytes=os.path.getsize(pdf_path),
+        max_pages=max_pages,
+        page_count=len(page_texts),
+        page_texts=page_texts,
+        plain_text="".join(page_texts),
+        marked_text=marked_text,
+    )
+
+
+def stage_peak_rss(name: str, inputs) -> float:
+    """Runs one stage once in this (fresh) process and returns the process's peak RSS."""
+    sys.stdout = open(os.devnull, "w")
+    stub_llm()
+    for relative_path, script in SCRIPTS:
+        load_script(relative_path, script)
+    STAGES[name](inputs)
+    return peak_rss_mb()
+
+
+def isolated_peak_rss(name: str, inputs) -> float:
+    # A spawned process starts from a bare interpreter, so earlier stages' peaks do not carry over
+    with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+        # The prepared inputs are sent along rather than extracted again, which would set the peak itself
+        return pool.submit(stage_peak_rss, name, inputs).result()
+
+
+def measure(name: str, stage, inputs, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        pages, processed_bytes, _ = stage(inputs)
+        timings.append(time.perf_counter() - started)
+
+    # A separate traced run: tracemalloc slows the stage down too much to time it in the same pass
+    tracemalloc.start()
+    stage(inputs)
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    median = percentile(timings, 50)
+    return {
+        "seconds": median,
+        "p95_seconds": percentile(timings, 95),
+        "pages": pages,
+        "pages_per_sec": pages / median if median else 0.0,
+        "mb_per_sec": processed_bytes / (1024 * 1024) / median if median else 0.0,
+        "peak_rss_mb": isolated_peak_rss(name, inputs),
+        "alloc_peak_mb": traced_peak / (1024 * 1024),
+    }
+
+
+def print_report(results: dict, baseline: dict | None, tolerance: float) -> list[str]:
+    base_stages = (baseline or {}).get("stages", {})
+    regressions = []
+    print(f"{'stage':<40}{'pages/s':>10}{'MB/s':>9}{'median s':>10}{'peak RSS':>9}{'alloc MB':>10}{'vs base':>10}")
+    for name, stats in results.items():
+        change = ""
+        base = base_stages.get(name)
+        if base and base.get("seconds"):
+            delta = (stats["seconds"] - base["seconds"]) / base["seconds"]
+            change = f"{delta:+.0%}"
+            if delta > tolerance:
+                regressions.append(name)
+                change += " !"
+        print(
+            f"{name:<40}{stats['pages_per_sec']:>10.1f}{stats['mb_per_sec']:>9.2f}{stats['seconds']:>10.3f}"
+            f"{stats['peak_rss_mb']:>9.0f}{stats['alloc_peak_mb']:>10.1f}{change:>10}"
+        )
+    if baseline is None:
+        print("No baseline to compare against; run with --save-baseline to store one.")
+    elif regressions:
+        print(f"Regressions over {tolerance:.0%}: {', '.join(regressions)}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pdf", default=SAMPLE_PDF)
+    parser.add_argument("--pages", type=int, default=None, help="Only use the first N pages")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), default=list(STAGES))
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 when a stage regressed")
+    args = parser.parse_args()
+
+    stub_llm()
+    for relative_path, name in SCRIPTS:
+        load_script(relative_path, name)
+    inputs = prepare_inputs(args.pdf, args.pages)
+    print(f"Benchmarking {inputs.page_count} pages ({inputs.pdf_bytes / (1024 * 1024):.1f} MB) of '{os.path.basename(args.pdf)}', "
+          f"median of {args.repeat} runs per stage.")
+
+    results = {}
+    for name in args.stages:
+        # The scripts print progress; keep the report readable
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, "w")
+        try:
+            results[name] = measure(name, STAGES[name], inputs, args.repeat)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+    baseline = load_baseline(args.baseline)
+    settings = {"pdf": os.path.basename(args.pdf), "pages": inputs.page_count, "repeat": args.repeat}
+    if baseline is not None and baseline.get("settings") != settings:
+        print(f"Note: the baseline was recorded with different settings: {baseline.get('settings')}")
+    regressions = print_report(results, baseline, args.tolerance)
+    if args.save_baseline:
+        save_baseline(args.baseline, {"stages": results}, settings)
+        print(f"Saved baseline to '{args.baseline}'.")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Per-formula LaTeX render latency, with and without the precompiled preamble.
+
+Renders every formula in `latex_formulas` from test_pn/test_lat.py one
+compile at a time, as `render_latex_to_image` does, first parsing the
+amsmath/amsfonts/amssymb preamble on every compile and then loading it from
+a dumped format. Images are deleted between repeats so each one is a real
+compile; the one-off cost of dumping the format is reported separately.
+Needs `latex` and `dvipng` (or `dvisvgm` for --format svg).
+
+    python benchmarks/latex_bench.py
+    python benchmarks/latex_bench.py --repeat 10 --dpi 600 --save-baseline
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+# Shared helpers live at the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(REPO_ROOT, "test_pn"))
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_utils import REGRESSION_TOLERANCE, load_baseline, percentile, save_baseline
+from latex_render import LatexRenderer, RenderError
+from test_lat import latex_formulas
+
+# --- BENCHMARK CONFIGURATION ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines", "latex.json")
+
+
+def time_renders(renderer: LatexRenderer, expression: str, repeat: int, dpi: int, fmt: str) -> list[float]:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        path = renderer.render(expression, dpi=dpi, fmt=fmt)
+        timings.append(time.perf_counter() - started)
+        os.remove(path)
+    return timings
+
+
+def print_report(results: dict, build_seconds: float, baseline: dict | None, tolerance: float) -> list[str]:
+    base_formulas = (baseline or {}).get("formulas", {})
+    regressions = []
+    print(f"{'formula':<38}{'before ms':>11}{'after ms':>10}{'speedup':>9}{'vs base':>10}")
+    for name, stats in results.items():
+        change = ""
+        base = base_formulas.get(name)
+        if base and base.get("after"):
+            delta = (stats["after"] - base["after"]) / base["after"]
+            change = f"{delta:+.0%}"
+            if delta > tolerance:
+                regressions.append(name)
+                change += " !"
+        speedup = stats["before"] / stats["after"] if stats["after"] else 0.0
+        print(f"{name:<38}{stats['before'] * 1000:>11.1f}{stats['after'] * 1000:>10.1f}{speedup:>8.1f}x{change:>10}")
+    before = sum(stats["before"] for stats in results.values())
+    after = sum(stats["after"] for stats in results.values())
+    print(f"{'total':<38}{before * 1000:>11.1f}{after * 1000:>10.1f}{before / after if after else 0.0:>8.1f}x")
+    print(f"Dumping the format took {build_seconds * 1000:.0f} ms once; it pays for itself after "
+          f"{build_seconds / ((before - after) / len(results)) if before > after else float('inf'):.1f} renders.")
+    if baseline is None:
+        print("No baseline to compare against; run with --save-baseline to store one.")
+    elif regressions:
+        print(f"Regressions over {tolerance:.0%}: {', '.join(regressions)}")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--dpi", type=int, default=300)
+    parser.add_argument("--format", choices=["png", "svg"], default="png")
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 when a formula regressed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="latex_bench_") as cache_dir:
+        before = LatexRenderer(cache_dir=cache_dir, use_format=False)
+        after = LatexRenderer(cache_dir=cache_dir, use_format=True)
+        try:
+            started = time.perf_counter()
+            format_name = after.format_name()
+            build_seconds = time.perf_counter() - started
+            if format_name is None:
+                sys.exit("The preamble could not be precompiled, so there is nothing to compare.")
+            # One warm-up render each, so disk caches do not favour whichever runs second
+            time_renders(before, "$x$", 1, args.dpi, args.format)
+            time_renders(after, "$x$", 1, args.dpi, args.format)
+            results = {}
+            for name, expression in latex_formulas.items():
+                results[name] = {
+                    "before": percentile(time_renders(before, expression, args.repeat, args.dpi, args.format), 50),
+                    "after": percentile(time_renders(after, expression, args.repeat, args.dpi, args.format), 50),
+                }
+        except RenderError as e:
+            sys.exit(f"Error: {e}")
+
+    print(f"Median of {args.repeat} renders per formula at {args.dpi} dpi ({args.format}).")
+    baseline = load_baseline(args.baseline)
+    settings = {"repeat": args.repeat, "dpi": args.dpi, "format": args.format}
+    if baseline is not None and baseline.get("settings") != settings:
+        print(f"Note: the baseline was recorded with different settings: {baseline.get('settings')}")
+    regressions = print_report(results, build_seconds, baseline, args.tolerance)
+    if args.save_baseline:
+        save_baseline(args.baseline, {"formulas": results, "format_build_seconds": build_seconds}, settings)
+        print(f"Saved baseline to '{args.baseline}'.")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+"""
+Offline benchmark of the quiz bot pipeline: process_query_for_context,
+generate_quiz_from_context and sending the first poll.
+
+Pinecone searches and Gemini responses are replayed from a fixture file,
+sleeping for the latency recorded with each response, so runs need no
+network access or API keys and are repeatable.
+
+    # Record a fixture against the live services (needs the usual .env keys)
+    python benchmarks/pipeline_bench.py --record --topics "cells" "1.1 Bacteria" "enzymes"
+
+    # Or build a synthetic one from the bundled JSON records (fixtures/pipeline.json is one for
+    # DEFAULT_TOPICS, and baselines/pipeline.json its replay with the default settings)
+    python benchmarks/pipeline_bench.py --synthesize --topics "cells" "enzymes"
+
+    # Replay it, compare against the stored baseline, and optionally store a new one
+    python benchmarks/pipeline_bench.py --concurrency 8 --requests 64
+    python benchmarks/pipeline_bench.py --concurrency 8 --requests 64 --save-baseline
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import statistics
+import sys
+import time
+from types import SimpleNamespace
+
+# Shared helpers live at the repository root
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_ROOT)
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from bench_utils import REGRESSION_TOLERANCE, StageTimer, load_baseline, print_report, save_baseline, summarize
+
+# --- BENCHMARK CONFIGURATION ---
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+FIXTURE_FILE = os.path.join(BENCH_DIR, "fixtures", "pipeline.json")
+BASELINE_FILE = os.path.join(BENCH_DIR, "baselines", "pipeline.json")
+DEFAULT_TOPICS = ["cells", "1.1 Bacteria", "enzymes", "photosynthesis", "muscle cells", "the complex sugars"]
+SEND_LATENCY = 0.15  # Telegram Bot API round trip used when a fixture has none recorded
+
+# Latencies for synthetic fixtures, roughly what the live services show
+SYNTHETIC_LATENCIES = {"search": 0.25, "query_expansion": 0.8, "quiz_generation": 6.0}
+SYNTHETIC_QUIZ = [
+    {"question": f"Synthetic question {i + 1}?", "options": ["A", "B", "C", "D"], "correct_option_id": i % 4, "topic": "synthetic"}
+    for i in range(5)
+]
+
+
+def prompt_key(prompt: str) -> str:
+    return hashlib.sha1(prompt.encode("utf-8")).hexdigest()
+
+
+def search_key(namespace: str, query: str) -> str:
+    return f"{namespace}\x1f{query}"
+
+
+def _plain(value):
+    """Converts Pinecone SDK response objects into JSON-serializable dicts and lists."""
+    if hasattr(value, "to_dict"):
+        return _plain(value.to_dict())
+    if isinstance(value, dict):
+        return {key: _plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(item) for item in value]
+    return value
+
+
+class FixtureMiss(Exception):
+    pass
+
+
+# --- REPLAY ---
+
+class ReplayIndex:
+    """Stands in for a Pinecone index, answering searches from the fixture after the recorded delay."""
+
+    def __init__(self, fixture: dict, scale: float, misses: list):
+        self.fixture = fixture
+        self.scale = scale
+        self.misses = misses
+        latencies = [entry["latency"] for entry in fixture["searches"].values()]
+        self.miss_latency = statistics.median(latencies) if latencies else 0.0
+
+    def describe_index_stats(self):
+        return SimpleNamespace(namespaces={namespace: {} for namespace in self.fixture["namespaces"]})
+
+    def search(self, namespace, query):
+        entry = self.fixture["searches"].get(search_key(namespace, query["inputs"]["text"]))
+        if entry is None:
+            self.misses.append(("search", namespace, query["inputs"]["text"]))
+            time.sleep(self.miss_latency * self.scale)
+            return {"result": {"hits": []}}
+        time.sleep(entry["latency"] * self.scale)
+        return {"result": {"hits": entry["hits"]}}
+
+
+class ReplayModel:
+    """Stands in for a Gemini model, answering by prompt hash, or with the call site's default response."""
+
+    def __init__(self, fixture: dict, scale: float, misses: list):
+        self.fixture = fixture
+        self.scale = scale
+        self.misses = misses
+
+    async def generate_content_async(self, prompt, **kwargs):
+        entry = self.fixture["generations"].get(prompt_key(prompt))
+        if entry is None:
+            site = self._site(prompt)
+            entry = self.fixture.get("defaults", {}).get(site)
+            self.misses.append(("generation", site, prompt_key(prompt)))
+            if entry is None:
+                raise FixtureMiss(f"No recorded response for this {site} prompt")
+        await asyncio.sleep(entry["latency"] * self.scale)
+        return SimpleNamespace(text=entry["text"])
+
+    def _site(self, prompt: str) -> str:
+        return "quiz_generation" if "quiz generation AI" in prompt else "query_expansion"
+
+
+class ReplayBot:
+    """Stands in for the Telegram bot; every send waits the recorded round trip."""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.sent = 0
+
+    async def send_poll(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        self.sent += 1
+        return SimpleNamespace(poll=SimpleNamespace(id=f"poll-{self.sent}"))
+
+
+# --- RECORDING ---
+
+class RecordingIndex:
+    def __init__(self, index, fixture: dict):
+        self.index = index
+        self.fixture = fixture
+
+    def describe_index_stats(self):
+        stats = self.index.describe_index_stats()
+        self.fixture["namespaces"] = list(stats.namespaces.keys())
+        return stats
+
+    def search(self, namespace, query):
+        started = time.perf_counter()
+        results = self.index.search(namespace=namespace, query=query)
+        self.fixture["searches"][search_key(namespace, query["inputs"]["text"])] = {
+            "latency": time.perf_counter() - started,
+            "hits": _plain(results.get("result", {}).get("hits", [])),
+        }
+        return results
+
+
+class RecordingModel:
+    def __init__(self, model, fixture: dict):
+        self.model = model
+        self.fixture = fixture
+
+    async def generate_content_async(self, prompt, **kwargs):
+        started = time.perf_counter()
+        response = await self.model.generate_content_async(prompt, **kwargs)
+        self.fixture["generations"][prompt_key(prompt)] = {"latency": time.perf_counter() - started, "text": response.text}
+        return response
+
+
+def synthesize_fixture(topics: list[str]) -> dict:
+    """Builds a fixture from the bundled records: BM25 results stand in for each namespace's dense search."""
+    from lexical_index import DEFAULT_SOURCES, LexicalIndex, namespace_for
+    from query_planner import planner
+
+    indexes = {namespace_for(path): LexicalIndex.build([path]) for path in DEFAULT_SOURCES}
+    fixture = {"namespaces": list(indexes), "searches": {}, "generations": {}, "send_latency": SEND_LATENCY, "synthetic": True}
+    for topic in topics:
+        for query in {topic, *(planner.plan(topic) or [])}:
+            for namespace, index in indexes.items():
+                hits = index.search(query)
+                best = max((hit["_score"] for hit in hits), default=1.0)
+                fixture["searches"][search_key(namespace, query)] = {
+                    "latency": SYNTHETIC_LATENCIES["search"],
+                    "hits": [
+                        {"_id": hit["_id"], "_score": 0.6 * hit["_score"] / best, "fields": hit["fields"]}
+                        for hit in hits
+                    ],
+                }
+    fixture["defaults"] = {
+        "query_expansion": {"latency": SYNTHETIC_LATENCIES["query_expansion"], "text": ""},
+        "quiz_generation": {"latency": SYNTHETIC_LATENCIES["quiz_generation"], "text": json.dumps(SYNTHETIC_QUIZ)},
+    }
+    return fixture
+
+
+# --- RUNNER ---
+
+def load_bot():
+    # The bot builds its clients at import time; replay runs never use these credentials
+    for name in ("pinecone_api", "gemma_gemini_api", "attemptOneBot_token"):
+        os.environ.setdefault(name, "offline-benchmark")
+    import advanced_quiz_bot
+    return advanced_quiz_bot
+
+
+async def run_request(bot, topic: str, chat_id: int, telegram) -> bool:
+    context, sources = await bot.process_query_for_context(topic)
+    if not context:
+        return False
+    quiz = await bot.generate_quiz_from_context(context)
+    if not quiz:
+        return False
+    tg_context = SimpleNamespace(bot=telegram, user_data={"current_topic": topic}, bot_data={})
+    await bot.start_quiz(chat_id, quiz, tg_context)
+    return True
+
+
+async def run(bot, topics: list[str], requests: int, concurrency: int, telegram, timer: StageTimer) -> tuple[int, float]:
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait((i, topics[i % len(topics)]))
+    completed = 0
+
+    async def worker():
+        nonlocal completed
+        while not queue.empty():
+            i, topic = queue.get_nowait()
+            started = time.perf_counter()
+            if await run_request(bot, topic, 1000 + i, telegram):
+                completed += 1
+                timer.add("total", time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return completed, time.perf_counter() - started
+
+
+def instrument(bot, timer: StageTimer) -> None:
+    import retrieval
+
+    timer.patch(bot, "generate_search_queries", "expansion")
+    timer.patch(retrieval, "search_all", "search (fan-out)")
+    # Merging runs inside the fan-out and the fusion as well; these stages show what it costs on its own
+    timer.patch(retrieval, "merge_hits", "merge hits")
+    timer.patch(retrieval, "fuse_hits", "rank fusion")
+    timer.patch(bot, "rerank", "rerank")
+    timer.patch(bot, "compress_chunks", "compress")
+    timer.patch(bot, "process_query_for_context", "context (end to end)")
+    timer.patch(bot, "generate_quiz_from_context", "quiz generation")
+    timer.patch(bot, "start_quiz", "telegram send")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fixture", default=FIXTURE_FILE)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--topics", nargs="+", default=DEFAULT_TOPICS)
+    parser.add_argument("--requests", type=int, default=24)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="Multiplies recorded latencies; 0 measures local overhead only")
+    parser.add_argument("--rate-limits", action="store_true", help="Keep the real rate limits instead of disabling them")
+    parser.add_argument("--with-packs", action="store_true", help="Let section-header topics use the precomputed context packs")
+    parser.add_argument("--with-lexical", action="store_true", help="Fuse the local BM25 index into retrieval")
+    parser.add_argument("--record", action="store_true", help="Record a fixture against the live services")
+    parser.add_argument("--synthesize", action="store_true", help="Build a synthetic fixture from the bundled records")
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE)
+    parser.add_argument("--check", action="store_true", help="Exit with status 1 when a stage regressed")
+    args = parser.parse_args()
+
+    if args.synthesize:
+        fixture = synthesize_fixture(args.topics)
+        _write_fixture(args.fixture, fixture)
+        print(f"Wrote synthetic fixture with {len(fixture['searches'])} searches to '{args.fixture}'.")
+        return
+
+    bot = load_bot()
+    from model_router import router
+    from rate_limiter import MODEL_LIMITS, limiter
+
+    if not args.with_packs:
+        bot.context_packs = None
+    if not args.with_lexical:
+        bot.lexical_index = None
+
+    if args.record:
+        fixture = {"namespaces": [], "searches": {}, "generations": {}, "send_latency": SEND_LATENCY}
+        real_index = bot.pc.Index(bot.index_name)
+        bot.pc = SimpleNamespace(Index=lambda name: RecordingIndex(real_index, fixture))
+        real_model = router._model
+        router._model = lambda name: RecordingModel(real_model(name), fixture)
+        completed, wall = asyncio.run(run(bot, args.topics, len(args.topics), 1, ReplayBot(0.0), StageTimer()))
+        _write_fixture(args.fixture, fixture)
+        print(f"Recorded {len(fixture['searches'])} searches and {len(fixture['generations'])} generations "
+              f"({completed}/{len(args.topics)} topics completed) to '{args.fixture}'.")
+        return
+
+    with open(args.fixture, "r", encoding="utf-8") as f:
+        fixture = json.load(f)
+    misses = []
+    bot.pc = SimpleNamespace(Index=lambda name: ReplayIndex(fixture, args.latency_scale, misses))
+    replay_model = ReplayModel(fixture, args.latency_scale, misses)
+    router._model = lambda name: replay_model
+    if not args.rate_limits:
+        limiter.limits = {model: (None, None) for model in MODEL_LIMITS}
+    telegram = ReplayBot(fixture.get("send_latency", SEND_LATENCY) * args.latency_scale)
+
+    timer = StageTimer()
+    instrument(bot, timer)
+    completed, wall = asyncio.run(run(bot, args.topics, args.requests, args.concurrency, telegram, timer))
+
+    settings = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "latency_scale": args.latency_scale,
+        "topics": args.topics,
+        "fixture": os.path.basename(args.fixture),
+    }
+    summary = summarize(timer.samples, wall, completed)
+    print(f"Replayed {args.requests} requests at concurrency {args.concurrency} from '{args.fixture}'.")
+    if fixture.get("synthetic"):
+        # Synthetic fixtures answer every generation with the call site's default response
+        misses = [miss for miss in misses if miss[0] != "generation"]
+    if misses:
+        print(f"Warning: {len(misses)} fixture misses; re-record the fixture if the prompts changed.")
+    baseline = load_baseline(args.baseline)
+    if baseline is not None and baseline.get("settings") != settings:
+        print(f"Note: the baseline was recorded with different settings: {baseline.get('settings')}")
+    regressions = print_report(summary, baseline, args.tolerance)
+    if args.save_baseline:
+        save_baseline(args.baseline, summary, settings)
+        print(f"Saved baseline to '{args.baseline}'.")
+    if args.check and regressions:
+        sys.exit(1)
+
+
+def _write_fixture(path: str, fixture: dict) -> None:
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(fixture, f, ensure_ascii=False)
+    os.replace(path + ".tmp", path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import math
+import re
+from collections import Counter
+
+from rate_limiter import estimate_tokens
+from retrieval import tokenize
+
+# --- CONTEXT COMPRESSION CONFIGURATION ---
+CONTEXT_TOKEN_BUDGET = 1200   # Retrieved text kept per prompt after compression
+DUPLICATE_SIMILARITY = 0.85   # Sentences at least this similar to a kept one are dropped
+LEAD_SENTENCE_BONUS = 0.1     # Opening sentences of a chunk usually name or define its subject
+MIN_SENTENCE_TOKENS = 3
+
+SENTENCE_SPLIT = re.compile(r"(?<=[.!?])\s+|\n{2,}")
+
+
+def split_sentences(text: str) -> list[str]:
+    return [" ".join(sentence.split()) for sentence in SENTENCE_SPLIT.split(text) if sentence.strip()]
+
+
+def _vector(terms: Counter, idf: dict) -> dict:
+    vector = {term: tf * idf.get(term, 0.0) for term, tf in terms.items()}
+    norm = math.sqrt(sum(weight * weight for weight in vector.values())) or 1.0
+    return {term: weight / norm for term, weight in vector.items()}
+
+
+def _cosine(a: dict, b: dict) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(term, 0.0) for term, weight in a.items())
+
+
+def compress_chunks(query: str, chunks: list[str], budget: int = CONTEXT_TOKEN_BUDGET) -> list[str]:
+    """
+    Shrinks ranked chunk texts to the sentences most relevant to `query`.
+
+    Sentences are scored by TF-IDF cosine similarity to the query, with IDF
+    taken from the sentences themselves, and kept greedily until `budget`
+    tokens are used. Near-duplicate sentences across chunks are dropped even
+    when everything fits. Returns one text per chunk (possibly empty), with
+    kept sentences in their original order.
+    """
+    sentences = []  # (chunk index, position, text, terms)
+    for chunk_index, chunk in enumerate(chunks):
+        for position, sentence in enumerate(split_sentences(chunk)):
+            sentences.append((chunk_index, position, sentence, Counter(tokenize(sentence))))
+    if not sentences:
+        return ["" for _ in chunks]
+
+    df = Counter()
+    for _, _, _, terms in sentences:
+        df.update(terms.keys())
+    idf = {term: math.log(1 + len(sentences) / count) for term, count in df.items()}
+    query_vector = _vector(Counter(tokenize(query)), idf)
+    vectors = [_vector(terms, idf) for _, _, _, terms in sentences]
+
+    fits = sum(estimate_tokens(sentence) for _, _, sentence, _ in sentences) <= budget
+
+    def score(i):
+        chunk_index, position, _, _ = sentences[i]
+        # Earlier chunks were ranked higher; break ties in their favour
+        return _cosine(query_vector, vectors[i]) + (LEAD_SENTENCE_BONUS if position == 0 else 0.0) - 0.01 * chunk_index
+
+    order = range(len(sentences)) if fits else sorted(range(len(sentences)), key=score, reverse=True)
+    kept = []
+    used = 0
+    for i in order:
+        sentence, terms = sentences[i][2], sentences[i][3]
+        if sum(terms.values()) < MIN_SENTENCE_TOKENS and not fits:
+            continue
+        if any(_cosine(vectors[i], vectors[j]) >= DUPLICATE_SIMILARITY for j in kept):
+            continue
+        cost = estimate_tokens(sentence)
+        if used + cost > budget:
+            continue
+        kept.append(i)
+        used += cost
+
+    compressed = [[] for _ in chunks]
+    for i in sorted(kept):
+        compressed[sentences[i][0]].append(sentences[i][2])
+    return [" ".join(parts) for parts in compressed]
@@ -0,0 +1,149 @@
+import difflib
+import json
+import logging
+import os
+import re
+import sys
+
+from lexical_index import DEFAULT_SOURCES, LexicalIndex
+
+# --- CONTEXT PACK CONFIGURATION ---
+CONTEXT_PACKS_FILE = os.getenv("CONTEXT_PACKS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "context_packs.json"))
+PACK_SIZE = 4            # Chunks per pack, the same number live retrieval feeds the quiz prompt
+PACK_CANDIDATES = 12     # BM25 matches considered besides the chunks filed under the header itself
+MATCH_CUTOFF = 0.85      # difflib ratio needed for a fuzzy topic match
+
+# "1.1 ", "2.4.2 ", "Table 3.3 " prefixes and trailing punctuation are not part of the topic name
+HEADER_NUMBERING = re.compile(r"^(?:table\s+)?\d+(?:\.\d+)*\.?\s+")
+BOOK_PREFIX = re.compile(r"^grade-\d+", re.IGNORECASE)
+
+
+def normalize_topic(text: str) -> str:
+    text = HEADER_NUMBERING.sub("", " ".join(text.lower().split()))
+    return text.strip(" ?.!:;–-")
+
+
+def book_of(namespace: str) -> str:
+    """The textbook a namespace was extracted from, e.g. Grade-10-Biology-keyword-definitions -> Grade-10."""
+    match = BOOK_PREFIX.match(namespace)
+    return match.group(0) if match else namespace
+
+
+def build_packs(paths: list[str]) -> tuple[list, dict]:
+    """
+    Ranks a context pack for every section header in the records.
+
+    Chunks filed under the header come first, then the best BM25 matches for
+    the header from the same textbook. Headers whose name occurs in more than
+    one textbook ("Introduction", "Smoking") get no pack, since the topic alone
+    cannot say which book's section the user means. Duplicate chunk texts (the
+    same section extracted into several files) are kept once. Returns the chunk
+    table ([id, topic, page_number, namespace, chunk_text] rows) and the packs,
+    which refer to chunks by row number so each text is stored only once.
+    """
+    index = LexicalIndex.build(paths)
+    first_row = {}
+    for number, doc in enumerate(index.docs):
+        first_row.setdefault(doc[4], number)
+
+    by_topic = {}
+    for number, (doc_id, topic, page_number, namespace, text) in enumerate(index.docs):
+        if topic and topic != 'N/A':
+            by_topic.setdefault(normalize_topic(topic), {}).setdefault(book_of(namespace), (topic, []))[1].append(number)
+
+    packs = {}
+    for key, books in by_topic.items():
+        if not key or len(books) > 1:
+            continue
+        book, (header, numbers) = next(iter(books.items()))
+        lexical = [hit for hit in index.search(header, top_k=PACK_CANDIDATES * len(paths)) if book_of(hit['fields']['namespace']) == book]
+        lexical = lexical[:PACK_CANDIDATES]
+        best = max((hit['_score'] for hit in lexical), default=0.0) or 1.0
+        candidates = [(number, 1.0) for number in numbers]
+        candidates += [(first_row[hit['fields']['chunk_text']], hit['_score'] / best) for hit in lexical]
+        hits = []
+        seen = set()
+        for number, score in candidates:
+            row = first_row[index.docs[number][4]]
+            if row in seen:
+                continue
+            seen.add(row)
+            hits.append([row, round(score, 3)])
+            if len(hits) == PACK_SIZE:
+                break
+        packs[key] = {"header": header, "hits": hits}
+
+    used = sorted({row for pack in packs.values() for row, _ in pack["hits"]})
+    renumber = {row: i for i, row in enumerate(used)}
+    for pack in packs.values():
+        pack["hits"] = [[renumber[row], score] for row, score in pack["hits"]]
+    return [index.docs[row] for row in used], packs
+
+
+class ContextPacks:
+    """Read-only map from normalized section headers to their precomputed context packs."""
+
+    def __init__(self, chunks: list, packs: dict):
+        self.chunks = chunks
+        self.packs = packs
+        self.keys = list(packs)
+
+    @classmethod
+    def load(cls, path: str = CONTEXT_PACKS_FILE) -> "ContextPacks":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        return cls(data["chunks"], data["packs"])
+
+    def __len__(self):
+        return len(self.packs)
+
+    def resolve(self, query: str) -> str | None:
+        """Returns the pack key for a user topic, exactly after normalization or by fuzzy match."""
+        key = normalize_topic(query)
+        if key in self.packs:
+            return key
+        matches = difflib.get_close_matches(key, self.keys, n=1, cutoff=MATCH_CUTOFF)
+        return matches[0] if matches else None
+
+    def lookup(self, query: str) -> list[dict] | None:
+        """Returns the pack for `query` as Pinecone-style hits, best first, or None if no header matches."""
+        key = self.resolve(query)
+        if key is None:
+            return None
+        hits = []
+        for row, score in self.packs[key]["hits"]:
+            doc_id, topic, page_number, namespace, text = self.chunks[row]
+            hits.append({
+                '_id': doc_id,
+                '_score': score,
+                'fields': {'topic': topic, 'page_number': page_number, 'namespace': namespace, 'chunk_text': text},
+            })
+        return hits
+
+
+def load_packs(path: str = CONTEXT_PACKS_FILE) -> ContextPacks | None:
+    """Loads the saved packs, or returns None (live retrieval only) if they have not been built."""
+    if not os.path.exists(path):
+        logging.info(f"No context packs at '{path}'; every topic uses live retrieval.")
+        return None
+    try:
+        packs = ContextPacks.load(path)
+    except Exception as e:
+        logging.error(f"Could not load context packs from '{path}': {e}")
+        return None
+    logging.info(f"Loaded {len(packs)} precomputed context packs.")
+    return packs
+
+
+if __name__ == "__main__":
+    # Usage: python context_packs.py [records.json ...]  (defaults to lexical_index.SOURCE_FILES)
+    paths = sys.argv[1:] or DEFAULT_SOURCES
+    chunks, packs = build_packs(paths)
+    with open(CONTEXT_PACKS_FILE + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({
+            "sources": [os.path.basename(path) for path in paths],
+            "chunks": chunks,
+            "packs": packs,
+        }, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(CONTEXT_PACKS_FILE + ".tmp", CONTEXT_PACKS_FILE)
+    print(f"Built {len(packs)} context packs from {len(paths)} files into '{CONTEXT_PACKS_FILE}'.")
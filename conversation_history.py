@@ -0,0 +1,121 @@
+import re
+from collections import OrderedDict, deque
+
+from rate_limiter import estimate_tokens
+
+# --- HISTORY CONFIGURATION ---
+MAX_CHATS = 1000            # Least recently used chats beyond this are evicted
+HISTORY_LENGTH = 5          # Recent turns kept verbatim per chat
+SUMMARY_TOKEN_BUDGET = 150  # Older turns are folded into a summary of at most this size
+PROMPT_TOKEN_BUDGET = 3000  # History plus retrieved chunks must fit in this many tokens
+HISTORY_SHARE = 0.3         # At most this share of the budget goes to history
+
+# The answer prompt ends every reply with "Source: ..." citation lines
+CITATION_START = re.compile(r"\n\s*\**\s*Sources?\s*:", re.IGNORECASE)
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def strip_citations(answer: str) -> str:
+    """Drops the trailing source citations from a bot answer; they add nothing to later prompts."""
+    match = CITATION_START.search(answer)
+    return (answer[:match.start()] if match else answer).strip()
+
+
+def first_sentence(text: str) -> str:
+    return SENTENCE_END.split(text.strip(), maxsplit=1)[0]
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cuts text to roughly `max_tokens`, at a sentence boundary when one is available."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(0, max_tokens * 4)]
+    boundary = max(cut.rfind(". "), cut.rfind("? "), cut.rfind("! "))
+    return cut[:boundary + 1] if boundary > 0 else cut
+
+
+class ChatHistory:
+    """Recent turns of one chat, with older turns folded into a short extractive summary."""
+
+    def __init__(self, max_turns: int = HISTORY_LENGTH):
+        self.turns: deque = deque()
+        self.max_turns = max_turns
+        self.summary_lines: deque = deque()
+
+    def add_turn(self, question: str, answer: str) -> None:
+        self.turns.append((question, strip_citations(answer)))
+        while len(self.turns) > self.max_turns:
+            old_question, old_answer = self.turns.popleft()
+            self.summary_lines.append(f"- Asked: {old_question} Answered: {first_sentence(old_answer)}")
+            while self.summary_lines and estimate_tokens("\n".join(self.summary_lines)) > SUMMARY_TOKEN_BUDGET:
+                self.summary_lines.popleft()
+
+    def render(self, max_tokens: int) -> str:
+        """Renders the summary and as many recent turns as fit, newest turns first to be kept."""
+        parts = []
+        used = 0
+        for question, answer in reversed(self.turns):
+            turn = f"User: {question}\nBot: {answer}"
+            cost = estimate_tokens(turn)
+            if used + cost > max_tokens:
+                break
+            parts.append(turn)
+            used += cost
+        parts.reverse()
+        if self.summary_lines:
+            summary = "Earlier in this conversation:\n" + "\n".join(self.summary_lines)
+            if used + estimate_tokens(summary) <= max_tokens:
+                parts.insert(0, summary)
+        return "\n".join(parts)
+
+
+class ConversationStore:
+    """Per-chat histories with least-recently-used eviction across chats."""
+
+    def __init__(self, max_chats: int = MAX_CHATS, max_turns: int = HISTORY_LENGTH):
+        self.max_chats = max_chats
+        self.max_turns = max_turns
+        self._chats: OrderedDict = OrderedDict()
+
+    def get(self, chat_id: int) -> ChatHistory | None:
+        history = self._chats.get(chat_id)
+        if history is not None:
+            self._chats.move_to_end(chat_id)
+        return history
+
+    def add_turn(self, chat_id: int, question: str, answer: str) -> None:
+        history = self.get(chat_id)
+        if history is None:
+            history = self._chats[chat_id] = ChatHistory(self.max_turns)
+            if len(self._chats) > self.max_chats:
+                self._chats.popitem(last=False)
+        history.add_turn(question, answer)
+
+    def clear(self, chat_id: int) -> bool:
+        return self._chats.pop(chat_id, None) is not None
+
+    def __len__(self):
+        return len(self._chats)
+
+
+def assemble_context(history: ChatHistory | None, contexts: list[str], budget: int = PROMPT_TOKEN_BUDGET) -> tuple[str, str]:
+    """
+    Fits conversation history and ranked context chunks into `budget` tokens.
+
+    History may use up to HISTORY_SHARE of the budget; whatever it leaves goes
+    to the chunks, which are added in rank order and the last one truncated.
+    Returns (history_str, context_str).
+    """
+    history_str = history.render(int(budget * HISTORY_SHARE)) if history else ""
+    remaining = budget - estimate_tokens(history_str)
+    kept = []
+    for chunk in contexts:
+        cost = estimate_tokens(chunk)
+        if cost <= remaining:
+            kept.append(chunk)
+            remaining -= cost
+        else:
+            if remaining > 50:
+                kept.append(truncate_to_tokens(chunk, remaining))
+            break
+    return history_str, "\n".join(kept)
@@ -0,0 +1,70 @@
+import asyncio
+import logging
+
+# --- GROUP QUIZ CONFIGURATION ---
+LEADERBOARD_DEBOUNCE = 5  # Seconds to wait for more answers before editing the leaderboard
+LEADERBOARD_SIZE = 10     # Number of participants shown on the leaderboard
+
+
+class GroupQuiz:
+    """
+    One generated quiz shared by every participant in a chat.
+
+    All questions are posted at once and each participant's answers are scored
+    separately, so the whole class costs a single retrieval and generation call.
+    """
+
+    def __init__(self, chat_id: int, topic: str, questions: list, sources: list):
+        self.chat_id = chat_id
+        self.topic = topic
+        self.questions = questions
+        self.sources = sources
+        self.scores: dict[int, dict] = {}  # user_id -> {"name", "score", "answered"}
+        self.leaderboard_message_id = None
+        self.finished = False
+        self._last_leaderboard = None
+        self._refresh_task = None
+
+    def record_answer(self, user_id: int, name: str, correct: bool) -> None:
+        entry = self.scores.setdefault(user_id, {"name": name, "score": 0, "answered": 0})
+        entry["answered"] += 1
+        if correct:
+            entry["score"] += 1
+
+    def render_leaderboard(self) -> str:
+        ranking = sorted(self.scores.values(), key=lambda e: (-e["score"], -e["answered"], e["name"]))
+        title = "Final results" if self.finished else "Live leaderboard"
+        lines = [f"{title} for '{self.topic}' ({len(self.scores)} participants):\n"]
+        for position, entry in enumerate(ranking[:LEADERBOARD_SIZE], 1):
+            lines.append(f"{position}. {entry['name']} - {entry['score']}/{len(self.questions)}")
+        if not ranking:
+            lines.append("No answers yet.")
+        return "\n".join(lines)
+
+    async def refresh_leaderboard(self, bot) -> None:
+        """Edits the leaderboard message after the debounce delay, coalescing all answers received meanwhile."""
+        try:
+            await asyncio.sleep(LEADERBOARD_DEBOUNCE)
+        finally:
+            self._refresh_task = None
+        text = self.render_leaderboard()
+        if text == self._last_leaderboard or self.leaderboard_message_id is None:
+            return
+        try:
+            await bot.edit_message_text(chat_id=self.chat_id, message_id=self.leaderboard_message_id, text=text)
+            self._last_leaderboard = text
+        except Exception as e:
+            logging.warning(f"Could not refresh leaderboard in chat {self.chat_id}: {e}")
+
+    def schedule_refresh(self, bot) -> None:
+        """Schedules a debounced leaderboard edit unless one is already pending."""
+        if self._refresh_task is None and not self.finished:
+            self._refresh_task = asyncio.create_task(self.refresh_leaderboard(bot))
+
+    async def finish(self, bot) -> None:
+        """Marks the quiz finished and posts the final leaderboard immediately."""
+        self.finished = True
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        await bot.send_message(chat_id=self.chat_id, text=self.render_leaderboard())
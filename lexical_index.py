@@ -0,0 +1,196 @@
+import heapq
+import json
+import logging
+import math
+import mmap
+import os
+import sys
+from array import array
+from collections import Counter, defaultdict
+
+from record_io import iter_records
+from retrieval import tokenize
+
+# --- LEXICAL INDEX CONFIGURATION ---
+LEXICAL_INDEX_DIR = os.getenv("LEXICAL_INDEX_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "lexical_index"))
+LEXICAL_TOP_K = 5
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Structured records that are also upserted to the biology Pinecone index, one namespace per file.
+# Other books (economics), re-extractions and *_renumbered copies of these files are left out.
+SOURCE_FILES = [
+    "Grade_9_Biology_structured_content.json",
+    "Grade_9_Biology_keyword_definitions.json",
+    "Grade_9_structured_biology_table.json",
+    "Grade_10_Biology_general_content.json",
+    "Grade_10_Biology_keyword_definitions.json",
+    "Grade_10_structured_biology_table.json",
+    "Grade_12_structured_biology_content_2.json",
+    "Grade_12_Biology_keyword_definitions.json",
+    "Grade_12_structured_biology_table.json",
+]
+DEFAULT_SOURCES = [os.path.join(os.path.dirname(os.path.abspath(__file__)), "parse_pdf", name) for name in SOURCE_FILES]
+
+META_FILE = "meta.json"
+DOC_IDS_FILE = "postings_docs.bin"    # uint32 document numbers, grouped by term
+FREQS_FILE = "postings_freqs.bin"     # uint32 term frequencies, parallel to the document numbers
+
+
+def namespace_for(path: str) -> str:
+    """Pinecone namespace of a records file, e.g. Grade_10_Biology_keyword_definitions.json -> Grade-10-Biology-keyword-definitions."""
+    return os.path.splitext(os.path.basename(path))[0].replace("_", "-")
+
+
+def _record_fields(record: dict) -> tuple[str, str, str, object]:
+    """Returns (id, chunk_text, topic, page_number), accepting the key variants used by the extraction scripts."""
+    doc_id = str(record.get('_id', record.get('id', '')))
+    text = record.get('chunk_text') or record.get('chunk text') or ''
+    topic = record.get('topic') or record.get('table_name') or 'N/A'
+    return doc_id, text, topic, record.get('page_number', 'N/A')
+
+
+def _read_uint32(path: str, use_mmap: bool):
+    if not use_mmap or os.path.getsize(path) == 0:
+        values = array('I')
+        with open(path, "rb") as f:
+            values.frombytes(f.read())
+        return values
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mapped).cast('I')
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over chunk_text, for exact-term lookups that dense search misses.
+
+    Postings for all terms are stored in two flat uint32 arrays (document
+    numbers and term frequencies); the vocabulary maps each term to its
+    (offset, count) slice. Saved indexes can be memory-mapped, so loading
+    is cheap and the postings are shared between bot processes.
+    """
+
+    def __init__(self, docs: list, vocab: dict, doc_ids, freqs, lengths: list[int]):
+        self.docs = docs          # [id, topic, page_number, namespace, chunk_text] per document number
+        self.vocab = vocab        # term -> [offset, count]
+        self.doc_ids = doc_ids
+        self.freqs = freqs
+        self.lengths = lengths
+        self.avg_length = sum(lengths) / len(lengths) if lengths else 1.0
+
+    @classmethod
+    def build(cls, paths: list[str]) -> "LexicalIndex":
+        docs = []
+        lengths = []
+        postings = defaultdict(list)
+        seen = set()
+        for path in paths:
+            namespace = namespace_for(path)
+            for record in iter_records(path):
+                doc_id, text, topic, page_number = _record_fields(record)
+                # A text indexed twice would take two of the top_k slots and vote twice in the fusion
+                if not text or text in seen:
+                    continue
+                seen.add(text)
+                number = len(docs)
+                docs.append([doc_id, topic, page_number, namespace, text])
+                counts = Counter(tokenize(text))
+                lengths.append(sum(counts.values()))
+                for term, tf in counts.items():
+                    postings[term].append((number, tf))
+
+        vocab = {}
+        doc_ids = array('I')
+        freqs = array('I')
+        for term in sorted(postings):
+            vocab[term] = [len(doc_ids), len(postings[term])]
+            for number, tf in postings[term]:
+                doc_ids.append(number)
+                freqs.append(tf)
+        return cls(docs, vocab, doc_ids, freqs, lengths)
+
+    def save(self, directory: str = LEXICAL_INDEX_DIR) -> None:
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, DOC_IDS_FILE), "wb") as f:
+            array('I', self.doc_ids).tofile(f)
+        with open(os.path.join(directory, FREQS_FILE), "wb") as f:
+            array('I', self.freqs).tofile(f)
+        meta_path = os.path.join(directory, META_FILE)
+        with open(meta_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "byteorder": sys.byteorder,
+                "docs": self.docs,
+                "lengths": self.lengths,
+                "vocab": self.vocab,
+            }, f, ensure_ascii=False)
+        os.replace(meta_path + ".tmp", meta_path)
+
+    @classmethod
+    def load(cls, directory: str = LEXICAL_INDEX_DIR, use_mmap: bool = True) -> "LexicalIndex":
+        with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        if meta["byteorder"] != sys.byteorder:
+            raise ValueError(f"Lexical index in '{directory}' was built on a {meta['byteorder']}-endian machine; rebuild it.")
+        doc_ids = _read_uint32(os.path.join(directory, DOC_IDS_FILE), use_mmap)
+        freqs = _read_uint32(os.path.join(directory, FREQS_FILE), use_mmap)
+        return cls(meta["docs"], meta["vocab"], doc_ids, freqs, meta["lengths"])
+
+    def __len__(self):
+        return len(self.docs)
+
+    def search(self, query: str, top_k: int = LEXICAL_TOP_K) -> list[dict]:
+        """
+        Returns the `top_k` BM25 matches for `query` as Pinecone-style hits
+        ({'_id', '_score', 'fields'}), plus '_coverage', the share of query terms
+        the chunk contains.
+        """
+        query_terms = set(tokenize(query))
+        terms = [term for term in query_terms if term in self.vocab]
+        if not terms:
+            return []
+        n_docs = len(self.docs)
+        scores = defaultdict(float)
+        matched = Counter()
+        for term in terms:
+            offset, count = self.vocab[term]
+            idf = math.log(1 + (n_docs - count + 0.5) / (count + 0.5))
+            for i in range(offset, offset + count):
+                number = self.doc_ids[i]
+                tf = self.freqs[i]
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[number] / self.avg_length)
+                scores[number] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+                matched[number] += 1
+
+        hits = []
+        for number, score in heapq.nlargest(top_k, scores.items(), key=lambda item: item[1]):
+            doc_id, topic, page_number, namespace, text = self.docs[number]
+            hits.append({
+                '_id': doc_id,
+                '_score': score,
+                '_coverage': matched[number] / len(query_terms),
+                'fields': {'chunk_text': text, 'topic': topic, 'page_number': page_number, 'namespace': namespace},
+            })
+        return hits
+
+
+def load_index(directory: str = LEXICAL_INDEX_DIR) -> LexicalIndex | None:
+    """Loads the saved index, or returns None (dense search only) if it has not been built."""
+    if not os.path.exists(os.path.join(directory, META_FILE)):
+        logging.info(f"No lexical index in '{directory}'; using dense search only.")
+        return None
+    try:
+        index = LexicalIndex.load(directory)
+    except Exception as e:
+        logging.error(f"Could not load lexical index from '{directory}': {e}")
+        return None
+    logging.info(f"Loaded lexical index with {len(index)} chunks and {len(index.vocab)} terms.")
+    return index
+
+
+if __name__ == "__main__":
+    # Usage: python lexical_index.py [records.json ...]  (defaults to the SOURCE_FILES in parse_pdf/)
+    paths = sys.argv[1:] or DEFAULT_SOURCES
+    index = LexicalIndex.build(paths)
+    index.save()
+    print(f"Indexed {len(index)} chunks ({len(index.vocab)} terms) from {len(paths)} files into '{LEXICAL_INDEX_DIR}'.")
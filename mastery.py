@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import time
+
+# --- MASTERY MODEL CONFIGURATION ---
+MASTERY_FILE = os.getenv("MASTERY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "mastery.json"))
+QUIZ_BANK_FILE = os.getenv("QUIZ_BANK_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "quiz_bank.json"))
+PRIOR_MASTERY = 0.5      # Assumed mastery of a topic before any answers are seen
+LEARNING_RATE = 0.3      # Weight of the newest answer in the moving average
+WEAK_THRESHOLD = 0.7     # Topics below this mastery are considered weak
+SAVE_INTERVAL = 60       # Seconds between periodic saves
+MAX_QUESTIONS_PER_TOPIC = 50
+
+
+def _write_json_atomic(path, data):
+    """Writes data to a temporary file and swaps it in so a crash never leaves half a file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path, default):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, json.JSONDecodeError) as e:
+        logging.error(f"Could not load '{path}': {e}")
+        return default
+
+
+class _PeriodicJsonStore:
+    """Base class for in-memory stores that are flushed to a JSON file at most every `save_interval` seconds."""
+
+    def __init__(self, path, save_interval):
+        self.path = path
+        self.save_interval = save_interval
+        self._dirty = False
+        self._last_save = time.monotonic()
+
+    def _to_json(self):
+        raise NotImplementedError
+
+    def save(self):
+        if not self._dirty:
+            return
+        try:
+            _write_json_atomic(self.path, self._to_json())
+            self._dirty = False
+        except OSError as e:
+            logging.error(f"Could not save '{self.path}': {e}")
+        self._last_save = time.monotonic()
+
+    def maybe_save(self):
+        """Saves only if the save interval has elapsed, so it is cheap to call per answer."""
+        if self._dirty and time.monotonic() - self._last_save >= self.save_interval:
+            self.save()
+
+
+class MasteryModel(_PeriodicJsonStore):
+    """
+    Tracks how well each user knows each topic (textbook section header).
+
+    Mastery is an exponential moving average of answer correctness, stored as
+    a two-item list `[mastery, attempts]` per (user, topic), so every answer is
+    an O(1) dictionary update. The whole model is written to disk at most once
+    every `save_interval` seconds.
+    """
+
+    def __init__(self, path=MASTERY_FILE, learning_rate=LEARNING_RATE, save_interval=SAVE_INTERVAL):
+        super().__init__(path, save_interval)
+        self.learning_rate = learning_rate
+        self._users: dict[int, dict[str, list]] = {}
+
+    def update(self, user_id: int, topic: str, correct: bool) -> float:
+        """Records one answer and returns the new mastery for the topic."""
+        topics = self._users.setdefault(user_id, {})
+        entry = topics.get(topic)
+        if entry is None:
+            entry = topics[topic] = [PRIOR_MASTERY, 0]
+        entry[0] += self.learning_rate * ((1.0 if correct else 0.0) - entry[0])
+        entry[1] += 1
+        self._dirty = True
+        return entry[0]
+
+    def mastery(self, user_id: int, topic: str) -> float:
+        entry = self._users.get(user_id, {}).get(topic)
+        return entry[0] if entry else PRIOR_MASTERY
+
+    def snapshot(self, user_id: int) -> dict[str, float]:
+        """Returns {topic: mastery} for every topic the user has answered."""
+        return {topic: entry[0] for topic, entry in self._users.get(user_id, {}).items()}
+
+    def weakest_topics(self, user_id: int, n: int = 2, threshold: float = WEAK_THRESHOLD) -> list[str]:
+        """Returns up to `n` of the user's topics with mastery below `threshold`, weakest first."""
+        topics = self._users.get(user_id, {})
+        weak = [(entry[0], topic) for topic, entry in topics.items() if entry[0] < threshold]
+        weak.sort()
+        return [topic for _, topic in weak[:n]]
+
+    def load(self):
+        data = _read_json(self.path, {})
+        self._users = {int(user_id): topics for user_id, topics in data.items()}
+        logging.info(f"Loaded mastery for {len(self._users)} users from '{self.path}'.")
+
+    def _to_json(self):
+        return self._users
+
+
+class QuizBank(_PeriodicJsonStore):
+    """
+    Stores previously generated quiz questions grouped by topic so weak areas
+    can be reviewed without another retrieval and generation round trip.
+    """
+
+    def __init__(self, path=QUIZ_BANK_FILE, max_per_topic=MAX_QUESTIONS_PER_TOPIC, save_interval=SAVE_INTERVAL):
+        super().__init__(path, save_interval)
+        self.max_per_topic = max_per_topic
+        self._questions: dict[str, list[dict]] = {}
+
+    def add(self, questions: list[dict], default_topic: str):
+        """Adds generated questions, filed under their own "topic" or `default_topic`."""
+        for question in questions:
+            topic = question.get("topic") or default_topic
+            bucket = self._questions.setdefault(topic, [])
+            if any(q["question"] == question["question"] for q in bucket):
+                continue
+            bucket.append(question)
+            if len(bucket) > self.max_per_topic:
+                del bucket[0]
+            self._dirty = True
+
+    def pick(self, topics: list[str], n: int, exclude: set[str] | None = None) -> list[dict]:
+        """Returns up to `n` questions, drawn round-robin from `topics` in the given order."""
+        exclude = exclude or set()
+        pools = [
+            [q for q in reversed(self._questions.get(topic, [])) if q["question"] not in exclude]
+            for topic in topics
+        ]
+        picked = []
+        while len(picked) < n and any(pools):
+            for pool in pools:
+                if pool and len(picked) < n:
+                    picked.append(pool.pop(0))
+        return picked
+
+    def load(self):
+        self._questions = _read_json(self.path, {})
+        logging.info(f"Loaded quiz bank with {len(self._questions)} topics from '{self.path}'.")
+
+    def _to_json(self):
+        return self._questions
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import time
+
+# --- STREAMING CONFIGURATION ---
+STREAM_EDIT_INTERVAL = 1.0     # Minimum seconds between edits of the same message
+TELEGRAM_MESSAGE_LIMIT = 4096  # Longer answers continue in a new message
+PLACEHOLDER = "..."
+
+
+class MessageStreamer:
+    """
+    Shows text as it is generated by repeatedly editing one chat message.
+
+    `send(text)` must post a new message and return it; `edit(message, text)`
+    must replace its text. Edits are debounced to one per `interval` seconds,
+    and a rate-limit error (anything with a `seconds` attribute, like
+    Telethon's FloodWaitError) pushes the next edit back by that long.
+    """
+
+    def __init__(self, send, edit, interval: float = STREAM_EDIT_INTERVAL, limit: int = TELEGRAM_MESSAGE_LIMIT):
+        self.send = send
+        self.edit = edit
+        self.interval = interval
+        self.limit = limit
+        self.full_text = ""
+        self._text = ""          # Text of the message currently being edited
+        self._message = None
+        self._shown = None
+        self._next_edit = 0.0
+
+    @property
+    def started(self) -> bool:
+        return self._message is not None
+
+    async def start(self) -> None:
+        self._message = await self.send(PLACEHOLDER)
+        self._shown = PLACEHOLDER
+        self._next_edit = time.monotonic() + self.interval
+
+    async def append(self, delta: str) -> None:
+        self.full_text += delta
+        self._text += delta
+        while len(self._text) > self.limit:
+            await self._roll_over()
+        if time.monotonic() >= self._next_edit:
+            await self._flush()
+
+    async def finish(self, suffix: str = "") -> str:
+        """Appends `suffix` (e.g. the citations), forces a final edit and returns the whole text."""
+        if suffix:
+            await self.append(suffix)
+        if self._text and self._text != self._shown:
+            await self._flush(final=True)
+        return self.full_text
+
+    async def _roll_over(self) -> None:
+        """Completes the current message at a line or word break and continues in a new one."""
+        cut = self._text.rfind("\n", 0, self.limit)
+        if cut <= 0:
+            cut = self._text.rfind(" ", 0, self.limit)
+        if cut <= 0:
+            cut = self.limit
+        head, self._text = self._text[:cut], self._text[cut:].lstrip()
+        await self._edit_with_retry(head)
+        self._message = await self.send(self._text[:self.limit] or PLACEHOLDER)
+        self._shown = self._text[:self.limit] or PLACEHOLDER
+
+    async def _flush(self, final: bool = False) -> None:
+        if self._text == self._shown:
+            return
+        if final:
+            await self._edit_with_retry(self._text)
+            return
+        try:
+            await self.edit(self._message, self._text)
+            self._shown = self._text
+            self._next_edit = time.monotonic() + self.interval
+        except Exception as e:
+            wait = getattr(e, "seconds", None) or self.interval
+            logging.warning(f"Streaming edit failed ({e}); next edit in {wait}s")
+            self._next_edit = time.monotonic() + wait
+
+    async def _edit_with_retry(self, text: str) -> None:
+        """Edits that must land (message completion) wait out one rate-limit error and retry."""
+        try:
+            await self.edit(self._message, text)
+        except Exception as e:
+            wait = getattr(e, "seconds", None)
+            if wait is None:
+                raise
+            await asyncio.sleep(wait)
+            await self.edit(self._message, text)
+        self._shown = text
+        self._next_edit = time.monotonic() + self.interval
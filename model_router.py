@@ -0,0 +1,158 @@
+import logging
+import os
+import time
+from collections import Counter, deque
+
+import google.generativeai as genai
+
+from rate_limiter import limiter, estimate_tokens, INTERACTIVE
+
+# --- MODEL TIERS ---
+# Ordered from strongest to fastest; fallbacks always move towards the end of this list.
+TIERS = {
+    "strong": "gemini-2.5-pro",
+    "standard": "gemini-2.5-flash",
+    "fast": "gemini-2.5-flash-lite",
+}
+TIER_ORDER = ["strong", "standard", "fast"]
+
+# Input price in USD per million tokens, used to check the per-call cost budget
+TIER_COSTS = {
+    "strong": 1.25,
+    "standard": 0.30,
+    "fast": 0.10,
+}
+
+# --- CALL SITES ---
+# latency_budget: p95 seconds before the site falls back to a faster tier
+# cost_budget: maximum estimated input cost in USD for one call
+CALL_SITES = {
+    "query_expansion": {"tier": "fast", "latency_budget": 2.0, "cost_budget": 0.001},
+    "quiz_generation": {"tier": "standard", "latency_budget": 15.0, "cost_budget": 0.01},
+    "final_answer": {"tier": "standard", "latency_budget": 10.0, "cost_budget": 0.01},
+    "pdf_extraction": {"tier": "standard", "latency_budget": 120.0, "cost_budget": 0.05},
+}
+
+LATENCY_WINDOW = 50   # Number of recent calls per call site and model used for the p95
+MIN_SAMPLES = 5       # p95 is not trusted until this many calls were observed
+PROBE_EVERY = 20      # While falling back on latency, every Nth call still probes the slower tier
+
+
+class ModelRouter:
+    """
+    Picks a model for each call site from its tier, latency budget and cost budget,
+    and records every routing decision and observed latency.
+    """
+
+    def __init__(self, api_key=None, call_sites=None, tiers=None):
+        self.api_key = api_key
+        self.call_sites = call_sites or CALL_SITES
+        self.tiers = tiers or TIERS
+        self._models = {}
+        self._latencies: dict[tuple[str, str], deque] = {}  # (site, model) -> recent latencies
+        self.decisions = Counter()  # (site, model, reason) -> count
+        self._latency_fallbacks = Counter()  # (site, tier) -> count
+
+    def _model(self, name: str):
+        if name not in self._models:
+            self._models[name] = genai.GenerativeModel(name)
+        return self._models[name]
+
+    def p95(self, site: str, model_name: str) -> float | None:
+        # Per call site: long pdf_extraction prompts must not push interactive sites off a model
+        samples = self._latencies.get((site, model_name))
+        if not samples or len(samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+
+    def record(self, site: str, model_name: str, reason: str) -> None:
+        self.decisions[(site, model_name, reason)] += 1
+        logging.info(f"Routing {site} -> {model_name} ({reason})")
+
+    def route(self, site: str, prompt: str = "") -> str:
+        """Returns the model name to use for `site`, falling back to faster tiers when over budget."""
+        config = self.call_sites[site]
+        start = TIER_ORDER.index(config["tier"])
+        tokens = estimate_tokens(prompt)
+        reason = "tier"
+        for tier in TIER_ORDER[start:]:
+            model_name = self.tiers[tier]
+            if tier == TIER_ORDER[-1]:
+                break
+            if tokens * TIER_COSTS[tier] / 1_000_000 > config["cost_budget"]:
+                reason = f"cost over budget on {tier}"
+                continue
+            p95 = self.p95(site, model_name)
+            if p95 is not None and p95 > config["latency_budget"]:
+                self._latency_fallbacks[(site, tier)] += 1
+                # Probe now and then so the tier can recover once its latency improves
+                if self._latency_fallbacks[(site, tier)] % PROBE_EVERY == 0:
+                    reason = f"probe, p95 {p95:.1f}s"
+                    break
+                reason = f"p95 {p95:.1f}s over budget on {tier}"
+                continue
+            break
+        self.record(site, model_name, reason)
+        return model_name
+
+    def skip(self, site: str, reason: str) -> None:
+        """Records that a call site was skipped entirely."""
+        self.record(site, "none", reason)
+
+    def _key(self, api_key):
+        return api_key or self.api_key or os.getenv("gemma_gemini_api")
+
+    def _observe(self, site: str, model_name: str, started: float) -> None:
+        self._latencies.setdefault((site, model_name), deque(maxlen=LATENCY_WINDOW)).append(time.perf_counter() - started)
+
+    async def generate(self, site: str, prompt: str, api_key=None, priority=INTERACTIVE, **kwargs):
+        """Routes, rate-limits and times one asynchronous generation call."""
+        model_name = self.route(site, prompt)
+        await limiter.acquire(self._key(api_key), model_name, estimate_tokens(prompt), priority)
+        started = time.perf_counter()
+        try:
+            return await self._model(model_name).generate_content_async(prompt, **kwargs)
+        finally:
+            self._observe(site, model_name, started)
+
+    async def stream(self, site: str, prompt: str, api_key=None, priority=INTERACTIVE, **kwargs):
+        """Like `generate`, but yields the response text piece by piece as the model produces it."""
+        model_name = self.route(site, prompt)
+        await limiter.acquire(self._key(api_key), model_name, estimate_tokens(prompt), priority)
+        started = time.perf_counter()
+        try:
+            response = await self._model(model_name).generate_content_async(prompt, stream=True, **kwargs)
+            async for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunks without text parts (e.g. a final safety or usage chunk)
+                    continue
+                if text:
+                    yield text
+        finally:
+            self._observe(site, model_name, started)
+
+    def generate_sync(self, site: str, prompt: str, api_key=None, **kwargs):
+        """Blocking variant of `generate` for the ingestion scripts, which run at batch priority."""
+        model_name = self.route(site, prompt)
+        limiter.acquire_sync(self._key(api_key), model_name, estimate_tokens(prompt))
+        started = time.perf_counter()
+        try:
+            return self._model(model_name).generate_content(prompt, **kwargs)
+        finally:
+            self._observe(site, model_name, started)
+
+    def report(self) -> str:
+        """Summarizes routing decisions and p95 latency per call site and model."""
+        lines = [f"{site} -> {model} ({reason}): {count}" for (site, model, reason), count in sorted(self.decisions.items())]
+        for site, model_name in sorted(self._latencies):
+            p95 = self.p95(site, model_name)
+            lines.append(f"{site} on {model_name} p95: {'n/a' if p95 is None else f'{p95:.2f}s'} "
+                         f"over {len(self._latencies[(site, model_name)])} calls")
+        return "\n".join(lines)
+
+
+# Shared process-wide router; without an explicit key it uses the one configured throughout the repo
+router = ModelRouter()
@@ -1,12 +1,18 @@
-import json
 from dotenv import load_dotenv
+import itertools
 import os
 import time
+import sys
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rate_limiter import limiter
+from record_io import iter_records
 
 # --- 1. Load Environment Variables and Data ---
 load_dotenv()
-with open("/workspaces/training_repository/parse_pdf/Grade_10_Biology_keyword_definitions.json", "r") as file:
-    records = json.load(file)
+# Records are read lazily, one batch at a time, so memory does not grow with the file
+records = iter_records("/workspaces/training_repository/parse_pdf/Grade_10_Biology_keyword_definitions.json")
 
 # --- 2. Prepare Records ---
 # Pinecone requires each record to have an 'id' field that is a string.
@@ -43,23 +49,23 @@ dense_index = pc.Index(index_name)
 # --- 5. Upsert Records in Batches (The New Structure) ---
 batch_size = 96  # Set the batch size as specified by the error message
 
-print(f"Total records to upsert: {len(records)}")
 print(f"Upserting in batches of {batch_size}...")
 
-# This loop iterates through the 'records' list in steps of 'batch_size'
-for i in range(0, len(records), batch_size):
-    # Slice the list to get the current batch
-    batch = records[i:i + batch_size]
-    
+# This loop takes 'batch_size' records at a time from the stream
+total = 0
+batch_num = 0
+while batch := list(itertools.islice(records, batch_size)):
     # Get the current batch number for logging
-    batch_num = (i // batch_size) + 1
+    batch_num += 1
+    total += len(batch)
     
     print(f"--> Upserting batch {batch_num} with {len(batch)} records...")
     
     # Upsert the current batch into the 'keywords' namespace
+    limiter.acquire_sync(os.getenv("pinecone_api"), "pinecone-upsert")
     dense_index.upsert_records(namespace="Grade-10-Biology-keyword-definitions", records=batch)
 
-print("\nAll batches have been successfully upserted.")
+print(f"\nAll batches have been successfully upserted ({total} records).")
 
 # --- 6. Verify the Upload ---
 # It's good practice to wait a moment for the index to update
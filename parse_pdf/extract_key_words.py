@@ -3,76 +3,128 @@ import pdfplumber
 import os
 from dotenv import load_dotenv
 import json # <-- 1. IMPORTED for robust JSON handling
+import sys
 
-def extract_text_from_pages(pages):
-    """Extracts text from a list of pdfplumber page objects."""
-    if not pages:
-        return ""
-    
-    full_text = ""
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_router import router
+from record_io import write_records
+from layout import KEY_WORDS_TEXT, key_words_blocks, page_headers
+from ocr import ocr_low_text_pages
+from page_store import PageTextStore
+
+# --- KEY WORDS SCAN CONFIGURATION ---
+MAX_BLOCK_CHARS_PER_CALL = 20000   # KEY WORDS blocks sent to Gemini in one call
+HEADER_LOOKBACK_PAGES = 10         # Pages searched backwards for the header enclosing a block
+
+def find_key_word_blocks(pages, store):
+    """
+    Finds the KEY WORDS boxes in the given pages without calling the model.
+
+    Pages are first filtered with a regex over their cached text; only the
+    pages that mention KEY WORDS are read for layout. Each block comes back
+    as {"page_number", "topic", "text"}. A page that mentions KEY WORDS but
+    has no recognisable box is returned whole, with its topic still resolved.
+    """
+    blocks = []
     for page in pages:
-        page_text = page.extract_text()
-        if page_text:
-            # Adding the page number to the text itself for better context
-            full_text += f"--- START OF PAGE {page.page_number} ---\n"
-            full_text += page_text + "\n"
-            full_text += f"--- END OF PAGE {page.page_number} ---\n\n"
-    return full_text
-
-def get_definitions_with_gemini(api_key, text_chunk):
-    """Sends a text chunk to the Gemini API to find and format definitions."""
+        text = store.text(page)
+        if not KEY_WORDS_TEXT.search(text):
+            continue
+        found = key_words_blocks(store.lines(page))
+        if not found:
+            found = [{"text": text, "top": None}]
+        for block in found:
+            blocks.append({
+                "page_number": page.page_number,
+                "topic": enclosing_header(pages, store, page.page_number, block["top"]),
+                "text": block["text"],
+            })
+    return blocks
+
+def enclosing_header(pages, store, page_number, top=None):
+    """
+    The nearest section header above a point on a page, looking back over earlier pages if needed.
+
+    Headers whose font confirms them win over numbered lines in body type;
+    returns None when none is found within HEADER_LOOKBACK_PAGES.
+    """
+    by_number = {page.page_number: page for page in pages}
+    fallback = None
+    for number in range(page_number, max(page_number - HEADER_LOOKBACK_PAGES, 0), -1):
+        page = by_number.get(number)
+        if page is None:
+            break
+        headers = page_headers(store.lines(page))
+        if number == page_number and top is not None:
+            headers = [header for header in headers if header[0] < top]
+        for _, text, confident in reversed(headers):
+            if confident:
+                return text
+            fallback = fallback or text
+    return fallback
+
+def block_batches(blocks, max_chars=MAX_BLOCK_CHARS_PER_CALL):
+    """Groups blocks into prompts of at most max_chars characters of block text."""
+    batch, size = [], 0
+    for block in blocks:
+        if batch and size + len(block["text"]) > max_chars:
+            yield batch
+            batch, size = [], 0
+        batch.append(block)
+        size += len(block["text"])
+    if batch:
+        yield batch
+
+def get_definitions_for_blocks_with_gemini(api_key, blocks):
+    """Sends pre-located KEY WORDS blocks, with their topic and page already known, to Gemini for formatting."""
     try:
         genai.configure(api_key=api_key)
-        # Using a model that is optimized for JSON output can improve reliability
-        model = genai.GenerativeModel('gemini-2.5-flash')
 
-        # Updated prompt to explicitly ask for a JSON list
+        sections = []
+        for block in blocks:
+            topic = block["topic"] or "unknown - use the nearest header in the text"
+            sections.append(f"--- BLOCK (page_number: {block['page_number']}, topic: {topic}) ---\n{block['text']}")
+        blocks_text = "\n\n".join(sections)
+
         prompt = f"""
         You are a helpful assistant that parses academic textbooks.
-        Your task is to look through the provided text and find all terms listed ONLY under a "KEY WORDS"section.
-        For each key word found, you must extract its definition exactly as provided in the text. Do not add or remove any information.
-        
-        You will format the output as a valid JSON list of objects. Each object must contain four key-value pairs:
-        1. "id": goes sequentially eg, "rec_1","rec_2","rec_3","rec_4","rec_5","rec_6","rec_7","rec_8".
-        2. "chunk text":The definition of the word as given in the text. it should have this format: "chunk text": "Photosynthesis is the process by which green plants and some other organisms use sunlight to synthesize foods with the help of chlorophyll." where photo synthesis is the keyword from the book and the definition is also the one from the book, but you should format it so it says "keyword means...." or "keyword is ....",
-        3. "topic": should be the nearest header you find that encloses the keywords context. the header should not be the following: "UNIT 1", "Activity", "KEY WORDS", "Contents", "Learning competencies", or "Figure". headers should look like :that start with a number, a period, and another number, like "1.1", "1.2", "1.3", etc. and headers that ask questions like "What is science?" or "what is the scientific Method?" and other headers that dont seem to be activities or figures[images] but rather descriptive statements like "validity" or "The methods of science" and dont extract text where its startes with "by the end of this section....", and it goes on to state the objective.
-        4. "page_number": the page number where the key word and definition were found, formatted as an integer.
+        Each block below is a "KEY WORDS" section from a textbook, headed by the page it is on and the topic that encloses it.
+        For each key word in a block, you must extract its definition exactly as provided in the text. Do not add or remove any information.
+
+        You will format the output as a valid JSON list of objects. Each object must contain three key-value pairs:
+        1. "chunk text": The definition of the word as given in the text, formatted so it says "keyword means...." or "keyword is ....".
+        2. "topic": the topic given in the block's header, copied exactly.
+        3. "page_number": the page_number given in the block's header, as an integer.
          **Example of Desired Output:**
         ```json
         [
           {{
-              
-        "id": "rec_1",
         "chunk text": "micro-organism is a very small organism, usually having just one cell.",
         "topic": "1.1 Bacteria",
         "page_number": 4
-    
           }}
         ]
         ```
-        If you find multiple key words, include all of them in the JSON list.
-        If no key words or definitions are found in this chunk, return an empty JSON list: []
+        Include every key word from every block in the JSON list.
+        If a block holds no key words or definitions, skip it. If none do, return an empty JSON list: []
 
-        Here is the text chunk:
-        {text_chunk}
+        Here are the blocks:
+        {blocks_text}
         """
 
-        response = model.generate_content(prompt)
-        
-        # Clean up the response to ensure it's valid JSON
-        # Models can sometimes wrap the JSON in markdown backticks
+        response = router.generate_sync("pdf_extraction", prompt, api_key=api_key)
+
         cleaned_response = response.text.strip().replace("```json", "").replace("```", "").strip()
-        
+
         return cleaned_response, None
     except Exception as e:
         return None, f"Error with Gemini API: {e}"
 
 def save_definitions_to_json(definitions_list, output_path):
-    """Saves the list of definition dictionaries to a JSON file."""
+    """Saves the list of definition dictionaries to a JSON file (JSONL for a .jsonl path)."""
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            # Use json.dump for proper JSON formatting and writing
-            json.dump(definitions_list, f, indent=4)
+        write_records(output_path, definitions_list, ensure_ascii=True)
         return True, None
     except Exception as e:
         return False, f"Error saving to JSON file: {e}"
@@ -121,29 +173,30 @@ def main():
                 pages_to_process = PAGES_TO_PROCESS
 
             print(f"Total pages in document: {num_total_pages}. Processing up to page {pages_to_process}.")
-            print(f"Processing in chunks of {CHUNK_SIZE} pages.")
 
-            for start_page in range(0, pages_to_process, CHUNK_SIZE):
-                end_page = min(start_page + CHUNK_SIZE, pages_to_process)
-                print(f"\nStep 1: Processing pages {start_page + 1} to {end_page}...")
+            # Locate the KEY WORDS boxes locally; only those go to the model
+            print("\nStep 1: Scanning pages for KEY WORDS sections...")
+            pages = pdf.pages[:pages_to_process]
+            store = PageTextStore(INPUT_PDF_PATH)
+            ocr_low_text_pages(INPUT_PDF_PATH, pages, store)
+            blocks = find_key_word_blocks(pages, store)
+            scanned_chars = sum(len(store.text(page)) for page in pages)
+            batches = list(block_batches(blocks))
+            block_chars = sum(len(block["text"]) for block in blocks)
+            print(f"Found {len(blocks)} KEY WORDS blocks on {len({block['page_number'] for block in blocks})} pages.")
+            print(f"Sending {block_chars} characters in {len(batches)} calls, instead of {scanned_chars} characters "
+                  f"in {-(-pages_to_process // CHUNK_SIZE)} calls for every {CHUNK_SIZE}-page chunk.")
+
+            for number, batch in enumerate(batches, start=1):
+                print(f"\nStep 2: Sending batch {number}/{len(batches)} (pages {batch[0]['page_number']}-{batch[-1]['page_number']}) to Gemini...")
+
+                definitions_str, error = get_definitions_for_blocks_with_gemini(YOUR_API_KEY, batch)
 
-                page_chunk = pdf.pages[start_page:end_page]
-                chunk_text = extract_text_from_pages(page_chunk)
-                
-                if not chunk_text:
-                    print("No text extracted from this chunk. Skipping.")
-                    continue
-                
-                print(f"Successfully extracted {len(chunk_text)} characters from chunk.")
-                print("Step 2: Sending text chunk to Gemini for analysis...")
-                
-                definitions_str, error = get_definitions_with_gemini(YOUR_API_KEY, chunk_text)
-                
                 if error:
                     print(error)
                     continue 
 
-                print("...definitions received from chunk.")
+                print("...definitions received from batch.")
                 
                 # --- 2. PARSE AND MERGE JSON DATA ---
                 if definitions_str:
@@ -168,6 +221,8 @@ def main():
     # --- 5. SORT THE FINAL LIST BEFORE SAVING ---
     print(f"Found a total of {len(all_definitions)} definitions. Sorting by page number...")
     sorted_definitions = sort_definitions_by_page(all_definitions)
+    # Ids follow page order across batches
+    sorted_definitions = [{"id": f"rec_{i + 1}", **definition} for i, definition in enumerate(sorted_definitions)]
 
     print(f"\nStep 3: Saving final list of definitions to '{OUTPUT_JSON_PATH}'...")
     success, error = save_definitions_to_json(sorted_definitions, OUTPUT_JSON_PATH)
@@ -5,11 +5,20 @@ import json
 from dotenv import load_dotenv
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import time
+import sys
 
-def extract_and_mark_page_text(pages):
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_router import router
+from record_io import write_records
+from ocr import ocr_low_text_pages
+from page_store import PageTextStore
+
+def extract_and_mark_page_text(pages, store=None):
     """
     Extracts text from a list of pdfplumber page objects and embeds page markers.
     The page number used is the actual page number from the PDF document.
+    Text is read through the PageTextStore when one is given.
     """
     if not pages:
         return ""
@@ -18,7 +27,7 @@ def extract_and_mark_page_text(pages):
     for page in pages:
         # Use the actual page number from the PDF
         page_number = page.page_number
-        page_text = page.extract_text()
+        page_text = store.text(page) if store is not None else page.extract_text()
         if page_text:
             # Add a clear marker at the beginning of each page's content
             full_text += f"\n\n--- PAGE {page_number} ---\n\n" + page_text
@@ -31,8 +40,6 @@ def get_structured_data_from_gemini(api_key, text_chunk):
     """
     try:
         genai.configure(api_key=api_key)
-        # Using a model with a larger context window is ideal for this task
-        model = genai.GenerativeModel('gemini-2.5-flash')
 
         # --- SYSTEM PROMPT: ONLY EXTRACT MULTIPLE ALTERNATIVE QUESTIONS ---
         system_prompt = f"""
@@ -69,7 +76,7 @@ Example output:
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
         }
 
-        response = model.generate_content(system_prompt, safety_settings=safety_settings)
+        response = router.generate_sync("pdf_extraction", system_prompt, api_key=api_key, safety_settings=safety_settings)
         # Basic validation of the response
         if not response.text:
             return None, "API returned an empty response."
@@ -91,10 +98,9 @@ Example output:
         return None, f"An error occurred with the Gemini API: {e}"
 
 def save_data_to_json(data_list, output_path):
-    """Saves the list of dictionaries to a JSON file."""
+    """Saves the list of dictionaries to a JSON file (JSONL for a .jsonl path)."""
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data_list, f, indent=4)
+        write_records(output_path, data_list, ensure_ascii=True)
         return True, None
     except Exception as e:
         return False, f"Error saving to JSON file: {e}"
@@ -117,6 +123,10 @@ def process_pdf_in_chunks(pdf_path, pages_per_chunk=10, max_chars_per_call=90000
         with pdfplumber.open(pdf_path) as pdf:
             total_pages = len(pdf.pages)
             print(f"\nTotal pages in PDF: {total_pages}")
+
+            # Scanned pages get their text from OCR up front, so no chunk comes out empty
+            store = PageTextStore(pdf_path)
+            ocr_low_text_pages(pdf_path, pdf.pages, store)
             
             # Process PDF in chunks of pages
             for start_page in range(0, total_pages, pages_per_chunk):
@@ -125,7 +135,7 @@ def process_pdf_in_chunks(pdf_path, pages_per_chunk=10, max_chars_per_call=90000
                 
                 # Get the specified range of pages
                 chunk_pages = pdf.pages[start_page:end_page]
-                chunk_text = extract_and_mark_page_text(chunk_pages)
+                chunk_text = extract_and_mark_page_text(chunk_pages, store)
                 
                 if not chunk_text.strip():
                     print(f"No text extracted from pages {start_page + 1} to {end_page}. Skipping.")
@@ -165,9 +175,6 @@ def process_pdf_in_chunks(pdf_path, pages_per_chunk=10, max_chars_per_call=90000
                                 print("    - Warning: API did not return a list. Response skipped.")
                         except json.JSONDecodeError:
                             print(f"    - CRITICAL: Could not decode JSON from API response.")
-                    
-                    # Add a small delay between batches to avoid rate limiting
-                    time.sleep(2)
                 
     except Exception as e:
         print(f"A critical error occurred while processing the PDF: {e}")
@@ -2,30 +2,205 @@ import google.generativeai as genai
 import pdfplumber
 import os
 import json
+import re
 from dotenv import load_dotenv
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
+import sys
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_router import router
+from record_io import write_records
+from ocr import ocr_low_text_pages
+from page_store import PageTextStore
+
+# --- TABLE DETECTION CONFIGURATION ---
+TABLE_SETTINGS = {"vertical_strategy": "lines", "horizontal_strategy": "lines"}  # Ruled tables, as textbooks print them
+MIN_TABLE_ROWS = 2
+MIN_TABLE_COLUMNS = 2
+CAPTION_SEARCH_HEIGHT = 80     # Points above a table searched for its "Table N.N" caption
+TABLES_PER_PROMPT = 8          # Detected tables summarized in one Gemini call
+MAX_TABLE_CHARS_PER_PROMPT = 30000
+
+# Only real tables: "Table 4.5 ...", never "Activity 2.3" or "Figure 1.2"
+TABLE_CAPTION = re.compile(r'^\s*Table\s+\d+(?:\.\d+)*\b.*$', re.MULTILINE)
+TABLE_NUMBER = re.compile(r'Table\s+(\d+(?:\.\d+)*)')
 
 # This function remains the same
-def extract_text_from_pages(pages):
-    """Extracts text from a list of pdfplumber page objects."""
+def extract_text_from_pages(pages, store=None):
+    """Extracts text from a list of pdfplumber page objects, through the PageTextStore when one is given."""
     if not pages:
         return ""
     
     full_text = ""
     for page in pages:
-        page_text = page.extract_text()
+        page_text = store.text(page) if store is not None else page.extract_text()
         if page_text:
             full_text += page_text + "\n"
     return full_text
 
-# This function and its detailed prompt remain the same
+def _clean_cell(cell):
+    return " ".join(cell.split()) if cell else ""
+
+
+def detect_tables(page):
+    """
+    Finds the ruled tables on a pdfplumber page and reads their cells directly.
+
+    Returns dicts with the caption ("Table N.N ..." above the table or in its
+    first row, None if there is none), the page number and the non-empty rows.
+    """
+    tables = []
+    for table in page.find_tables(TABLE_SETTINGS):
+        rows = [[_clean_cell(cell) for cell in row] for row in table.extract()]
+        rows = [row for row in rows if any(row)]
+        if not rows:
+            continue
+        caption = None
+        first_row = " ".join(cell for cell in rows[0] if cell)
+        if TABLE_CAPTION.match(first_row):
+            caption = first_row
+            rows = rows[1:]
+        else:
+            top = table.bbox[1]
+            above = page.crop((0, max(0, top - CAPTION_SEARCH_HEIGHT), page.width, top)).extract_text() or ""
+            captions = TABLE_CAPTION.findall(above)
+            if captions:
+                caption = " ".join(captions[-1].split())
+        if len(rows) < MIN_TABLE_ROWS or max(len(row) for row in rows) < MIN_TABLE_COLUMNS:
+            continue
+        tables.append({"table_name": caption, "page_number": page.page_number, "last_page": page.page_number, "rows": rows})
+    return tables
+
+
+def find_tables_in_pages(pages, store=None):
+    """
+    Detects the tables in a run of pages, joining a table that continues onto the next page.
+
+    Returns (tables, fallback_pages): fallback pages carry a table caption
+    with no ruled table found for it, so only their text still needs the model.
+    Captions are read through the PageTextStore when one is given, so a
+    scanned page's OCR text can still send it to the fallback.
+    """
+    tables = []
+    fallback_pages = []
+    for page in pages:
+        found = detect_tables(page)
+        for position, table in enumerate(found):
+            if table["table_name"] is None:
+                # Without a caption, the first table on a page continues the previous page's table;
+                # anything else is not a numbered table (activities, boxes)
+                previous = tables[-1] if tables else None
+                if position == 0 and previous and previous["last_page"] == page.page_number - 1:
+                    header = previous["rows"][0]
+                    previous["rows"] += table["rows"][1:] if table["rows"][0] == header else table["rows"]
+                    previous["last_page"] = page.page_number
+                continue
+            tables.append(table)
+        # Decided per caption: a ruled box elsewhere on the page must not hide an unruled table
+        detected = {TABLE_NUMBER.match(table["table_name"]).group(1) for table in found if table["table_name"]}
+        page_text = store.text(page) if store is not None else page.extract_text() or ""
+        captions = {TABLE_NUMBER.match(caption.strip()).group(1) for caption in TABLE_CAPTION.findall(page_text)}
+        if captions - detected:
+            fallback_pages.append(page)
+    return tables, fallback_pages
+
+
+def table_to_text(table):
+    """Linearizes a table row by row ("Header: value; ...") so it is searchable even without a summary."""
+    header, *body = table["rows"]
+    lines = [table["table_name"] + "."]
+    for row in body:
+        pairs = [f"{name}: {value}" if name else value for name, value in zip(header, row) if value]
+        if pairs:
+            lines.append("; ".join(pairs) + ".")
+    return " ".join(lines)
+
+
+def summarize_tables_with_gemini(api_key, tables):
+    """
+    Sends several detected tables in one prompt and returns {table index: summary paragraph}.
+    """
+    try:
+        genai.configure(api_key=api_key)
+        payload = json.dumps(
+            [{"table_id": i, "table_name": table["table_name"], "rows": table["rows"]} for i, table in enumerate(tables)],
+            ensure_ascii=False,
+        )
+        prompt = f"""
+        You are an expert data synthesizer and technical writer. Each item below is a table from a textbook, already extracted as rows of cells (the first row is the header). Comprehend the information and relationships each table contains and rewrite it as a dense, coherent, and self-contained paragraph.
+
+        **Instructions:**
+        1.  **Comprehend and Synthesize:** Do not just list the cells. Describe how the rows and columns relate, e.g. instead of "Process: Simple Diffusion" and "Requirement for ATP?: No", state "Simple diffusion is a process that does not require ATP."
+        2.  Begin each paragraph by stating the purpose or title of the table.
+        3.  **Crucial Constraint:** Do not add any information that is not present in the table. Do not omit any details from the table.
+
+        **Output Format:**
+        * Your output **MUST** be a single, valid JSON list with one object per table, each with exactly two keys:
+            1.  `"table_id"`: the `table_id` of the table, as an integer.
+            2.  `"chunk_text"`: the summary paragraph for that table.
+
+        **Tables:**
+        {payload}
+        """
+
+        safety_settings = {
+            HarmCategory.HARM_CATEGORY_HARASSMENT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_HATE_SPEECH: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_SEXUALLY_EXPLICIT: HarmBlockThreshold.BLOCK_NONE,
+            HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
+        }
+
+        response = router.generate_sync("pdf_extraction", prompt, api_key=api_key, safety_settings=safety_settings)
+
+        cleaned_response = response.text.strip()
+        if cleaned_response.startswith("```json"):
+            cleaned_response = cleaned_response[7:-3].strip()
+        summaries = json.loads(cleaned_response)
+        return {int(item["table_id"]): item["chunk_text"] for item in summaries
+                if isinstance(item, dict) and item.get("chunk_text")}, None
+    except Exception as e:
+        return {}, f"An error occurred while summarizing tables with Gemini: {e}"
+
+
+def table_prompt_batches(tables):
+    """Groups tables into prompts of at most TABLES_PER_PROMPT tables and MAX_TABLE_CHARS_PER_PROMPT characters."""
+    batch, size = [], 0
+    for table in tables:
+        table_size = sum(len(cell) for row in table["rows"] for cell in row)
+        if batch and (len(batch) == TABLES_PER_PROMPT or size + table_size > MAX_TABLE_CHARS_PER_PROMPT):
+            yield batch
+            batch, size = [], 0
+        batch.append(table)
+        size += table_size
+    if batch:
+        yield batch
+
+
+def tables_to_records(api_key, tables):
+    """Turns detected tables into table records, summarized in batched prompts; a table whose summary fails keeps its linearized rows."""
+    records = []
+    for batch in table_prompt_batches(tables):
+        print(f"     Summarizing {len(batch)} table(s) in one request...")
+        summaries, error = summarize_tables_with_gemini(api_key, batch)
+        if error:
+            print(f"     {error}")
+        for i, table in enumerate(batch):
+            records.append({
+                "table_name": table["table_name"],
+                "chunk_text": summaries.get(i) or table_to_text(table),
+                "page_number": table["page_number"],
+            })
+    return records
+
+
+# Used only for pages that mention a table the layout detection could not read
 def extract_headers_and_text_with_gemini(api_key, text_chunk):
     """
     Sends a text chunk to the Gemini API to identify numbered headers and extract their corresponding text.
     """
     try:
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
 
         prompt = f"""
         You are an expert data synthesizer and technical writer. Your primary task is to identify tables within the provided text from a textbook, comprehend the information and relationships they contain, and then rewrite that information as a dense, coherent, and self-contained paragraph.
@@ -79,7 +254,7 @@ def extract_headers_and_text_with_gemini(api_key, text_chunk):
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
         }
 
-        response = model.generate_content(prompt, safety_settings=safety_settings)
+        response = router.generate_sync("pdf_extraction", prompt, api_key=api_key, safety_settings=safety_settings)
         
         if response.candidates and response.candidates[0].finish_reason.name != "STOP":
             print(f"Warning: Content generation stopped for reason: {response.candidates[0].finish_reason.name}")
@@ -94,12 +269,38 @@ def extract_headers_and_text_with_gemini(api_key, text_chunk):
     except Exception as e:
         return None, f"An error occurred with the Gemini API: {e}"
 
+def normalize_records(parsed_data):
+    """Keeps the model's records that are objects with a usable page number, stored as an int."""
+    records = []
+    for record in parsed_data:
+        if not isinstance(record, dict):
+            continue
+        try:
+            record['page_number'] = int(record.get('page_number') or 0)
+        except (TypeError, ValueError):
+            continue
+        records.append(record)
+    if len(records) < len(parsed_data):
+        print(f"     Warning: dropped {len(parsed_data) - len(records)} malformed record(s) from the API response.")
+    return records
+
+
+def drop_detected_tables(records, tables):
+    """Drops fallback records for tables the layout pass already read; the fallback prompt extracts every table on its pages."""
+    detected = {TABLE_NUMBER.match(table["table_name"]).group(1) for table in tables}
+    kept = []
+    for record in records:
+        number = TABLE_NUMBER.search(str(record.get('table_name') or ''))
+        if number and number.group(1) in detected:
+            continue
+        kept.append(record)
+    return kept
+
 # This function remains the same
 def save_data_to_json(data_list, output_path):
-    """Saves the list of dictionaries to a JSON file."""
+    """Saves the list of dictionaries to a JSON file (JSONL for a .jsonl path)."""
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data_list, f, indent=4)
+        write_records(output_path, data_list, ensure_ascii=True)
         return True, None
     except Exception as e:
         return False, f"Error saving to JSON file: {e}"
@@ -116,8 +317,7 @@ def main():
     INPUT_PDF_PATH = "/workspaces/io_it/pdf's/Grade-9-Biology-Textbook.pdf"
     OUTPUT_JSON_PATH = "Grade_9_structured_biology_table.json"
     
-    # --- NEW: Define a batch size ---
-    # This is the number of pages to process in each API call. Tune if needed.
+    # Pages per API call for the fallback pages (tables without ruling lines). Tune if needed.
     BATCH_SIZE = 10
 
     PAGE_CHUNKS = {
@@ -141,11 +341,15 @@ def main():
 
     all_structured_data = []
 
-    print("--- Starting PDF Processing by Defined Chunks (in Batches) ---")
+    print("--- Starting PDF Processing by Defined Chunks (local table detection) ---")
     try:
         with pdfplumber.open(INPUT_PDF_PATH) as pdf:
             num_total_pages = len(pdf.pages)
-            print(f"Total pages in document: {num_total_pages}. Processing in batches of {BATCH_SIZE} pages.")
+            print(f"Total pages in document: {num_total_pages}.")
+            store = PageTextStore(INPUT_PDF_PATH)
+            # Scanned pages get their text from OCR before any caption is looked for, in one pass over every unit
+            unit_pages = [page for pages in PAGE_CHUNKS.values() for page in pdf.pages[pages['start']:pages['end']]]
+            ocr_low_text_pages(INPUT_PDF_PATH, unit_pages, store)
             
             # Loop over the main Units
             for chunk_name, pages in PAGE_CHUNKS.items():
@@ -157,40 +361,30 @@ def main():
                 if start_page >= num_total_pages:
                     print(f"Start page {start_page + 1} is out of bounds. Skipping unit.")
                     continue
-                
-                # --- NEW: Loop over the unit in smaller batches ---
-                for i in range(start_page, end_page, BATCH_SIZE):
-                    batch_start = i
-                    batch_end = min(i + BATCH_SIZE, end_page) # Ensure we don't go past the unit's end page
-                    
-                    print(f"  -> Processing batch: Pages {batch_start + 1} to {batch_end}")
-
-                    page_batch = pdf.pages[batch_start:batch_end]
-                    
-                    if not page_batch:
-                        continue
 
-                    batch_text = extract_text_from_pages(page_batch)
-                    
+                tables, fallback_pages = find_tables_in_pages(pdf.pages[start_page:end_page], store)
+                print(f"  -> Detected {len(tables)} table(s); {len(fallback_pages)} page(s) mention a table without a readable grid.")
+                all_structured_data.extend(tables_to_records(YOUR_API_KEY, tables))
+
+                # Only the pages the layout pass could not read go to the model as text
+                for i in range(0, len(fallback_pages), BATCH_SIZE):
+                    page_batch = fallback_pages[i:i + BATCH_SIZE]
+                    batch_text = extract_text_from_pages(page_batch, store)
                     if not batch_text.strip():
-                        print("No text extracted from this batch. Skipping.")
                         continue
-                    
-                    print(f"     Extracted {len(batch_text)} characters. Sending to Gemini...")
-                    
+
+                    print(f"     Sending {len(page_batch)} fallback page(s), {len(batch_text)} characters, to Gemini...")
                     structured_data_str, error = extract_headers_and_text_with_gemini(YOUR_API_KEY, batch_text)
-                    
+
                     if error:
                         print(f"     Error processing batch: {error}")
                         continue 
 
-                    print("     ...structured data received.")
-                    
                     if structured_data_str:
                         try:
                             parsed_data = json.loads(structured_data_str)
                             if isinstance(parsed_data, list):
-                                all_structured_data.extend(parsed_data)
+                                all_structured_data.extend(drop_detected_tables(normalize_records(parsed_data), tables))
                             else:
                                 print("     Warning: API did not return a list. Response skipped.")
                         except json.JSONDecodeError:
@@ -202,6 +396,9 @@ def main():
 
     print(f"\n--- All chunks processed. Found a total of {len(all_structured_data)} sections. ---")
     
+    # Fallback records come after each unit's detected tables; restore page order before numbering
+    all_structured_data.sort(key=lambda record: record['page_number'])
+
     # --- IMPORTANT: Re-apply sequential IDs after all data is collected ---
     final_data_with_ids = []
     for i, record in enumerate(all_structured_data):
@@ -5,11 +5,21 @@ import json
 from dotenv import load_dotenv
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import time
+import sys
 
-def extract_and_mark_page_text(pages):
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from model_router import router
+from record_io import write_records
+from layout import segment_sections
+from ocr import ocr_low_text_pages
+from page_store import PageTextStore
+
+def extract_and_mark_page_text(pages, store=None):
     """
     Extracts text from a list of pdfplumber page objects and embeds page markers.
     The page number used is the actual page number from the PDF document.
+    Text is read through the PageTextStore when one is given.
     """
     if not pages:
         return ""
@@ -18,7 +28,7 @@ def extract_and_mark_page_text(pages):
     for page in pages:
         # Use the actual page number from the PDF
         page_number = page.page_number
-        page_text = page.extract_text()
+        page_text = store.text(page) if store is not None else page.extract_text()
         if page_text:
             # Add a clear marker at the beginning of each page's content
             full_text += f"\n\n--- PAGE {page_number} ---\n\n" + page_text
@@ -31,8 +41,6 @@ def get_structured_data_from_gemini(api_key, text_chunk):
     """
     try:
         genai.configure(api_key=api_key)
-        # Using a model with a larger context window is ideal for this task
-        model = genai.GenerativeModel('gemini-2.5-flash')
 
         # --- REFINED SYSTEM PROMPT ---
         system_prompt = f"""
@@ -100,7 +108,7 @@ Your response **MUST** be a single, valid JSON list of objects. If no valid cont
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_NONE,
         }
 
-        response = model.generate_content(system_prompt, safety_settings=safety_settings)
+        response = router.generate_sync("pdf_extraction", system_prompt, api_key=api_key, safety_settings=safety_settings)
         
         # Basic validation of the response
         if not response.text:
@@ -110,11 +118,25 @@ Your response **MUST** be a single, valid JSON list of objects. If no valid cont
     except Exception as e:
         return None, f"An error occurred with the Gemini API: {e}"
 
+def normalize_records(parsed_data):
+    """Keeps the model's records that are objects with a usable page number, stored as an int."""
+    records = []
+    for record in parsed_data:
+        if not isinstance(record, dict):
+            continue
+        try:
+            record['page_number'] = int(record.get('page_number') or 0)
+        except (TypeError, ValueError):
+            continue
+        records.append(record)
+    if len(records) < len(parsed_data):
+        print(f"    - Warning: dropped {len(parsed_data) - len(records)} malformed record(s) from the API response.")
+    return records
+
 def save_data_to_json(data_list, output_path):
-    """Saves the list of dictionaries to a JSON file."""
+    """Saves the list of dictionaries to a JSON file (JSONL for a .jsonl path)."""
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data_list, f, indent=4)
+        write_records(output_path, data_list, ensure_ascii=True)
         return True, None
     except Exception as e:
         return False, f"Error saving to JSON file: {e}"
@@ -152,6 +174,10 @@ def main():
     print("--- Starting PDF Processing by Unit ---")
     try:
         with pdfplumber.open(INPUT_PDF_PATH) as pdf:
+            store = PageTextStore(INPUT_PDF_PATH)
+            # Scanned pages get their text from OCR before anything reads them, in one pass over every unit
+            unit_pages = [page for pages in PAGE_CHUNKS.values() for page in pdf.pages[pages['start'] - 1:pages['end']]]
+            ocr_low_text_pages(INPUT_PDF_PATH, unit_pages, store)
             for chunk_name, pages in PAGE_CHUNKS.items():
                 start_idx = pages['start'] - 1
                 end_idx = pages['end']
@@ -168,13 +194,22 @@ def main():
                     print("No pages found in this range. Skipping.")
                     continue
 
-                unit_text = extract_and_mark_page_text(unit_pages)
+                # Split the unit into sections locally; only pages the segmenter is unsure of go to Gemini
+                records, unclear_pages = segment_sections((page.page_number, store.lines(page)) for page in unit_pages)
+                all_structured_data.extend(records)
+                print(f"  > Segmented {len(unit_pages) - len(unclear_pages)} pages locally into {len(records)} sections.")
+
+                if not unclear_pages:
+                    continue
+                print(f"  > {len(unclear_pages)} pages could not be classified confidently: {unclear_pages}")
+                unclear_set = set(unclear_pages)
+                unit_text = extract_and_mark_page_text([page for page in unit_pages if page.page_number in unclear_set], store)
                 
                 if not unit_text.strip():
-                    print("No text extracted from this unit. Skipping.")
+                    print("No text extracted from the unclassified pages. Skipping.")
                     continue
                 
-                print(f"  > Extracted {len(unit_text)} characters for this unit.")
+                print(f"  > Extracted {len(unit_text)} characters from the unclassified pages.")
 
                 # --- NEW: Smart Batching Logic ---
                 text_batches = []
@@ -213,8 +248,9 @@ def main():
                         try:
                             parsed_data = json.loads(structured_data_str)
                             if isinstance(parsed_data, list):
-                                all_structured_data.extend(parsed_data)
-                                print(f"    - Successfully parsed and added {len(parsed_data)} records from batch.")
+                                records = normalize_records(parsed_data)
+                                all_structured_data.extend(records)
+                                print(f"    - Successfully parsed and added {len(records)} records from batch.")
                             else:
                                 print("    - Warning: API did not return a list. Response skipped.")
                         except json.JSONDecodeError:
@@ -227,6 +263,8 @@ def main():
 
     print(f"\n--- All units processed. Found a total of {len(all_structured_data)} sections. ---")
     
+    # Gemini's records for the unclassified pages slot back in among the local ones
+    all_structured_data.sort(key=lambda record: record['page_number'])
     final_data_with_ids = []
     for i, record in enumerate(all_structured_data):
         record['_id'] = f'rec_{i + 1}'
@@ -1,13 +1,25 @@
 # gemini_qa_bot.py
 
+import asyncio
 import os
+import sys
 import logging
 import re
 from dotenv import load_dotenv
 from telethon import TelegramClient, events
 from pinecone import Pinecone
 import google.generativeai as genai
-from collections import deque
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from retrieval import speculative_retrieve
+from reranker import rerank
+from context_compression import compress_chunks
+from lexical_index import load_index
+from conversation_history import ConversationStore, assemble_context
+from message_streamer import MessageStreamer
+from model_router import router
+from query_planner import planner
 
 # --- 1. SETUP AND INITIALIZATION ---
 
@@ -29,14 +41,22 @@ pc = Pinecone(api_key=PINECONE_API_KEY)
 genai.configure(api_key=GEMINI_API_KEY)
 
 # --- Pinecone and Gemini Model Setup ---
-model = genai.GenerativeModel('gemma-3-27b-it')
+# Models are picked per call site by model_router
+router.api_key = GEMINI_API_KEY
 index_name = "biology"
 logging.info(f"Connected to Pinecone for index: {index_name}")
-logging.info("Gemini Model 'gemma' initialized.")
+
+# --- Lexical Index ---
+# BM25 over the same records as Pinecone, fused with dense hits; build it with `python lexical_index.py`
+lexical_index = load_index()
 
 # --- Conversation Memory ---
-conversation_history = {}
-HISTORY_LENGTH = 5 # The number of past messages to remember
+# Recent turns per chat, least recently used chats evicted; see conversation_history.py
+history_store = ConversationStore()
+
+# --- Answer Delivery ---
+# Stream answers by editing one message as text arrives instead of waiting for the full answer
+STREAM_ANSWERS = True
 
 # --- 2. QUERY AND ANSWER LOGIC ---
 
@@ -45,7 +65,13 @@ async def generate_search_queries(user_query: str) -> list[str]:
     **MODIFIED**
     Dynamically generates conceptual search queries based on the alternatives in a multiple-choice question.
     The number of queries will match the number of options (e.g., A, B, C, D -> 4 queries).
+    Topics and questions the local query planner can handle skip the model call.
     """
+    planned_queries = planner.plan(user_query)
+    if planned_queries:
+        router.skip("query_expansion", "planned locally")
+        return planned_queries
+
     system_prompt = f"""
     You are a sophisticated query generation expert for a vector database. Your task is to analyze the user's question and generate a conceptual search query.
 
@@ -89,7 +115,7 @@ async def generate_search_queries(user_query: str) -> list[str]:
     **Conceptual Search Queries:**
     """
     try:
-        response = await model.generate_content_async(system_prompt)
+        response = await router.generate("query_expansion", system_prompt)
         # Split the response text by newlines and strip whitespace from each line
         queries = [query.strip() for query in response.text.strip().split('\n') if query.strip()]
         logging.info(f"Original query: '{user_query}' | Generated {len(queries)} conceptual queries: {queries}")
@@ -102,12 +128,26 @@ async def generate_search_queries(user_query: str) -> list[str]:
         # Fallback for any failure: use the original query as a single search query
         return [user_query]
 
-async def generate_final_answer(original_query: str, contents: str, history: str) -> str:
+def build_answer_prompt(original_query: str, contents: str, history: str, cite_sources: bool = True) -> str:
     """
-    Generates the final answer based on the ORIGINAL query, retrieved context, and conversation history.
-    The function is asynchronous.
+    Builds the final answer prompt. With `cite_sources=False` the model writes only the answer
+    and the caller appends the citations itself, which is what the streaming path does.
     """
-    system_prompt = f"""
+    if cite_sources:
+        citation_instructions = """
+    4.  **Cite Your Sources:**
+        * After the answer, list the sources you used.
+        * For each source, include its `ID`, `SCORE`, `TEXT_HEADER`, and `PAGE_NUMBER`.
+        * Format each citation exactly as: `Source: \n ID: [ID], SCORE: [SCORE], HEADER: [TEXT_HEADER], PAGE_NUMBER: [PAGE_NUMBER]`
+
+    **Output Mandate:**
+    * Your entire output must consist of two parts ONLY: the synthesized answer first, followed by the list of source citations."""
+    else:
+        citation_instructions = """
+    **Output Mandate:**
+    * Your entire output must be the synthesized answer ONLY. Do not list sources; they are added separately."""
+
+    return f"""
     You are a specialized AI assistant. Your sole purpose is to answer the user's query based exclusively on the provided search results and conversation history. You must adhere to the following instructions without deviation.
 
     **Conversation History:**
@@ -127,100 +167,101 @@ async def generate_final_answer(original_query: str, contents: str, history: str
         * Do not invent, infer, or use any information outside of the provided context.
         * Structure your answer to directly address the user's question format (e.g., for multiple choice, state the correct option and then explain why, for short-answer, provide a direct answer and explanation).
         * If you cannot find a suitable answer for "{original_query}", reply with "I'm sorry, there isn't a suitable answer to your question in the book."
-
-    4.  **Cite Your Sources:**
-        * After the answer, list the sources you used.
-        * For each source, include its `ID`, `SCORE`, `TEXT_HEADER`, and `PAGE_NUMBER`.
-        * Format each citation exactly as: `Source: \n ID: [ID], SCORE: [SCORE], HEADER: [TEXT_HEADER], PAGE_NUMBER: [PAGE_NUMBER]`
-
-    **Output Mandate:**
-    * Your entire output must consist of two parts ONLY: the synthesized answer first, followed by the list of source citations.
+{citation_instructions}
     * DO NOT add any introductory phrases, greetings, or concluding remarks.
     """
+
+async def generate_final_answer(original_query: str, contents: str, history: str) -> str:
+    """
+    Generates the final answer based on the ORIGINAL query, retrieved context, and conversation history.
+    The function is asynchronous.
+    """
+    system_prompt = build_answer_prompt(original_query, contents, history)
     try:
-        response = await model.generate_content_async(system_prompt)
+        response = await router.generate("final_answer", system_prompt)
         return response.text
     except Exception as e:
         logging.error(f"Error during final answer generation: {e}")
         return "There was an error generating the final answer."
 
+async def stream_final_answer(original_query: str, contents: str, history: str, citations: str, streamer: MessageStreamer) -> str:
+    """
+    Streams the final answer into `streamer` as Gemini produces it and appends the citations at the end.
+    Returns the complete text that was sent.
+    """
+    system_prompt = build_answer_prompt(original_query, contents, history, cite_sources=False)
+    await streamer.start()
+    try:
+        async for text in router.stream("final_answer", system_prompt):
+            await streamer.append(text)
+    except Exception as e:
+        logging.error(f"Error during streamed answer generation: {e}")
+        if not streamer.full_text:
+            return await streamer.finish("There was an error generating the final answer.")
+    return await streamer.finish(citations)
+
+def format_citations(hits: list) -> str:
+    """Formats the sources of the answer in the same layout the model uses when it cites them itself."""
+    lines = [
+        f"Source: \n ID: {hit.get('_id')}, SCORE: {round(hit.get('_score', 0), 2)}, "
+        f"HEADER: {hit.get('fields', {}).get('topic', 'N/A')}, PAGE_NUMBER: {hit.get('fields', {}).get('page_number', 'N/A')}"
+        for hit in hits
+    ]
+    return "\n\n" + "\n".join(lines) if lines else ""
+
 # MODIFIED: Function signature now accepts chat_id
-async def process_query(user_query: str, chat_id: int):
+async def process_query(user_query: str, chat_id: int, streamer: MessageStreamer | None = None):
     """
     **MODIFIED**
     Orchestrates the new multi-query workflow and handles conversation history.
+    If a `streamer` is given, the answer is streamed into it instead of being generated in one piece.
     """
-    # 1. First, generate multiple, conceptual search queries.
-    search_queries = await generate_search_queries(user_query)
-
-    # 2. Search all specified namespaces and indices using the generated queries.
+    # 1. Search all namespaces with the raw question while conceptual queries are generated,
+    #    then with the conceptual queries unless the raw question was already confident.
     index_name = "biology"
     dense_index = pc.Index(index_name)
-    index_stats = dense_index.describe_index_stats()
-    namespaces = list(index_stats.namespaces.keys())
-
     all_hits = []
-    seen_ids = set() # Use a set to track unique document IDs and avoid duplicates
 
     try:
-        # Loop through each generated query and search the database
-        for query in search_queries:
-            logging.info(f"Searching with conceptual query: '{query}'")
-            for ns in namespaces:
-                results = dense_index.search(
-                    namespace=ns,
-                    query={
-                        "top_k": 5, # Fetch a few results per conceptual query
-                        "inputs": {
-                            'text': query
-                        }
-                    }
-                )
-
-                for hit in results.get('result', {}).get('hits', []):
-                    doc_id = hit.get('_id')
-                    # If we haven't seen this document ID before, add its raw data
-                    if doc_id and doc_id not in seen_ids:
-                        seen_ids.add(doc_id)
-                        all_hits.append(hit)
-
+        all_hits = await speculative_retrieve(dense_index, user_query, generate_search_queries, PINECONE_API_KEY, lexical_index)
     except Exception as e:
         logging.error(f"Error searching Pinecone index '{index_name}': {e}")
 
-    # --- Sort all collected hits by score and select the top 4 ---
+    # --- Rerank all collected hits against the question and select the top 4 ---
+    all_contexts = []
+    top_4_hits = []
     if all_hits:
-        sorted_hits = sorted(all_hits, key=lambda k: k.get('_score', 0), reverse=True)
-        top_4_hits = sorted_hits[:4]
-        logging.info(f"Selected top {len(top_4_hits)} hits based on scores.")
-
-        all_contexts = []
-        for hit in top_4_hits:
+        # Cross-encoder inference is CPU-bound; run it off the event loop so other chats are not blocked
+        scored_hits = await asyncio.to_thread(rerank, user_query, all_hits)
+        top_4_hits = [hit for hit, _ in scored_hits[:4]]
+        logging.info(f"Selected top {len(top_4_hits)} of {len(all_hits)} hits after reranking.")
+
+        # Keep only the sentences relevant to the question, without near-duplicates across chunks
+        compressed = compress_chunks(user_query, [hit.get('fields', {}).get('chunk_text', '') for hit in top_4_hits])
+        for hit, chunk_text in zip(top_4_hits, compressed):
+            if not chunk_text:
+                continue
             formatted_result = (
                 f"ID: {hit.get('_id')} | SCORE: {round(hit.get('_score', 0), 2)} | PAGE_NUMBER: {hit.get('fields', {}).get('page_number', 'N/A')}\n"
                 f"TEXT_HEADER: {hit.get('fields', {}).get('topic', 'N/A')}\n"
-                f"TEXT_CONTENT: {hit.get('fields', {}).get('chunk_text', 'N/A')}\n\n"
+                f"TEXT_CONTENT: {chunk_text}\n\n"
             )
             all_contexts.append(formatted_result)
-        
-        full_context = "\n".join(all_contexts)
-    else:
-        full_context = ""
-    print(all_contexts)
-    if not full_context.strip():
+
+    if not all_contexts:
         logging.warning("No context found from Pinecone search after multiple attempts.")
         return "I'm sorry, I couldn't find any relevant information in the book to answer your question."
 
-    # 3. Get history, generate final answer, and update history
-    user_history = conversation_history.get(chat_id, deque(maxlen=HISTORY_LENGTH))
-    history_str = "\n".join([f"User: {q}\nBot: {a}" for q, a in user_history])
-    
-    # MODIFIED: Pass history_str to the answer generation function
-    final_answer = await generate_final_answer(user_query, full_context, history_str)
+    # 3. Fit history and retrieved chunks into the prompt budget, generate the final answer, and update history
+    history_str, full_context = assemble_context(history_store.get(chat_id), all_contexts)
+    if streamer is not None:
+        final_answer = await stream_final_answer(user_query, full_context, history_str, format_citations(top_4_hits), streamer)
+    else:
+        final_answer = await generate_final_answer(user_query, full_context, history_str)
     
-    # Update conversation history with the new exchange
+    # Update conversation history with the new exchange (citations are stripped when stored)
     if "I'm sorry" not in final_answer:
-        user_history.append((user_query, final_answer))
-        conversation_history[chat_id] = user_history
+        history_store.add_turn(chat_id, user_query, final_answer)
 
     return final_answer
 
@@ -232,8 +273,7 @@ async def start(event):
     """Handles the /start command."""
     chat_id = event.chat_id
     # Clear history for the user on /start
-    if chat_id in conversation_history:
-        del conversation_history[chat_id]
+    if history_store.clear(chat_id):
         logging.info(f"Cleared conversation history for chat_id: {chat_id}")
 
     welcome_message = (
@@ -257,8 +297,10 @@ async def message_handler(event):
 
     async with client.action(chat_id, 'typing'):
         try:
-            response_text = await process_query(user_query, chat_id)
-            await event.respond(response_text)
+            streamer = MessageStreamer(send=event.respond, edit=lambda message, text: message.edit(text)) if STREAM_ANSWERS else None
+            response_text = await process_query(user_query, chat_id, streamer)
+            if streamer is None or not streamer.started:
+                await event.respond(response_text)
             logging.info(f"Successfully sent response to chat_id {chat_id}")
             # Log only username, chat_id, user_query, and response_text
             log_entry = {
@@ -0,0 +1,242 @@
+import re
+
+# --- LAYOUT CONFIGURATION ---
+LINE_TOLERANCE = 3        # Points of vertical jitter still treated as the same line
+COLUMN_GAP = 3.0          # A horizontal gap this many font sizes wide is a column gutter, not a space
+HEADER_SIZE_RATIO = 1.08  # Font size over the page's body size that marks a heading
+MAX_HEADER_CHARS = 120
+MAX_UNNUMBERED_HEADER_CHARS = 80
+BLOCK_GAP_RATIO = 2.5     # A vertical gap of this many line heights ends a block
+MARGIN_BOX_SHARE = 0.45   # A heading starting past this share of the page width heads a side column
+
+# "1.1 Bacteria", "2.4.2 The methods of science"
+NUMBERED_HEADER = re.compile(r'^\d+(?:\.\d+)+\.?\s+\S')
+# ...whose title starts with a capital that is not a unit, unlike "2.5 mm of ..." or "0.9 % saline" in body text
+NUMBERED_TITLE = re.compile(r'^\d+(?:\.\d+)+\.?\s+(?!(?:[LMKJNWVC]|mL|kJ|kPa|Pa|Hz|°C)\b)[A-Z]')
+KEY_WORDS_HEADING = re.compile(r'^\s*key\s*words?\s*:?\s*$', re.IGNORECASE)
+KEY_WORDS_TEXT = re.compile(r'key\s*words?\b', re.IGNORECASE)
+# Headings that are never a section topic and end any block above them
+OTHER_HEADING = re.compile(
+    r'^\s*(?:unit\s+\d+|activity|figure|table\s+\d|contents|learning competencies|review questions?|summary|key\s*words?)\b',
+    re.IGNORECASE,
+)
+# Regions that are not section content: skipped up to the next header, or (captions, objectives) the next gap
+SKIP_TO_HEADER = re.compile(
+    r'^\s*(?:activity|learning competencies|review questions?|end of unit questions|key\s*(?:words?|terms))\b',
+    re.IGNORECASE,
+)
+# Running heads ("UNIT 3 Human biology") and contents lines are skipped like captions
+SKIP_TO_GAP = re.compile(r'^\s*(?:figure\s+\d|table\s+\d|unit\s+\d|contents\b|by the end of this section)', re.IGNORECASE)
+PAGE_NUMBER = re.compile(r'^\s*\d{1,4}\s*$')
+BOLD_FONT = re.compile(r'bold|black|heavy|semibold|demi', re.IGNORECASE)
+
+
+def _segment(words: list[dict]) -> dict:
+    chars = sum(len(word["text"]) for word in words)
+    return {
+        "text": " ".join(word["text"] for word in words),
+        "x0": round(words[0]["x0"], 1),
+        "x1": round(words[-1]["x1"], 1),
+        "top": round(min(word["top"] for word in words), 1),
+        "bottom": round(max(word["bottom"] for word in words), 1),
+        "size": round(sum(word["size"] * len(word["text"]) for word in words) / chars, 1),
+        "bold": sum(len(word["text"]) for word in words if BOLD_FONT.search(word["fontname"])) * 2 > chars,
+    }
+
+
+def page_lines(page) -> list[dict]:
+    """
+    Reads a page as line segments with their font metadata, top to bottom.
+
+    Each segment is {"text", "x0", "x1", "top", "bottom", "size", "bold"},
+    size being the average character size and bold meaning most characters
+    are set in a bold face. Words on one baseline that are separated by a
+    column gutter become separate segments, so a margin box is never merged
+    into the body text beside it.
+    """
+    words = sorted(page.extract_words(extra_attrs=["size", "fontname"]), key=lambda word: (word["top"], word["x0"]))
+    rows = []
+    for word in words:
+        if rows and abs(word["top"] - rows[-1][0]["top"]) <= LINE_TOLERANCE:
+            rows[-1].append(word)
+        else:
+            rows.append([word])
+
+    lines = []
+    for row in rows:
+        row.sort(key=lambda word: word["x0"])
+        segment = [row[0]]
+        for word in row[1:]:
+            if word["x0"] - segment[-1]["x1"] > COLUMN_GAP * word["size"]:
+                lines.append(_segment(segment))
+                segment = []
+            segment.append(word)
+        lines.append(_segment(segment))
+    return lines
+
+
+def body_size(lines: list[dict]) -> float:
+    """The font size most of the page's text is set in."""
+    weights = {}
+    for line in lines:
+        weights[line["size"]] = weights.get(line["size"], 0) + len(line["text"])
+    return max(weights, key=weights.get) if weights else 0.0
+
+
+def looks_like_heading(line: dict, body: float) -> bool:
+    return line["bold"] or (body > 0 and line["size"] >= body * HEADER_SIZE_RATIO)
+
+
+def section_header(line: dict, body: float) -> tuple[str | None, bool]:
+    """
+    Returns (header text, confident) when a line reads as a section header, else (None, False).
+
+    Numbered headers ("1.1 Bacteria") are recognised by their text and are
+    confident when their font also sets them apart from the body text; a
+    numbered line in body type may still be a list item. A number followed by
+    a unit or a lowercase word ("2.5 mm of ...") is body text unless its font
+    says otherwise. Unnumbered headers ("Antibiotics", "What is science?")
+    are only taken on font evidence.
+    """
+    text = line["text"].strip()
+    if not text or len(text) > MAX_HEADER_CHARS or OTHER_HEADING.match(text):
+        return None, False
+    heading = looks_like_heading(line, body)
+    if NUMBERED_TITLE.match(text):
+        return text, heading
+    if NUMBERED_HEADER.match(text):
+        return (text, True) if heading else (None, False)
+    if heading and text[0].isupper() and len(text) <= MAX_UNNUMBERED_HEADER_CHARS and text[-1] not in ".,;:":
+        return text, True
+    return None, False
+
+
+def key_words_blocks(lines: list[dict]) -> list[dict]:
+    """
+    Finds the KEY WORDS boxes on a page and returns {"text", "top"} for each.
+
+    A block starts at a line that is just "KEY WORDS" and takes the lines
+    below it in the heading's column. It ends at the next numbered header
+    or other heading (Activity, Figure, ...), or at a vertical gap wider than
+    BLOCK_GAP_RATIO line heights.
+    """
+    if not lines:
+        return []
+    width = max(line["x1"] for line in lines)
+    blocks = []
+    for i, heading in enumerate(lines):
+        if not KEY_WORDS_HEADING.match(heading["text"]):
+            continue
+        # A margin box sits right of the body text; body lines beside it start further left
+        left = heading["x0"] - 10 if heading["x0"] > width * MARGIN_BOX_SHARE else 0
+        block = []
+        previous = heading
+        for line in lines[i + 1:]:
+            if line["x0"] < left:
+                continue
+            height = max(previous["bottom"] - previous["top"], 1.0)
+            if line["top"] - previous["bottom"] > BLOCK_GAP_RATIO * height:
+                break
+            if NUMBERED_TITLE.match(line["text"]) or OTHER_HEADING.match(line["text"]):
+                break
+            block.append(line["text"])
+            previous = line
+        if block:
+            blocks.append({"text": "\n".join(block), "top": heading["top"]})
+    return blocks
+
+
+def page_headers(lines: list[dict]) -> list[tuple[float, str, bool]]:
+    """The section headers on a page as (top, text, confident), top to bottom."""
+    body = body_size(lines)
+    headers = []
+    for line in lines:
+        text, confident = section_header(line, body)
+        if text:
+            headers.append((line["top"], text, confident))
+    return headers
+
+
+def _join_lines(texts: list[str]) -> str:
+    # Undo end-of-line hyphenation ("organ-" + "ism") and join everything else with spaces
+    joined = ""
+    for text in texts:
+        if joined.endswith("-") and text[:1].islower():
+            joined = joined[:-1] + text
+        else:
+            joined = f"{joined} {text}" if joined else text
+    return joined
+
+
+def segment_sections(pages) -> tuple[list[dict], list[int]]:
+    """
+    Splits pages into section records without a model, from header regexes and font metadata.
+
+    `pages` yields (page_number, lines) in reading order, lines as from
+    page_lines. Returns ({"topic", "chunk_text", "page_number"} records, the
+    page numbers that could not be classified confidently). A page is
+    unclear when it holds a header-like line its font does not confirm, when
+    it has no font information at all (OCR lines, whose "bold" is None), or
+    when it has body text before any header has been seen; its text is left
+    out of the records so the caller can send just those pages to the model.
+
+    Activity, KEY WORDS, review questions and similar boxes are skipped up
+    to the next header (only within their column when they sit in a side
+    margin); figure and table captions and "By the end of this section"
+    objectives are skipped up to the next vertical gap.
+    """
+    records, unclear = [], []
+    topic, page_number, texts = None, None, []
+    skip = None  # (column left edge, "header" or "gap", last skipped line)
+
+    def flush():
+        if topic and texts:
+            records.append({"topic": topic, "chunk_text": _join_lines(texts), "page_number": page_number})
+        texts.clear()
+
+    for number, lines in pages:
+        if not lines:
+            continue
+        body = body_size(lines)
+        width = max(line["x1"] for line in lines)
+        classified = [(line, *section_header(line, body)) for line in lines]
+        if any(line["bold"] is None for line in lines) or any(text and not confident for _, text, confident in classified) or (
+            topic is None and not any(confident for _, _, confident in classified)
+        ):
+            flush()
+            unclear.append(number)
+            skip = None
+            # Carry on under the last header the font confirms, so the next page continues the right topic
+            for _, text, confident in classified:
+                if confident:
+                    topic, page_number = text, number
+            continue
+
+        # Only a full-width box skipped up to the next header runs on over the page break
+        if skip is not None and (skip[1] == "gap" or skip[0] > 0):
+            skip = None
+        for line, header, _ in classified:
+            if PAGE_NUMBER.match(line["text"]):
+                continue
+            if skip is not None and line["x0"] >= skip[0]:
+                previous = skip[2]
+                height = max(previous["bottom"] - previous["top"], 1.0)
+                gap = line["top"] - previous["bottom"] > BLOCK_GAP_RATIO * height
+                # Bold run-in lines inside a box ("Method", a key word) do not end it; a real section header does
+                ends = header and (NUMBERED_HEADER.match(header) or line["size"] >= body * HEADER_SIZE_RATIO)
+                if not ends and (skip[1] == "header" or not gap):
+                    skip = (skip[0], skip[1], line)
+                    continue
+                skip = None
+            if header:
+                flush()
+                topic, page_number = header, number
+                continue
+            if SKIP_TO_HEADER.match(line["text"]) or SKIP_TO_GAP.match(line["text"]):
+                left = line["x0"] - 10 if line["x0"] > width * MARGIN_BOX_SHARE else 0
+                skip = (left, "header" if SKIP_TO_HEADER.match(line["text"]) else "gap", line)
+                continue
+            if topic is not None:
+                texts.append(line["text"])
+    flush()
+    return records, unclear
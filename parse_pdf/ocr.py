@@ -0,0 +1,185 @@
+import hashlib
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import dumps_line, iter_records
+from page_store import PAGE_STORE_DIR
+
+# --- OCR CONFIGURATION ---
+OCR_DPI = int(os.getenv("OCR_DPI", "300"))
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(os.cpu_count() or 1)))
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")      # Tesseract language codes, e.g. "eng+amh"
+TESSERACT = os.getenv("TESSERACT_CMD", "tesseract")
+OCR_TIMEOUT = 120                                    # Seconds per page
+OCR_CACHE_FILE = os.path.join(PAGE_STORE_DIR, "ocr_cache.jsonl")
+MIN_PAGE_CHARS = 50        # Pages with fewer non-space characters than this are always OCRed
+SCAN_COVERAGE = 0.6        # Share of the page covered by images that marks a scan...
+SCAN_TEXT_CHARS = 500      # ...whose text layer (a watermark, a page number) is shorter than this
+
+
+def page_fingerprint(page, dpi: int = OCR_DPI, language: str = OCR_LANGUAGE) -> str:
+    """
+    SHA-256 of what a page draws: its content streams and the images they place.
+
+    Identical scanned pages hash alike across PDFs, and no rendering is needed
+    to look one up. The DPI and language are part of the key.
+    """
+    from pdfminer.pdftypes import resolve1
+
+    digest = hashlib.sha256(f"{dpi}:{language}:{page.width}x{page.height}".encode())
+    for stream in page.page_obj.contents:
+        digest.update(resolve1(stream).get_rawdata() or b"")
+    xobjects = resolve1((page.page_obj.resources or {}).get("XObject")) or {}
+    for name in sorted(xobjects):
+        digest.update(resolve1(xobjects[name]).get_rawdata() or b"")
+    return digest.hexdigest()
+
+
+def needs_ocr(page, text: str) -> bool:
+    """True for pages with next to no text, or scans whose text layer is only a watermark."""
+    chars = len("".join(text.split()))
+    if chars < MIN_PAGE_CHARS:
+        return True
+    if chars >= SCAN_TEXT_CHARS:
+        return False
+    covered = sum((image["x1"] - image["x0"]) * (image["bottom"] - image["top"]) for image in page.images)
+    return covered >= SCAN_COVERAGE * page.width * page.height
+
+
+def tsv_to_page(tsv: str, dpi: int) -> tuple[str, list[dict]]:
+    """
+    Turns Tesseract's TSV output into page text and line segments shaped like layout.page_lines.
+
+    Positions are converted from pixels to PDF points. A line's size is the
+    median height of its word boxes, which still varies with ascenders and
+    descenders; OCR gives no font names, so "bold" is None (unknown) and
+    layout.segment_sections leaves these pages to the model.
+    """
+    scale = 72 / dpi
+    lines, blocks = {}, {}
+    for row in tsv.splitlines()[1:]:
+        fields = row.split("\t")
+        if len(fields) < 12 or fields[0] != "5" or not fields[11].strip():
+            continue
+        block, paragraph, line = int(fields[2]), int(fields[3]), int(fields[4])
+        left, top, width, height = (int(value) * scale for value in fields[6:10])
+        lines.setdefault((block, paragraph, line), []).append((left, top, width, height, fields[11]))
+
+    segments = []
+    for key, words in lines.items():
+        segments.append({
+            "text": " ".join(word[4] for word in words),
+            "x0": round(words[0][0], 1),
+            "x1": round(words[-1][0] + words[-1][2], 1),
+            "top": round(min(word[1] for word in words), 1),
+            "bottom": round(max(word[1] + word[3] for word in words), 1),
+            "size": round(statistics.median(word[3] for word in words), 1),
+            "bold": None,
+        })
+        blocks.setdefault(key[:2], []).append(segments[-1]["text"])
+    segments.sort(key=lambda segment: (segment["top"], segment["x0"]))
+    text = "\n\n".join("\n".join(block) for block in blocks.values())
+    return text, segments
+
+
+# Each pool process opens the PDF once and renders pages from it
+_document = None
+
+
+def _open_document(pdf_path: str) -> None:
+    global _document
+    import pypdfium2
+    _document = pypdfium2.PdfDocument(pdf_path)
+
+
+def _ocr_page(page_index: int, dpi: int, language: str) -> str:
+    bitmap = _document[page_index].render(scale=dpi / 72, grayscale=True)
+    # Uncompressed PNM: encoding a 300 dpi PNG costs several times the render itself
+    image = BytesIO()
+    bitmap.to_pil().save(image, format="PPM")
+    # One Tesseract thread per page; the pool already keeps every core busy
+    env = {**os.environ, "OMP_THREAD_LIMIT": "1"}
+    result = subprocess.run(
+        [TESSERACT, "stdin", "stdout", "-l", language, "--dpi", str(dpi), "tsv"],
+        input=image.getvalue(), capture_output=True, timeout=OCR_TIMEOUT, env=env, check=True,
+    )
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+class OcrCache:
+    """Tesseract TSV output by page fingerprint, appended to a JSONL file shared by every PDF."""
+
+    def __init__(self, path: str = OCR_CACHE_FILE):
+        self.path = path
+        self.entries = {}
+        if os.path.exists(path):
+            for entry in iter_records(path):
+                self.entries[entry["hash"]] = entry["tsv"]
+
+    def get(self, fingerprint: str) -> str | None:
+        return self.entries.get(fingerprint)
+
+    def put(self, fingerprint: str, tsv: str) -> None:
+        self.entries[fingerprint] = tsv
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(dumps_line({"hash": fingerprint, "tsv": tsv}))
+
+
+def ocr_low_text_pages(pdf_path, pages, store, dpi=OCR_DPI, language=OCR_LANGUAGE, workers=OCR_WORKERS, cache=None) -> int:
+    """
+    OCRs the pages whose text layer is empty or a watermark over a scan, feeding the results into the page store.
+
+    Pages are rasterized and run through Tesseract in a process pool; pages
+    already OCRed for this PDF are skipped, and identical pages seen in any
+    PDF come from the OCR cache without rendering. Whatever OCR reads
+    replaces the page's text and line segments; pages it reads nothing on
+    keep their text layer. Returns the number of pages whose text was
+    replaced. Without Tesseract on the PATH, the pages are reported and left
+    as they are.
+    """
+    candidates = []
+    for page in pages:
+        text = store.text(page)
+        if not store.pages[page.page_number].get("ocr") and needs_ocr(page, text):
+            candidates.append(page)
+    if not candidates:
+        return 0
+    if shutil.which(TESSERACT) is None:
+        print(f"Warning: {len(candidates)} pages have little or no text, but Tesseract ('{TESSERACT}') is not installed; "
+              f"they are processed without OCR.")
+        return 0
+
+    cache = cache if cache is not None else OcrCache()
+    fingerprints = {page.page_number: page_fingerprint(page, dpi, language) for page in candidates}
+    missing = [page for page in candidates if cache.get(fingerprints[page.page_number]) is None]
+    print(f"OCR: {len(candidates)} low-text pages, {len(candidates) - len(missing)} from the cache, "
+          f"{len(missing)} to rasterize at {dpi} dpi on {min(workers, len(missing)) or 1} workers.")
+    if missing:
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing)), initializer=_open_document, initargs=(pdf_path,)) as pool:
+            futures = {page.page_number: pool.submit(_ocr_page, page.page_number - 1, dpi, language) for page in missing}
+            for page_number, future in futures.items():
+                try:
+                    cache.put(fingerprints[page_number], future.result())
+                except Exception as e:
+                    print(f"Warning: OCR failed on page {page_number}: {e}")
+
+    replaced = 0
+    for page in candidates:
+        tsv = cache.get(fingerprints[page.page_number])
+        if tsv is None:
+            continue
+        text, lines = tsv_to_page(tsv, dpi)
+        if text.strip():
+            store.put(page.page_number, text=text, lines=lines, source="ocr", ocr=True)
+            replaced += 1
+        else:
+            store.put(page.page_number, ocr=True)
+    return replaced
@@ -0,0 +1,60 @@
+import hashlib
+import os
+import sys
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import dumps_line, iter_records
+from layout import page_lines
+
+# --- PAGE STORE CONFIGURATION ---
+PAGE_STORE_DIR = os.getenv("PAGE_STORE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "page_store"))
+HASH_CHUNK = 1 << 20
+
+
+def file_fingerprint(path: str) -> str:
+    """SHA-256 of a file's bytes, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PageTextStore:
+    """
+    What the extraction scripts have read from each page of one PDF, kept across runs.
+
+    Entries live in <store_dir>/<sha256 of the PDF>.jsonl, one line appended
+    per page as soon as it is read, so an interrupted run keeps its work and
+    an edited PDF starts afresh. Later lines for a page update earlier ones,
+    which is how replacement text (OCR of a scanned page) takes over.
+    """
+
+    def __init__(self, pdf_path: str, store_dir: str = PAGE_STORE_DIR):
+        self.path = os.path.join(store_dir, f"{file_fingerprint(pdf_path)}.jsonl")
+        self.pages = {}
+        if os.path.exists(self.path):
+            for entry in iter_records(self.path):
+                self.pages.setdefault(entry["page_number"], {}).update(entry)
+
+    def text(self, page) -> str:
+        """The page's text, extracted with pdfplumber on first use."""
+        entry = self.pages.get(page.page_number, {})
+        if "text" not in entry:
+            self.put(page.page_number, text=page.extract_text() or "", source="pdfplumber")
+        return self.pages[page.page_number]["text"]
+
+    def lines(self, page) -> list[dict]:
+        """The page's line segments with font metadata (see layout.page_lines), read on first use."""
+        entry = self.pages.get(page.page_number, {})
+        if "lines" not in entry:
+            self.put(page.page_number, lines=page_lines(page))
+        return self.pages[page.page_number]["lines"]
+
+    def put(self, page_number: int, **fields) -> None:
+        """Records fields for a page and appends them to the store file."""
+        self.pages.setdefault(page_number, {"page_number": page_number}).update(fields)
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with open(self.path, "ab") as f:
+            f.write(dumps_line({"page_number": page_number, **fields}))
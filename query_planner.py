@@ -0,0 +1,133 @@
+import logging
+import re
+from collections import Counter
+
+# --- QUERY PLANNER CONFIGURATION ---
+MAX_TOPIC_WORDS = 4       # "/quiz cells", "/quiz cell membrane transport"
+MAX_QUESTION_WORDS = 10   # "What are cells?", "what is inversion?"
+MAX_OPTION_HEAD_WORDS = 4
+MAX_FOCUS_WORDS = 10
+REPORT_EVERY = 50         # Log the fast-path hit rate every N plans
+
+QUESTION_WORDS = ("what", "which", "who", "where", "when", "why", "how", "define", "explain", "describe")
+
+# Option markers such as "A. ", "b) " or "(C) " at the start of a line or after whitespace
+OPTION_MARKER = re.compile(r"(?:^|(?<=\s))\(?([A-Da-d])[.)]\s+", re.MULTILINE)
+# Splits "Chickenpox - runny nose - droplets" or "Measles: paralysis" into head and detail
+OPTION_HEAD_SPLIT = re.compile(r"\s+[-–—]\s+|\s*:\s+|,\s*")
+STEM_BOILERPLATE = re.compile(
+    r"\b(which|what)\s+(one\s+)?(of|among)\s+the\s+following\b|\bit\s*:\s*$|\bthe\s+following\b",
+    re.IGNORECASE,
+)
+FOCUS_STOPWORDS = {
+    "a", "an", "the", "is", "are", "was", "were", "be", "of", "with", "its", "their", "it",
+    "to", "in", "on", "by", "for", "which", "what", "one", "correctly", "matched", "best",
+    "most", "true", "false", "statement", "statements", "following", "about", "regarding",
+}
+
+
+def split_options(text: str) -> tuple[str, list[str]]:
+    """
+    Splits a multiple-choice question into its stem and options A, B, C, ...
+
+    Only a consecutive run of markers starting at A counts, so initials such
+    as "U.S." inside the stem are not mistaken for options.
+    """
+    run = []
+    expected = "a"
+    for match in OPTION_MARKER.finditer(text):
+        if match.group(1).lower() == expected:
+            run.append(match)
+            expected = chr(ord(expected) + 1)
+    if len(run) < 2:
+        return text.strip(), []
+    stem = text[:run[0].start()].strip()
+    options = []
+    for i, match in enumerate(run):
+        end = run[i + 1].start() if i + 1 < len(run) else len(text)
+        options.append(" ".join(text[match.end():end].split()))
+    return stem, options
+
+
+def option_head(option: str) -> str:
+    """Returns the subject of an option, e.g. "Chickenpox" for "Chickenpox - runny nose - droplets"."""
+    return OPTION_HEAD_SPLIT.split(option, maxsplit=1)[0].strip(" .;")
+
+
+def stem_focus(stem: str) -> str:
+    """Reduces a question stem to the content words that say what is being asked about each option."""
+    stem = STEM_BOILERPLATE.sub(" ", stem.replace("?", " "))
+    words = [w for w in re.findall(r"[\w'-]+", stem) if w.lower() not in FOCUS_STOPWORDS]
+    return " ".join(words[:MAX_FOCUS_WORDS])
+
+
+def _is_subject_option(option: str) -> bool:
+    """True for options naming a concept ("Polio - fecal-oral route"), False for sentence completions."""
+    head = option_head(option)
+    words = head.split()
+    if not words or len(words) > MAX_OPTION_HEAD_WORDS:
+        return False
+    # Sentence completions ("undergoes conformational change.") start lowercase and run on
+    return head[0].isupper() or head[0].isdigit() or len(words) <= 2
+
+
+class QueryPlanner:
+    """
+    Builds search queries locally for inputs that do not need an LLM:
+    short topics, short direct questions and multiple-choice questions whose
+    options name separate concepts. `plan` returns None for anything else,
+    and the caller falls back to LLM query expansion.
+    """
+
+    def __init__(self):
+        self.stats = Counter()
+
+    def plan(self, text: str) -> list[str] | None:
+        text = text.strip()
+        queries, kind = self._plan(text)
+        self.stats[kind] += 1
+        total = sum(self.stats.values())
+        if total % REPORT_EVERY == 0:
+            logging.info(f"Query planner: {self.report()}")
+        return queries
+
+    def _plan(self, text: str) -> tuple[list[str] | None, str]:
+        if not text:
+            return None, "empty"
+        stem, options = split_options(text)
+        if options:
+            if all(_is_subject_option(option) for option in options):
+                focus = stem_focus(stem)
+                queries = []
+                for option in options:
+                    head = option_head(option)
+                    query = f"{head} {focus}" if focus else f"what is {head}"
+                    if query not in queries:
+                        queries.append(query)
+                return queries, "mcq"
+            return None, "llm"
+
+        words = text.split()
+        if "\n" not in text and len(words) <= MAX_TOPIC_WORDS and "?" not in text:
+            return [text], "topic"
+        if (
+            "\n" not in text
+            and len(words) <= MAX_QUESTION_WORDS
+            and text.count("?") <= 1
+            and words[0].lower() in QUESTION_WORDS
+        ):
+            return [text], "question"
+        return None, "llm"
+
+    def hit_rate(self) -> float:
+        total = sum(self.stats.values())
+        return (total - self.stats["llm"] - self.stats["empty"]) / total if total else 0.0
+
+    def report(self) -> str:
+        total = sum(self.stats.values())
+        breakdown = ", ".join(f"{kind}={count}" for kind, count in sorted(self.stats.items()))
+        return f"fast-path hit rate {self.hit_rate():.0%} over {total} requests ({breakdown})"
+
+
+# Shared process-wide planner
+planner = QueryPlanner()
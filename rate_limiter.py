@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+# --- RATE LIMIT CONFIGURATION ---
+# (requests per minute, tokens per minute) for each model or service; None disables that bucket.
+MODEL_LIMITS = {
+    "gemini-2.5-pro": (5, 250_000),
+    "gemini-2.5-flash": (10, 250_000),
+    "gemini-2.5-flash-lite": (15, 250_000),
+    "gemma-3-27b-it": (30, 15_000),
+    "pinecone-search": (100, None),
+    "pinecone-upsert": (100, None),
+}
+DEFAULT_LIMITS = (10, 250_000)
+
+INTERACTIVE = "interactive"  # Live bot traffic
+BATCH = "batch"              # Ingestion and embedding jobs
+
+# Fraction of every bucket that batch jobs may never consume, so live users always have headroom
+BATCH_RESERVE = 0.3
+
+# Set RATE_LIMIT_DB to a file path to share buckets between the bots and ingestion scripts
+RATE_LIMIT_DB = os.getenv("RATE_LIMIT_DB")
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (about 4 characters per token) used to charge the tokens/min bucket."""
+    return len(text) // 4 + 1
+
+
+def _take(state: dict, buckets: list, floor_fraction: float, now: float) -> float:
+    """
+    Takes `amount` from every bucket at once, or from none of them.
+
+    `state` maps bucket name to (level, updated_at). Returns 0 on success,
+    otherwise the number of seconds until every bucket could cover the request.
+    """
+    levels = {}
+    wait = 0.0
+    for name, capacity, rate, amount in buckets:
+        level, updated_at = state.get(name, (capacity, now))
+        level = min(capacity, level + (now - updated_at) * rate)
+        levels[name] = level
+        floor = floor_fraction * capacity
+        # A request larger than the whole bucket can never fit; let it through once the bucket is full
+        needed = min(amount + floor, capacity)
+        if level < needed:
+            wait = max(wait, (needed - level) / rate)
+    for name, capacity, rate, amount in buckets:
+        state[name] = (levels[name] - amount if wait == 0 else levels[name], now)
+    return wait
+
+
+class _MemoryStore:
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def take(self, buckets, floor_fraction):
+        with self._lock:
+            return _take(self._state, buckets, floor_fraction, time.time())
+
+
+class _SqliteStore:
+    """Keeps bucket levels in a SQLite file so separate processes draw from the same quota."""
+
+    def __init__(self, path):
+        self.path = path
+        with sqlite3.connect(self.path) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, level REAL, updated_at REAL)")
+
+    def take(self, buckets, floor_fraction):
+        conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+        try:
+            # BEGIN IMMEDIATE holds the write lock across the read-modify-write
+            conn.execute("BEGIN IMMEDIATE")
+            names = [name for name, _, _, _ in buckets]
+            rows = conn.execute(
+                f"SELECT name, level, updated_at FROM buckets WHERE name IN ({','.join('?' * len(names))})", names
+            ).fetchall()
+            state = {name: (level, updated_at) for name, level, updated_at in rows}
+            wait = _take(state, buckets, floor_fraction, time.time())
+            conn.executemany(
+                "INSERT OR REPLACE INTO buckets (name, level, updated_at) VALUES (?, ?, ?)",
+                [(name, *state[name]) for name in names],
+            )
+            conn.execute("COMMIT")
+            return wait
+        finally:
+            conn.close()
+
+
+class RateLimiter:
+    """
+    Token-bucket limiter with a requests/min and a tokens/min bucket per (API key, model).
+
+    Interactive callers may drain a bucket completely; batch callers stop at
+    `batch_reserve` of capacity and also yield while interactive callers in
+    this process are waiting.
+    """
+
+    def __init__(self, limits=None, db_path=RATE_LIMIT_DB, batch_reserve=BATCH_RESERVE):
+        self.limits = limits or MODEL_LIMITS
+        self.batch_reserve = batch_reserve
+        self._store = _SqliteStore(db_path) if db_path else _MemoryStore()
+        self._interactive_waiting = 0
+
+    def _buckets(self, api_key: str, model: str, tokens: int) -> list:
+        # Never store raw keys; a short digest is enough to separate quotas
+        key_id = hashlib.sha1((api_key or "").encode()).hexdigest()[:8]
+        rpm, tpm = self.limits.get(model, DEFAULT_LIMITS)
+        buckets = []
+        if rpm:
+            buckets.append((f"{key_id}:{model}:requests", rpm, rpm / 60, 1))
+        if tpm:
+            buckets.append((f"{key_id}:{model}:tokens", tpm, tpm / 60, tokens))
+        return buckets
+
+    def _try(self, buckets: list, priority: str) -> float:
+        if priority == BATCH:
+            if self._interactive_waiting:
+                return 0.5
+            return self._store.take(buckets, self.batch_reserve)
+        return self._store.take(buckets, 0.0)
+
+    async def acquire(self, api_key: str, model: str, tokens: int = 1, priority: str = INTERACTIVE) -> None:
+        """Waits until the call fits in both buckets for this key and model."""
+        buckets = self._buckets(api_key, model, tokens)
+        if not buckets:
+            return
+        if priority == INTERACTIVE:
+            self._interactive_waiting += 1
+        # The SQLite transaction can block for up to its lock timeout; keep it off the event loop
+        blocking = isinstance(self._store, _SqliteStore)
+        try:
+            while True:
+                wait = await asyncio.to_thread(self._try, buckets, priority) if blocking else self._try(buckets, priority)
+                if wait <= 0:
+                    return
+                logging.info(f"Rate limit reached for {model} ({priority}); waiting {wait:.1f}s")
+                await asyncio.sleep(wait)
+        finally:
+            if priority == INTERACTIVE:
+                self._interactive_waiting -= 1
+
+    def acquire_sync(self, api_key: str, model: str, tokens: int = 1, priority: str = BATCH) -> None:
+        """Blocking variant of `acquire` for the synchronous ingestion scripts."""
+        buckets = self._buckets(api_key, model, tokens)
+        while buckets:
+            wait = self._try(buckets, priority)
+            if wait <= 0:
+                return
+            print(f"    - Rate limit reached for {model}; waiting {wait:.1f}s")
+            time.sleep(wait)
+
+
+# Shared process-wide limiter
+limiter = RateLimiter()
@@ -0,0 +1,141 @@
+import json
+import os
+from typing import Callable, Iterable, Iterator
+
+try:
+    import orjson
+except ImportError:  # The standard library does the same job, only slower
+    orjson = None
+
+# --- RECORD I/O CONFIGURATION ---
+READ_CHUNK = 1 << 16     # Characters read at a time from a JSON array file
+JSON_INDENT = 4          # Layout of .json files, as the extraction scripts have always written them
+SEPARATORS = " \t\r\n,"
+NUMBER_CHARS = "0123456789+-.eE"  # Characters that may continue a number cut off at a chunk boundary
+
+
+def is_jsonl(path: str) -> bool:
+    return path.endswith(".jsonl")
+
+
+def loads(data: str | bytes):
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+
+def dumps_line(record, ensure_ascii: bool = False) -> bytes:
+    """One record as a compact UTF-8 JSON line, newline included; `ensure_ascii` escapes non-ASCII text as json.dumps does."""
+    if orjson is not None and not ensure_ascii:
+        return orjson.dumps(record, option=orjson.OPT_APPEND_NEWLINE)
+    return (json.dumps(record, ensure_ascii=ensure_ascii, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def _dumps_item(record, ensure_ascii: bool = False) -> bytes:
+    # One element of an indented array, byte for byte what json.dump(records, indent=4, ensure_ascii=...) writes
+    text = json.dumps(record, ensure_ascii=ensure_ascii, indent=JSON_INDENT)
+    pad = " " * JSON_INDENT
+    return (pad + text.replace("\n", "\n" + pad)).encode("utf-8")
+
+
+def _iter_json_array(f) -> Iterator:
+    """Yields the items of a top-level JSON array one at a time, holding only about READ_CHUNK characters."""
+    decoder = json.JSONDecoder()
+    buffer, position, eof, opened = "", 0, False, False
+    while True:
+        # Skip whitespace and commas, reading on when the buffer runs out
+        while True:
+            while position < len(buffer) and buffer[position] in SEPARATORS:
+                position += 1
+            if position < len(buffer) or eof:
+                break
+            buffer, position = f.read(READ_CHUNK), 0
+            eof = not buffer
+        if position >= len(buffer):
+            if not opened:
+                return
+            raise ValueError(f"Unterminated JSON array in '{f.name}'")
+        if not opened:
+            if buffer[position] != "[":
+                raise ValueError(f"'{f.name}' does not hold a JSON array of records")
+            opened = True
+            position += 1
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, position)
+            # A value is only known to be whole once something other than a number character follows it:
+            # "1." or "1e" at the buffer edge decodes as 1, and "12" may be the start of "123"
+            complete = eof or (end < len(buffer) and buffer[end] not in NUMBER_CHARS)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            complete = False
+        if not complete:
+            more = f.read(READ_CHUNK)
+            eof = not more
+            buffer, position = buffer[position:] + more, 0
+            continue
+        yield item
+        position = end
+
+
+def iter_records(path: str) -> Iterator:
+    """
+    Yields the records of a .jsonl file (one per line) or a .json array, one at a time.
+
+    Neither format is loaded whole, so memory does not grow with the file.
+    JSONL lines are parsed with orjson when it is installed.
+    """
+    if is_jsonl(path):
+        with open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+    else:
+        with open(path, "r", encoding="utf-8") as f:
+            yield from _iter_json_array(f)
+
+
+def write_records(path: str, records: Iterable, ensure_ascii: bool = False) -> int:
+    """
+    Writes records one at a time as JSONL, or as an indented JSON array for a .json path; returns the count.
+
+    The file is replaced atomically once every record is written, so `records`
+    may be a generator that is still reading the same path. Non-ASCII text is
+    written as UTF-8 unless `ensure_ascii` asks for json.dump's \\u escapes.
+    """
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    count = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            if is_jsonl(path):
+                for record in records:
+                    f.write(dumps_line(record, ensure_ascii))
+                    count += 1
+            else:
+                f.write(b"[")
+                for record in records:
+                    f.write(b",\n" if count else b"\n")
+                    f.write(_dumps_item(record, ensure_ascii))
+                    count += 1
+                f.write(b"\n]" if count else b"]")
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return count
+
+
+def map_records(input_path: str, transform: Callable, output_path: str | None = None) -> int:
+    """Streams every record through `transform` into `output_path` (in place by default; the extensions pick the formats)."""
+    return write_records(output_path or input_path, (transform(record) for record in iter_records(input_path)))
+
+
+def map_field(input_path: str, field: str, func: Callable, output_path: str | None = None) -> int:
+    """Streaming map over one field; records without `field` are copied unchanged."""
+    def transform(record):
+        if field in record:
+            record[field] = func(record[field])
+        return record
+    return map_records(input_path, transform, output_path)
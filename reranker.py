@@ -0,0 +1,120 @@
+import logging
+import math
+import os
+from collections import Counter
+
+from retrieval import tokenize
+
+# --- RERANKER CONFIGURATION ---
+RERANK_CANDIDATES = 20   # Only the best candidates by dense score are rescored, bounding latency
+DENSE_WEIGHT = 0.5       # Blend of normalized dense score and BM25 in the hybrid scorer
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Directory with an exported cross-encoder (model.onnx + tokenizer.json), e.g. ms-marco-MiniLM-L-6-v2.
+# When unset or unavailable, the BM25 + dense hybrid scorer is used.
+RERANKER_MODEL_DIR = os.getenv("RERANKER_MODEL_DIR")
+CROSS_ENCODER_MAX_LENGTH = 512
+
+
+def _chunk_text(hit: dict) -> str:
+    return hit.get('fields', {}).get('chunk_text', '') or ''
+
+
+def _normalize(scores: list[float]) -> list[float]:
+    low, high = min(scores), max(scores)
+    if high == low:
+        return [1.0] * len(scores)
+    return [(score - low) / (high - low) for score in scores]
+
+
+def bm25_scores(query: str, texts: list[str]) -> list[float]:
+    """BM25 of `query` against each text, with document statistics taken from the candidate pool itself."""
+    query_terms = set(tokenize(query))
+    docs = [Counter(tokenize(text)) for text in texts]
+    if not query_terms or not docs:
+        return [0.0] * len(texts)
+    lengths = [sum(doc.values()) for doc in docs]
+    avg_length = sum(lengths) / len(lengths) or 1.0
+    idf = {}
+    for term in query_terms:
+        df = sum(1 for doc in docs if term in doc)
+        idf[term] = math.log(1 + (len(docs) - df + 0.5) / (df + 0.5))
+    scores = []
+    for doc, length in zip(docs, lengths):
+        score = 0.0
+        for term in query_terms:
+            tf = doc.get(term)
+            if not tf:
+                continue
+            score += idf[term] * tf * (BM25_K1 + 1) / (tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avg_length))
+        scores.append(score)
+    return scores
+
+
+class CrossEncoder:
+    """Scores (query, passage) pairs with an ONNX cross-encoder in one batched CPU pass."""
+
+    def __init__(self, model_dir: str):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, "model.onnx"), providers=["CPUExecutionProvider"]
+        )
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=CROSS_ENCODER_MAX_LENGTH)
+        self.tokenizer.enable_padding()
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def score(self, query: str, texts: list[str]) -> list[float]:
+        import numpy as np
+
+        encodings = self.tokenizer.encode_batch([(query, text) for text in texts])
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        logits = self.session.run(None, {name: value for name, value in feeds.items() if name in self.input_names})[0]
+        return logits.reshape(len(texts), -1)[:, 0].tolist()
+
+
+_cross_encoder = None
+_cross_encoder_failed = False
+
+
+def _load_cross_encoder():
+    global _cross_encoder, _cross_encoder_failed
+    if _cross_encoder is None and not _cross_encoder_failed and RERANKER_MODEL_DIR:
+        try:
+            _cross_encoder = CrossEncoder(RERANKER_MODEL_DIR)
+            logging.info(f"Loaded cross-encoder reranker from '{RERANKER_MODEL_DIR}'.")
+        except Exception as e:
+            _cross_encoder_failed = True
+            logging.warning(f"Cross-encoder unavailable ({e}); using the BM25 + dense hybrid reranker.")
+    return _cross_encoder
+
+
+def rerank(query: str, hits: list, max_candidates: int = RERANK_CANDIDATES) -> list[tuple[dict, float]]:
+    """
+    Rescores merged search hits against `query` and returns (hit, score) pairs, best first.
+
+    Only the top `max_candidates` hits by Pinecone score are rescored, in a
+    single batched pass. Scores are normalized to [0, 1]. Hits are not
+    modified, since they may be shared between coalesced requests.
+    """
+    candidates = sorted(hits, key=lambda hit: hit.get('_score', 0), reverse=True)[:max_candidates]
+    if not candidates:
+        return []
+    texts = [_chunk_text(hit) for hit in candidates]
+
+    cross_encoder = _load_cross_encoder()
+    if cross_encoder is not None:
+        scores = _normalize(cross_encoder.score(query, texts))
+    else:
+        dense = _normalize([hit.get('_score', 0) for hit in candidates])
+        lexical = _normalize(bm25_scores(query, texts))
+        scores = [DENSE_WEIGHT * d + (1 - DENSE_WEIGHT) * l for d, l in zip(dense, lexical)]
+
+    return sorted(zip(candidates, scores), key=lambda pair: pair[1], reverse=True)
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+import re
+
+from rate_limiter import limiter
+
+# --- RETRIEVAL CONFIGURATION ---
+SEARCH_TOP_K = 5
+SPECULATIVE_CONFIDENCE = 0.45  # Minimum score for a speculative hit to count as confident
+MIN_CONFIDENT_HITS = 4         # Confident hits needed to skip the expanded queries (the bots use the top 4)
+MIN_EXACT_LEXICAL_HITS = 2     # Lexical hits containing every query term that also skip the expanded queries
+RRF_K = 60                     # Reciprocal rank fusion constant; larger values flatten the rank weighting
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the their this to was "
+    "were what when where which who why will with does do can".split()
+)
+
+
+def _fold_plural(token: str) -> str:
+    """"bonds" -> "bond"; light enough to leave "glucose", "mitosis" and "virus" alone."""
+    if len(token) > 3 and token.endswith("s") and not token.endswith(("ss", "us", "is")):
+        return token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens without stopwords, plurals folded, shared by the lexical scorers."""
+    return [_fold_plural(token) for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+async def list_namespaces(dense_index) -> list[str]:
+    index_stats = await asyncio.to_thread(dense_index.describe_index_stats)
+    return list(index_stats.namespaces.keys())
+
+
+async def search_namespace(dense_index, namespace: str, query: str, api_key: str, top_k: int = SEARCH_TOP_K) -> list:
+    """Runs one Pinecone search in a worker thread so searches do not block the event loop."""
+    await limiter.acquire(api_key, "pinecone-search")
+    results = await asyncio.to_thread(
+        dense_index.search,
+        namespace=namespace,
+        query={
+            "top_k": top_k,
+            "inputs": {
+                'text': query
+            }
+        }
+    )
+    return results.get('result', {}).get('hits', [])
+
+
+def hit_key(hit: dict) -> tuple:
+    """Identifies a chunk across searches; record IDs alone repeat between namespaces."""
+    return hit.get('_id'), hit.get('fields', {}).get('chunk_text')
+
+
+def merge_hits(*hit_lists) -> list:
+    """Merges hit lists, keeping the best-scoring copy of each chunk."""
+    best = {}
+    for hits in hit_lists:
+        for hit in hits:
+            if not hit.get('_id'):
+                continue
+            key = hit_key(hit)
+            if key not in best or hit.get('_score', 0) > best[key].get('_score', 0):
+                best[key] = hit
+    return list(best.values())
+
+
+def fuse_hits(*ranked_lists, k: int = RRF_K) -> list:
+    """
+    Reciprocal rank fusion of hit lists whose scores are not comparable (dense and BM25).
+
+    Each list is ranked by its own '_score'. Returns copies of the hits, best
+    first, with '_score' replaced by the fused score as a share of the best
+    possible one (first in every list = 1.0).
+    """
+    fused = {}
+    hits_by_key = {}
+    for hits in ranked_lists:
+        for rank, hit in enumerate(sorted(merge_hits(hits), key=lambda h: h.get('_score', 0), reverse=True)):
+            key = hit_key(hit)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank + 1)
+            hits_by_key.setdefault(key, hit)
+    best_possible = len(ranked_lists) / (k + 1)
+    return [
+        {**hits_by_key[key], '_score': score / best_possible}
+        for key, score in sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    ]
+
+
+async def search_all(dense_index, namespaces: list[str], queries: list[str], api_key: str) -> list:
+    """Searches every namespace with every query concurrently and merges the hits."""
+    for query in queries:
+        logging.info(f"Searching with conceptual query: '{query}'")
+    results = await asyncio.gather(*(
+        search_namespace(dense_index, ns, query, api_key) for query in queries for ns in namespaces
+    ))
+    return merge_hits(*results)
+
+
+def is_confident(hits: list, threshold: float = SPECULATIVE_CONFIDENCE, min_hits: int = MIN_CONFIDENT_HITS) -> bool:
+    return sum(1 for hit in hits if hit.get('_score', 0) >= threshold) >= min_hits
+
+
+def has_exact_matches(lexical_hits: list, min_hits: int = MIN_EXACT_LEXICAL_HITS) -> bool:
+    return sum(1 for hit in lexical_hits if hit.get('_coverage', 0) >= 1.0) >= min_hits
+
+
+async def speculative_retrieve(dense_index, user_query: str, expand, api_key: str, lexical_index=None) -> list:
+    """
+    Searches with the raw user query while `expand(user_query)` generates conceptual queries.
+
+    If the raw query alone already returns enough confident hits, the expansion
+    is cancelled and those hits are returned. Otherwise the expanded queries are
+    searched too and all hits are merged.
+
+    With a `lexical_index` (see lexical_index.py), every query is also looked up
+    in BM25, chunks containing every query term count towards skipping the
+    expansion, and the lexical and dense hits are fused by rank.
+    """
+    expansion = asyncio.ensure_future(expand(user_query))
+    lexical_hits = lexical_index.search(user_query) if lexical_index is not None else []
+    try:
+        namespaces = await list_namespaces(dense_index)
+        speculative_hits = await search_all(dense_index, namespaces, [user_query], api_key)
+    except BaseException:
+        expansion.cancel()
+        raise
+
+    if is_confident(speculative_hits) or has_exact_matches(lexical_hits):
+        if not expansion.done():
+            expansion.cancel()
+        logging.info(f"Speculative search for '{user_query}' was confident; skipped expanded queries.")
+        return fuse_hits(speculative_hits, lexical_hits) if lexical_index is not None else speculative_hits
+
+    queries = [query for query in await expansion if query != user_query]
+    dense_hits = speculative_hits
+    if queries:
+        dense_hits = merge_hits(speculative_hits, await search_all(dense_index, namespaces, queries, api_key))
+    if lexical_index is None:
+        return dense_hits
+    for query in queries:
+        lexical_hits = lexical_hits + lexical_index.search(query)
+    return fuse_hits(dense_hits, lexical_hits)
@@ -0,0 +1,36 @@
+import asyncio
+import logging
+import re
+
+
+def normalize_key(text: str) -> str:
+    """Normalizes a user topic so that "Photosynthesis!" and " photosynthesis" share one request."""
+    return " ".join(re.findall(r"\w+", text.lower()))
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent identical requests into one in-flight task.
+
+    The first caller for a key starts the work; every caller that arrives
+    while it is still running awaits the same task. The result is shared
+    between callers, so it must be treated as read-only.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+        self.calls = 0
+        self.shared = 0
+
+    async def do(self, key, func, *args):
+        self.calls += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(func(*args))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.shared += 1
+            logging.info(f"Joined in-flight request for {key[0] if isinstance(key, tuple) else key!r} ({self.shared}/{self.calls} calls shared)")
+        # Shield the shared task so one caller being cancelled does not cancel it for the others
+        return await asyncio.shield(task)
@@ -5,16 +5,27 @@ import json
 from dotenv import load_dotenv
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import asyncio
+import sys
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rate_limiter import BATCH
+from model_router import router
+from record_io import write_records
+# OCR and the page store live with the other extraction helpers
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "parse_pdf"))
+from ocr import ocr_low_text_pages
+from page_store import PageTextStore
 
 # This function remains the same
-def extract_text_from_pages(pages):
-    """Extracts text from a list of pdfplumber page objects."""
+def extract_text_from_pages(pages, store=None):
+    """Extracts text from a list of pdfplumber page objects, through the PageTextStore when one is given."""
     if not pages:
         return ""
     
     full_text = ""
     for page in pages:
-        page_text = page.extract_text()
+        page_text = store.text(page) if store is not None else page.extract_text()
         if page_text:
             # Adding the page number to the text provides better context for the LLM
             full_text += f"\n--- Page {page.page_number} ---\n" + page_text
@@ -27,7 +38,6 @@ async def extract_headers_and_text_with_gemini_async(api_key, text_chunk, page_n
     """
     try:
         genai.configure(api_key=api_key)
-        model = genai.GenerativeModel('gemini-2.5-flash')
         
         prompt = f"""
         You are an expert assistant specializing in parsing mathematical and scientific textbooks.
@@ -77,7 +87,7 @@ async def extract_headers_and_text_with_gemini_async(api_key, text_chunk, page_n
         }
         
         # Use the asynchronous version of the generate_content method
-        response = await model.generate_content_async(prompt, safety_settings=safety_settings)
+        response = await router.generate("pdf_extraction", prompt, api_key=api_key, priority=BATCH, safety_settings=safety_settings)
         
         cleaned_response = response.text.strip()
         if cleaned_response.startswith("```json"):
@@ -90,10 +100,9 @@ async def extract_headers_and_text_with_gemini_async(api_key, text_chunk, page_n
 
 # This function remains the same
 def save_data_to_json(data_list, output_path):
-    """Saves the list of dictionaries to a JSON file."""
+    """Saves the list of dictionaries to a JSON file (JSONL for a .jsonl path)."""
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data_list, f, indent=4)
+        write_records(output_path, data_list, ensure_ascii=True)
         return True, None
     except Exception as e:
         return False, f"Error saving to JSON file: {e}"
@@ -140,6 +149,10 @@ async def main():
         with pdfplumber.open(INPUT_PDF_PATH) as pdf:
             tasks = []
             last_known_topic = "General Mathematics"
+            store = PageTextStore(INPUT_PDF_PATH)
+            # Scanned pages get their text from OCR before the batches are built
+            unit_pages = [page for pages in PAGE_CHUNKS.values() for page in pdf.pages[pages['start'] - 1:pages['end']]]
+            ocr_low_text_pages(INPUT_PDF_PATH, unit_pages, store)
 
             for chunk_name, pages_info in PAGE_CHUNKS.items():
                 start_page = pages_info['start']
@@ -155,7 +168,7 @@ async def main():
                         continue
 
                     page_batch = pdf.pages[batch_start:batch_end]
-                    batch_text = extract_text_from_pages(page_batch)
+                    batch_text = extract_text_from_pages(page_batch, store)
                     
                     if not batch_text.strip():
                         continue
@@ -0,0 +1,465 @@
+import asyncio
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+from functools import lru_cache
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import iter_records
+
+# --- RENDER CONFIGURATION ---
+DEFAULT_PREAMBLE = r"""\usepackage{amsmath}
+\usepackage{amsfonts}
+\usepackage{amssymb}"""
+RENDER_CACHE_DIR = os.getenv("LATEX_RENDER_CACHE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "render_cache"))
+FORMAT_DIR = os.path.join(RENDER_CACHE_DIR, "formats")  # Precompiled preambles, one per engine and header
+RENDER_FORMATS = ("png", "svg")
+TEXT_WIDTH = "16cm"      # Prose in solutions wraps at this width; formulas are cropped tightly
+COMPILE_TIMEOUT = 120    # Seconds for one batch compile or conversion
+RENDER_WORKERS = int(os.getenv("LATEX_RENDER_WORKERS", "2"))  # TeX processes the async renderer runs at once
+RENDER_BATCH_SIZE = 32   # Most queued expressions one async worker typesets in a single compile
+JOB_TIMEOUT = 60         # Seconds an async caller waits for its images before giving up
+PRERENDER_TIMEOUT = 1800  # Seconds prerender_solutions waits for a whole unit
+USE_PRECOMPILED_FORMAT = os.getenv("LATEX_PRECOMPILED_FORMAT", "1") != "0"  # Load the preamble from a dumped format
+
+
+class RenderError(Exception):
+    pass
+
+
+def render_key(expression: str, preamble: str, dpi: int, fmt: str) -> str:
+    """Content address of one rendered image."""
+    return hashlib.sha256(json.dumps([expression, preamble, dpi, fmt]).encode("utf-8")).hexdigest()
+
+
+def document_header(preamble: str = DEFAULT_PREAMBLE) -> str:
+    return f"\\documentclass[preview,multi,varwidth={TEXT_WIDTH}]{{standalone}}\n{preamble}\n"
+
+
+def build_document(expressions: list[str], preamble: str = DEFAULT_PREAMBLE, precompiled: bool = False) -> str:
+    """
+    One standalone document with a separate, tightly cropped page per expression.
+
+    With `precompiled` the class and preamble are left out, because they are
+    loaded from the format made by `ensure_format`.
+    """
+    pages = "\n".join(f"\\begin{{preview}}\n{expression}\n\\end{{preview}}" for expression in expressions)
+    body = (
+        "\\begin{document}\n"
+        f"{pages}\n"
+        "\\end{document}\n"
+    )
+    return body if precompiled else document_header(preamble) + body
+
+
+@lru_cache(maxsize=None)
+def engine_version(engine: str) -> str:
+    result = subprocess.run([engine, "--version"], capture_output=True, text=True, timeout=COMPILE_TIMEOUT)
+    return result.stdout.split("\n", 1)[0]
+
+
+_format_lock = threading.Lock()
+_format_failures: set[str] = set()
+
+
+def ensure_format(engine: str, header: str, format_dir: str) -> str | None:
+    """
+    Returns the name of a precompiled format holding `header` (the class line and preamble), dumping it on first use.
+
+    The name hashes the engine, its version and the header, so editing the
+    preamble or upgrading TeX builds a new format instead of loading a stale
+    one. Returns None if the header cannot be dumped; callers then compile
+    with the full preamble. Load the format with `-fmt=<name>` and `format_env`.
+    """
+    digest = hashlib.sha256(json.dumps([engine, engine_version(engine), header]).encode("utf-8")).hexdigest()
+    name = f"{engine}_{digest[:16]}"
+    path = os.path.join(format_dir, f"{name}.fmt")
+    if os.path.exists(path):
+        return name
+    with _format_lock:
+        if name in _format_failures:
+            return None
+        if os.path.exists(path):
+            return name
+        with tempfile.TemporaryDirectory(prefix="tex_format_") as workdir:
+            with open(os.path.join(workdir, f"{name}.tex"), "w", encoding="utf-8") as f:
+                f.write(header + "\\dump\n")
+            try:
+                result = subprocess.run(
+                    [engine, "-ini", f"-jobname={name}", "-interaction=nonstopmode", "-halt-on-error", f"&{engine}", f"{name}.tex"],
+                    cwd=workdir, capture_output=True, timeout=COMPILE_TIMEOUT,
+                )
+            except subprocess.TimeoutExpired:
+                result = None
+            built = os.path.join(workdir, f"{name}.fmt")
+            if result is None or result.returncode != 0 or not os.path.exists(built):
+                print(f"    - Could not precompile the preamble for {engine}; compiling it every time instead.")
+                _format_failures.add(name)
+                return None
+            with open(built, "rb") as f:
+                _write_atomic(path, f.read())
+        return name
+
+
+def format_env(format_dir: str) -> dict:
+    """Environment that lets TeX find the formats in `format_dir` besides its own."""
+    # The trailing separator keeps the default search path
+    return {**os.environ, "TEXFORMATS": format_dir + os.pathsep}
+
+
+def latex_command(tex_path: str, format_name: str | None = None) -> list[str]:
+    command = ["latex", "-interaction=nonstopmode", "-halt-on-error"]
+    if format_name:
+        command.append(f"-fmt={format_name}")
+    return command + [os.path.basename(tex_path)]
+
+
+def convert_command(dvi_path: str, fmt: str, dpi: int) -> list[str]:
+    """dvipng/dvisvgm call writing page1.<fmt>, page2.<fmt>, ... next to the DVI file."""
+    directory = os.path.dirname(dvi_path)
+    if fmt == "png":
+        return ["dvipng", "-D", str(dpi), "-o", os.path.join(directory, "page%d.png"), dvi_path]
+    return ["dvisvgm", "--page=1-", "-o", os.path.join(directory, "page%p.svg"), dvi_path]
+
+
+def page_paths(directory: str, count: int, fmt: str) -> list[str]:
+    return [os.path.join(directory, f"page{i}.{fmt}") for i in range(1, count + 1)]
+
+
+def write_document(workdir: str, expressions: list[str], preamble: str, precompiled: bool = False) -> str:
+    tex_path = os.path.join(workdir, "batch.tex")
+    with open(tex_path, "w", encoding="utf-8") as f:
+        f.write(build_document(expressions, preamble, precompiled))
+    return tex_path
+
+
+def collect_pages(workdir: str, count: int, fmt: str) -> list[bytes] | None:
+    """Reads the converted pages, or returns None if their number does not match the expressions."""
+    outputs = page_paths(workdir, count, fmt)
+    if not all(os.path.exists(path) for path in outputs) or os.path.exists(page_paths(workdir, count + 1, fmt)[-1]):
+        # Page count does not match the expressions, so pages cannot be attributed
+        return None
+    images = []
+    for path in outputs:
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+
+def _missing_tool(e: FileNotFoundError) -> RenderError:
+    return RenderError(f"Command '{e.filename}' not found; install LaTeX and dvipng/dvisvgm.")
+
+
+async def run_async(command: list[str], cwd: str, timeout: float = COMPILE_TIMEOUT, env: dict | None = None) -> bool:
+    """Runs one TeX tool without blocking the event loop; the process is killed after `timeout` seconds."""
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *command, cwd=cwd, env=env,
+            stdin=asyncio.subprocess.DEVNULL, stdout=asyncio.subprocess.DEVNULL, stderr=asyncio.subprocess.DEVNULL,
+        )
+    except FileNotFoundError as e:
+        raise _missing_tool(e) from e
+    try:
+        await asyncio.wait_for(process.wait(), timeout)
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        # Also reached when the awaiting task is cancelled; never leave a TeX process behind
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    return process.returncode == 0
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class LatexRenderer:
+    """
+    Renders LaTeX expressions to images, many per TeX compile.
+
+    Missing expressions are typeset together as pages of one document, which
+    is compiled once and split into per-page images. Every compile runs in
+    its own temporary directory, so concurrent renders never share files.
+    Images are cached under a hash of (expression, preamble, dpi, format);
+    if a batch fails to compile it is split in half until the bad expression
+    is isolated, and that expression alone renders as None. The preamble is
+    loaded from a precompiled format rather than parsed on every compile.
+    """
+
+    def __init__(self, preamble: str = DEFAULT_PREAMBLE, cache_dir: str = RENDER_CACHE_DIR,
+                 use_format: bool = USE_PRECOMPILED_FORMAT):
+        self.preamble = preamble
+        self.cache_dir = cache_dir
+        self.format_dir = os.path.join(cache_dir, "formats")
+        self.use_format = use_format
+        self.compiles = 0
+
+    def format_name(self) -> str | None:
+        """The precompiled format for this preamble (built on first use), or None to compile the preamble each time."""
+        if not self.use_format:
+            return None
+        try:
+            return ensure_format("latex", document_header(self.preamble), self.format_dir)
+        except FileNotFoundError as e:
+            raise _missing_tool(e) from e
+
+    def path_for(self, expression: str, dpi: int = 300, fmt: str = "png") -> str:
+        key = render_key(expression, self.preamble, dpi, fmt)
+        return os.path.join(self.cache_dir, key[:2], f"{key}.{fmt}")
+
+    def cached(self, expression: str, dpi: int = 300, fmt: str = "png") -> str | None:
+        """The stored image for `expression` if it has been rendered already; never compiles."""
+        path = self.path_for(expression, dpi, fmt)
+        return path if expression.strip() and os.path.exists(path) else None
+
+    def render(self, expression: str, dpi: int = 300, fmt: str = "png") -> str:
+        path = self.render_many([expression], dpi, fmt)[0]
+        if path is None:
+            raise RenderError(f"Could not render expression: {expression[:80]!r}")
+        return path
+
+    def render_many(self, expressions: list[str], dpi: int = 300, fmt: str = "png") -> list[str | None]:
+        """Returns the cached image path for each expression (None where it failed), compiling the misses in one batch."""
+        if fmt not in RENDER_FORMATS:
+            raise ValueError(f"Invalid format '{fmt}'. Choose one of {RENDER_FORMATS}.")
+        paths = [self.path_for(expression, dpi, fmt) for expression in expressions]
+        missing = list(dict.fromkeys(
+            expression for expression, path in zip(expressions, paths) if expression.strip() and not os.path.exists(path)
+        ))
+        if missing:
+            for expression, image in zip(missing, self._render_batch(missing, dpi, fmt)):
+                if image is not None:
+                    _write_atomic(self.path_for(expression, dpi, fmt), image)
+        return [path if expression.strip() and os.path.exists(path) else None for expression, path in zip(expressions, paths)]
+
+    def _render_batch(self, expressions: list[str], dpi: int, fmt: str) -> list[bytes | None]:
+        images = self._compile(expressions, dpi, fmt)
+        if images is not None:
+            return images
+        if len(expressions) == 1:
+            print(f"    - LaTeX failed for expression: {expressions[0][:80]!r}")
+            return [None]
+        middle = len(expressions) // 2
+        return self._render_batch(expressions[:middle], dpi, fmt) + self._render_batch(expressions[middle:], dpi, fmt)
+
+    def _compile(self, expressions: list[str], dpi: int, fmt: str) -> list[bytes] | None:
+        """Typesets all expressions in one compile; returns the page images, or None if the batch failed."""
+        format_name = self.format_name()
+        self.compiles += 1
+        with tempfile.TemporaryDirectory(prefix="latex_render_") as workdir:
+            tex_path = write_document(workdir, expressions, self.preamble, precompiled=format_name is not None)
+            try:
+                latex = subprocess.run(
+                    latex_command(tex_path, format_name), cwd=workdir, capture_output=True, timeout=COMPILE_TIMEOUT,
+                    env=format_env(self.format_dir),
+                )
+                if latex.returncode != 0:
+                    return None
+                subprocess.run(
+                    convert_command(os.path.join(workdir, "batch.dvi"), fmt, dpi),
+                    cwd=workdir, capture_output=True, timeout=COMPILE_TIMEOUT, check=True,
+                )
+            except FileNotFoundError as e:
+                raise _missing_tool(e) from e
+            except (subprocess.CalledProcessError, subprocess.TimeoutExpired):
+                return None
+            return collect_pages(workdir, len(expressions), fmt)
+
+
+class AsyncLatexRenderer(LatexRenderer):
+    """
+    Renders LaTeX from inside an event loop without blocking it.
+
+    Jobs go onto a queue served by `workers` tasks, so no more than that many
+    TeX processes run at once however many chats are asking. A worker takes
+    every job waiting (up to RENDER_BATCH_SIZE) and typesets them in one
+    compile. A job that is queued or compiling is shared by every caller
+    asking for the same image. Compiles that overrun COMPILE_TIMEOUT are
+    killed, and callers stop waiting after their own `timeout`. Both kinds
+    of renderer use the same image store.
+    """
+
+    def __init__(self, preamble: str = DEFAULT_PREAMBLE, cache_dir: str = RENDER_CACHE_DIR,
+                 use_format: bool = USE_PRECOMPILED_FORMAT, workers: int = RENDER_WORKERS):
+        super().__init__(preamble, cache_dir, use_format)
+        self.workers = workers
+        self.shared = 0
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._pending: dict[str, asyncio.Future] = {}
+
+    async def render(self, expression: str, dpi: int = 300, fmt: str = "png", timeout: float | None = JOB_TIMEOUT) -> str:
+        path = (await self.render_many([expression], dpi, fmt, timeout))[0]
+        if path is None:
+            raise RenderError(f"Could not render expression (failed or timed out): {expression[:80]!r}")
+        return path
+
+    async def render_many(self, expressions: list[str], dpi: int = 300, fmt: str = "png",
+                          timeout: float | None = JOB_TIMEOUT) -> list[str | None]:
+        """Returns the stored image path for each expression; None where it failed or was not ready within `timeout`."""
+        if fmt not in RENDER_FORMATS:
+            raise ValueError(f"Invalid format '{fmt}'. Choose one of {RENDER_FORMATS}.")
+        futures = [
+            self._submit(expression, dpi, fmt) for expression in dict.fromkeys(expressions)
+            if expression.strip() and self.cached(expression, dpi, fmt) is None
+        ]
+        if futures:
+            # Jobs still running at the timeout carry on for the other callers and for the store
+            done, _ = await asyncio.wait(futures, timeout=timeout)
+            # Read every outcome so no failure goes unretrieved, then raise the first
+            errors = [future.exception() for future in done if not future.cancelled() and future.exception()]
+            if errors:
+                raise errors[0]
+        return [self.cached(expression, dpi, fmt) for expression in expressions]
+
+    async def close(self) -> None:
+        """Stops the workers; jobs still queued are cancelled."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        for future in self._pending.values():
+            future.cancel()
+        self._queue, self._tasks, self._pending = None, [], {}
+
+    def _submit(self, expression: str, dpi: int, fmt: str) -> asyncio.Future:
+        key = render_key(expression, self.preamble, dpi, fmt)
+        future = self._pending.get(key)
+        if future is not None:
+            self.shared += 1
+            return future
+        if self._queue is None:
+            # Started lazily so the workers belong to the loop that uses them
+            self._queue = asyncio.Queue()
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        self._queue.put_nowait((key, expression, dpi, fmt))
+        return future
+
+    async def _worker(self) -> None:
+        while True:
+            jobs = [await self._queue.get()]
+            while len(jobs) < RENDER_BATCH_SIZE and not self._queue.empty():
+                jobs.append(self._queue.get_nowait())
+            batches = {}
+            for job in jobs:
+                batches.setdefault(job[2:], []).append(job)
+            for (dpi, fmt), batch in batches.items():
+                try:
+                    images = await self._render_batch_async([expression for _, expression, _, _ in batch], dpi, fmt)
+                    for (key, expression, _, _), image in zip(batch, images):
+                        if image is not None:
+                            _write_atomic(self.path_for(expression, dpi, fmt), image)
+                        self._finish(key)
+                except Exception as e:
+                    # Anything else (a full disk, a hung `--version`) must still resolve every waiting caller
+                    if isinstance(e, FileNotFoundError):
+                        e = _missing_tool(e)
+                    elif not isinstance(e, RenderError):
+                        e = RenderError(f"Rendering failed: {e}")
+                    for key, *_ in batch:
+                        self._finish(key, error=e)
+
+    def _finish(self, key: str, error: Exception | None = None) -> None:
+        future = self._pending.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(None)
+
+    async def _render_batch_async(self, expressions: list[str], dpi: int, fmt: str) -> list[bytes | None]:
+        images = await self._compile_async(expressions, dpi, fmt)
+        if images is not None:
+            return images
+        if len(expressions) == 1:
+            print(f"    - LaTeX failed for expression: {expressions[0][:80]!r}")
+            return [None]
+        middle = len(expressions) // 2
+        return await self._render_batch_async(expressions[:middle], dpi, fmt) + await self._render_batch_async(expressions[middle:], dpi, fmt)
+
+    async def _compile_async(self, expressions: list[str], dpi: int, fmt: str) -> list[bytes] | None:
+        # The first compile dumps the format; keep that off the event loop too
+        format_name = await asyncio.to_thread(self.format_name)
+        self.compiles += 1
+        with tempfile.TemporaryDirectory(prefix="latex_render_") as workdir:
+            tex_path = write_document(workdir, expressions, self.preamble, precompiled=format_name is not None)
+            if not await run_async(latex_command(tex_path, format_name), workdir, env=format_env(self.format_dir)):
+                return None
+            if not await run_async(convert_command(os.path.join(workdir, "batch.dvi"), fmt, dpi), workdir):
+                return None
+            return collect_pages(workdir, len(expressions), fmt)
+
+def solution_to_latex(text: str) -> str:
+    """Keeps the line structure of an extracted problem or solution when it is typeset."""
+    return "\n\n".join(line for line in text.split("\n") if line.strip())
+
+
+def solution_fields(json_path: str) -> list[tuple]:
+    """(record id, field, LaTeX) for every ex_prob and solution in an asinc_pase.py output file."""
+    return [(record.get("id"), field, solution_to_latex(record[field]))
+            for record in iter_records(json_path) for field in ("ex_prob", "solution") if record.get(field)]
+
+
+def _by_record(fields: list[tuple], paths: list[str | None]) -> dict:
+    rendered = {}
+    for (record_id, field, _), path in zip(fields, paths):
+        rendered.setdefault(record_id, {})[field] = path
+    return rendered
+
+
+def render_solutions(json_path: str, renderer: LatexRenderer | None = None, dpi: int = 300, fmt: str = "png") -> dict:
+    """Renders every ex_prob and solution in an asinc_pase.py output file; returns {record id: {field: image path}}."""
+    renderer = renderer or LatexRenderer()
+    fields = solution_fields(json_path)
+    return _by_record(fields, renderer.render_many([expression for _, _, expression in fields], dpi, fmt))
+
+
+async def prerender_solutions(json_path: str, renderer: AsyncLatexRenderer, dpi: int = 300, fmt: str = "png",
+                              timeout: float | None = PRERENDER_TIMEOUT) -> dict:
+    """
+    Fills the image store with a whole unit ahead of time, compiling on all workers.
+
+    A bot then sends `renderer.cached(solution_to_latex(record[field]))`
+    straight away, with no compile on the request path. Expressions not
+    rendered within `timeout` come back as None.
+    """
+    fields = solution_fields(json_path)
+    paths = await renderer.render_many([expression for _, _, expression in fields], dpi, fmt, timeout=timeout)
+    return _by_record(fields, paths)
+
+
+async def _prerender(json_path: str) -> tuple[AsyncLatexRenderer, dict]:
+    renderer = AsyncLatexRenderer()
+    try:
+        return renderer, await prerender_solutions(json_path, renderer)
+    finally:
+        await renderer.close()
+
+
+if __name__ == "__main__":
+    # Usage: python latex_render.py [solutions.json] [output_dir]
+    json_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(os.path.dirname(os.path.abspath(__file__)), "Grade_12_math_example_and_solution_async.json")
+    output_dir = sys.argv[2] if len(sys.argv) > 2 else None
+    renderer, rendered = asyncio.run(_prerender(json_path))
+    count = sum(1 for fields in rendered.values() for path in fields.values() if path)
+    print(f"Rendered {count} images from '{json_path}' in {renderer.compiles} compile(s) on {renderer.workers} worker(s).")
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        for record_id, fields in rendered.items():
+            for field, path in fields.items():
+                if path:
+                    shutil.copyfile(path, os.path.join(output_dir, f"{record_id}_{field}{os.path.splitext(path)[1]}"))
@@ -5,16 +5,25 @@ import json
 from dotenv import load_dotenv
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 import asyncio
+import sys
+
+# Shared helpers live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from record_io import write_records
+# OCR and the page store live with the other extraction helpers
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "parse_pdf"))
+from ocr import ocr_low_text_pages
+from page_store import PageTextStore
 
 # This function remains the same
-def extract_text_from_pages(pages):
-    """Extracts text from a list of pdfplumber page objects."""
+def extract_text_from_pages(pages, store=None):
+    """Extracts text from a list of pdfplumber page objects, through the PageTextStore when one is given."""
     if not pages:
         return ""
     
     full_text = ""
     for page in pages:
-        page_text = page.extract_text()
+        page_text = store.text(page) if store is not None else page.extract_text()
         if page_text:
             full_text += page_text + f"\n--- Page {page.page_number} ---\n"
     return full_text
@@ -94,10 +103,9 @@ def extract_headers_and_text_with_gemini(api_key, text_chunk, last_topic, curren
 
 # This function remains the same
 def save_data_to_json(data_list, output_path):
-    """Saves the list of dictionaries to a JSON file."""
+    """Saves the list of dictionaries to a JSON file (JSONL for a .jsonl path)."""
     try:
-        with open(output_path, 'w', encoding='utf-8') as f:
-            json.dump(data_list, f, indent=4)
+        write_records(output_path, data_list, ensure_ascii=True)
         return True, None
     except Exception as e:
         return False, f"Error saving to JSON file: {e}"
@@ -136,6 +144,10 @@ def main():
         with pdfplumber.open(INPUT_PDF_PATH) as pdf:
             num_total_pages = len(pdf.pages)
             print(f"Total pages in document: {num_total_pages}. Processing in batches of {PAGES_PER_BATCH} with {PAGE_OVERLAP} page overlap.")
+            store = PageTextStore(INPUT_PDF_PATH)
+            # Scanned pages get their text from OCR before the batches are built
+            unit_pages = [page for pages in PAGE_CHUNKS.values() for page in pdf.pages[pages['start'] - 1:pages['end']]]
+            ocr_low_text_pages(INPUT_PDF_PATH, unit_pages, store)
             
             for chunk_name, pages in PAGE_CHUNKS.items():
                 start_page = pages['start']
@@ -162,7 +174,7 @@ def main():
                     if not page_batch:
                         continue
 
-                    batch_text = extract_text_from_pages(page_batch)
+                    batch_text = extract_text_from_pages(page_batch, store)
                     
                     if not batch_text.strip():
                         print("     No text extracted from this batch. Skipping.")
@@ -0,0 +1,51 @@
+import json
+import os
+import random
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import record_io
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "records.json")
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def read(self, text: str, chunk: int) -> list:
+        with open(self.path, "w", encoding="utf-8") as f:
+            f.write(text)
+        with mock.patch.object(record_io, "READ_CHUNK", chunk):
+            return list(record_io.iter_records(self.path))
+
+    def test_float_split_after_point_or_exponent(self):
+        # The first chunk ends right after "1" of "1.5", then after "2." of "2.5e3"
+        for text, expected in (("[" + " " * (1 << 16) + "1.5]", [1.5]), ('["ab", 2.5e3, -1E-2]', ["ab", 2500.0, -0.01])):
+            for chunk in range(1, 8):
+                self.assertEqual(self.read(text, chunk), expected, f"READ_CHUNK={chunk}")
+        self.assertEqual(self.read("[" + " " * ((1 << 16) - 2) + "1.5]", 1 << 16), [1.5])
+
+    def test_random_arrays_with_tiny_chunks(self):
+        rng = random.Random(0)
+        values = [0, -7, 12345, 1.5, -0.25, 6.02e23, 1e-9, True, False, None, "x", "数", {"a": [1.25, 2]}]
+        for _ in range(200):
+            records = [rng.choice(values) for _ in range(rng.randint(0, 12))]
+            text = json.dumps(records, indent=rng.choice([None, 4]))
+            for chunk in (1, 2, 3, 5):
+                self.assertEqual(self.read(text, chunk), records, f"READ_CHUNK={chunk}: {text}")
+
+    def test_round_trip_with_write_records(self):
+        records = [{"id": i, "score": i / 3, "text": f"chunk {i}"} for i in range(50)]
+        self.assertEqual(record_io.write_records(self.path, records), 50)
+        with mock.patch.object(record_io, "READ_CHUNK", 4):
+            self.assertEqual(list(record_io.iter_records(self.path)), records)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,39 @@
 import PyPDF2
 import re
 import os
+from bisect import bisect_right
+from collections import deque
+
+# --- CHUNKING CONFIGURATION ---
+CHUNK_TOKEN_BUDGET = 256   # Tokens per chunk for iter_chunks (about 4 characters per token)
+OVERLAP_TOKENS = 48        # Tokens of trailing sentences repeated at the start of the next chunk
+# Words that end with a period without ending the sentence
+ABBREVIATIONS = frozenset({
+    "mr", "mrs", "ms", "dr", "prof", "sr", "jr", "st", "mt", "no", "vol", "fig", "figs", "eq", "eqs",
+    "vs", "cf", "ca", "approx", "dept", "inc", "ltd", "co", "corp", "jan", "feb", "mar", "apr", "jun",
+    "jul", "aug", "sep", "sept", "oct", "nov", "dec", "p", "pp", "ch", "sec",
+})
+
+# End of a candidate sentence: terminal punctuation and closing quotes/brackets, followed by whitespace
+SENTENCE_END = re.compile(r'[.?!]+["\'\)\]]*(?=\s)')
+WORD_BEFORE = re.compile(r'[\w.]*\w$')
+NEXT_CHAR = re.compile(r'\S')
+CLOSING = '.?!"\')]'
+
+
+def iter_pdf_pages(pdf_path):
+    """Yields (page number, text) for each page of a PDF, reading pages one at a time."""
+    with open(pdf_path, 'rb') as file:
+        pdf_reader = PyPDF2.PdfReader(file)
+        print(f"PDF has {len(pdf_reader.pages)} pages.")
+        for page_num, page in enumerate(pdf_reader.pages):
+            try:
+                # Attempt to extract text and default to an empty string if None
+                page_text = page.extract_text()
+                if page_text:
+                    yield page_num + 1, page_text
+            except Exception as e:
+                print(f"Could not extract text from page {page_num + 1}: {e}")
 
 def extract_text_from_pdf(pdf_path):
     """
@@ -17,25 +50,136 @@ def extract_text_from_pdf(pdf_path):
         print(f"Error: The file was not found at {pdf_path}")
         return None
 
-    text = ""
     try:
-        with open(pdf_path, 'rb') as file:
-            pdf_reader = PyPDF2.PdfReader(file)
-            print(f"PDF has {len(pdf_reader.pages)} pages.")
-            for page_num, page in enumerate(pdf_reader.pages):
-                try:
-                    # Attempt to extract text and default to an empty string if None
-                    page_text = page.extract_text()
-                    if page_text:
-                        text += page_text
-                except Exception as e:
-                    print(f"Could not extract text from page {page_num + 1}: {e}")
+        # Joined once at the end instead of growing one string page by page
+        text = "".join(page_text for _, page_text in iter_pdf_pages(pdf_path))
         print("Successfully extracted text from PDF.")
         return text
     except Exception as e:
         print(f"An error occurred while reading the PDF: {e}")
         return None
 
+def _is_sentence_end(text, match):
+    """False for periods that end an abbreviation ("Dr.", "e.g.", "U.S.", "J.") or are followed by a lowercase word."""
+    if text[match.start():match.end()].rstrip(CLOSING[3:]) == ".":
+        word = WORD_BEFORE.search(text, max(0, match.start() - 32), match.start())
+        if word:
+            word = word.group()
+            if "." in word or word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isupper()):
+                return False
+    following = NEXT_CHAR.search(text, match.end())
+    return following is None or not following.group().islower()
+
+
+def sentence_spans(text, start=0, final=True, search_from=None):
+    """
+    Finds sentences in `text` from `start` on, as (start, end) offsets without surrounding whitespace.
+
+    With `final=False` the text may continue later, so the trailing
+    unterminated sentence is not returned; resume from the end of the last
+    span. `search_from` skips boundary candidates already rejected before it.
+    """
+    spans = []
+    for match in SENTENCE_END.finditer(text, max(start, search_from or 0)):
+        if not final and NEXT_CHAR.search(text, match.end()) is None:
+            # Whether this ends a sentence depends on the text still to come
+            break
+        if not _is_sentence_end(text, match):
+            continue
+        first = NEXT_CHAR.search(text, start, match.end())
+        if first:
+            spans.append((first.start(), match.end()))
+        start = match.end()
+    if final:
+        first = NEXT_CHAR.search(text, start)
+        if first:
+            spans.append((first.start(), len(text.rstrip())))
+    return spans
+
+
+def _fit(text, start, end, max_chars):
+    """Cuts an over-long sentence (text without terminal punctuation, like a table) at whitespace into pieces of at most `max_chars`."""
+    while end - start > max_chars:
+        cut = max(text.rfind(" ", start, start + max_chars), text.rfind("\n", start, start + max_chars))
+        if cut <= start:
+            cut = start + max_chars
+        yield start, cut
+        start = NEXT_CHAR.search(text, cut, end).start()
+    yield start, end
+
+
+def iter_chunks(pages, token_budget=CHUNK_TOKEN_BUDGET, overlap_tokens=OVERLAP_TOKENS):
+    """
+    Chunks a stream of (page number, text) pages by token budget, without holding the whole book.
+
+    Sentences are kept as offsets into one buffer that holds only the text
+    not yet emitted, and each chunk is a single slice of it; the overlap is the
+    trailing sentences of one chunk (up to `overlap_tokens`) reused by offset in
+    the next. A sentence longer than the budget is cut at whitespace to fit.
+    Yields {"chunk_text", "page_number", "end_page_number"} dicts, the pages
+    being where the chunk starts and ends.
+    """
+    buffer = ""
+    base = 0                # Absolute offset of buffer[0]
+    scanned = 0             # Absolute offset where the next sentence starts
+    page_offsets, page_numbers = [], []
+    window = deque()        # (start, end, tokens) of the sentences in the chunk being built
+    window_tokens = 0
+    fresh = 0               # Sentences in the window that no chunk has contained yet
+
+    def emit():
+        start, end = window[0][0], window[-1][1]
+        first = bisect_right(page_offsets, start) - 1
+        last = bisect_right(page_offsets, end - 1) - 1
+        return {
+            "chunk_text": buffer[start - base:end - base].replace("\n", " "),
+            "page_number": page_numbers[max(first, 0)],
+            "end_page_number": page_numbers[max(last, 0)],
+        }
+
+    def add(spans):
+        nonlocal window_tokens, fresh
+        for start, end in (piece for span in spans for piece in _fit(buffer, *span, token_budget * 4)):
+            tokens = (end - start) // 4 + 1
+            if window and window_tokens + tokens > token_budget:
+                yield emit()
+                # Keep the trailing sentences that fit in the overlap (and the budget), always moving forward
+                window_tokens -= window.popleft()[2]
+                while window and (window_tokens > overlap_tokens or window_tokens + tokens > token_budget):
+                    window_tokens -= window.popleft()[2]
+                fresh = 0
+            window.append((start + base, end + base, tokens))
+            window_tokens += tokens
+            fresh += 1
+
+    for page_number, text in pages:
+        if not text:
+            continue
+        page_offsets.append(base + len(buffer))
+        page_numbers.append(page_number)
+        # Candidates before the old end were already judged, except a trailing one that needed more text
+        search_from = len(buffer)
+        while search_from > scanned - base and (buffer[search_from - 1] in CLOSING or buffer[search_from - 1].isspace()):
+            search_from -= 1
+        # A page break separates words even when the extracted text does not end in whitespace
+        buffer += text + "\n"
+        spans = sentence_spans(buffer, scanned - base, final=False, search_from=search_from)
+        yield from add(spans)
+        if spans:
+            scanned = spans[-1][1] + base
+        # Drop text no later chunk can use; amortized, each character is copied a bounded number of times
+        keep = min(window[0][0] if window else scanned, scanned)
+        if keep - base > len(buffer) // 2:
+            buffer = buffer[keep - base:]
+            base = keep
+            first = max(bisect_right(page_offsets, base) - 1, 0)
+            del page_offsets[:first], page_numbers[:first]
+
+    yield from add(sentence_spans(buffer, scanned - base, final=True))
+    if window and fresh:
+        yield emit()
+
+
 def chunk_text_by_paragraph(text, sentences_per_chunk, overlap_sentences):
     """
     Chunks text by paragraphs with a specified number of sentences and overlap.
@@ -53,11 +197,9 @@ def chunk_text_by_paragraph(text, sentences_per_chunk, overlap_sentences):
         print("Warning: Input text is empty. Returning no chunks.")
         return []
     
-    # A more robust sentence splitting regex. It handles various sentence endings
-    # and avoids splitting on abbreviations like "Mr." or "U.S.".
+    # Sentence boundaries as offsets; abbreviations like "Mr.", "e.g." or "U.S." do not end a sentence.
     # For production use, a library like NLTK or spaCy is recommended for higher accuracy.
-    sentences = re.split(r'(?<!\w\.\w.)(?<![A-Z][a-z]\.)(?<=\.|\?|!)\s', text)
-    sentences = [s.strip().replace('\n', ' ') for s in sentences if s.strip()]
+    sentences = sentence_spans(text)
 
     if not sentences:
         print("Warning: No sentences were extracted from the text.")
@@ -79,9 +221,9 @@ def chunk_text_by_paragraph(text, sentences_per_chunk, overlap_sentences):
         # Define the end of the current chunk
         end = i + sentences_per_chunk
         
-        # Create the chunk by joining the sentences
-        chunk = " ".join(sentences[i:end])
-        chunks.append(chunk)
+        # Create the chunk as one slice of the text, from its first sentence to its last
+        last = min(end, len(sentences)) - 1
+        chunks.append(text[sentences[i][0]:sentences[last][1]].replace('\n', ' '))
         
         # Determine the starting point of the next chunk
         next_start = i + sentences_per_chunk - overlap_sentences
@@ -126,26 +268,19 @@ if __name__ == '__main__':
             print(f"Failed to create dummy PDF: {e}")
 
     # --- Processing ---
-    extracted_text = extract_text_from_pdf(PDF_FILE_PATH)
+    # Pages are read and chunked lazily, so the whole book is never held in memory.
+    # You can adjust the token budget and overlap for your specific needs.
+    if os.path.exists(PDF_FILE_PATH):
+        paragraph_chunks = iter_chunks(iter_pdf_pages(PDF_FILE_PATH), token_budget=CHUNK_TOKEN_BUDGET, overlap_tokens=OVERLAP_TOKENS)
 
-    if extracted_text:
-        # Chunk the text using the sentence-based paragraph method
-        # You can adjust these parameters for your specific needs
-        SENTENCES_PER_CHUNK = 5
-        OVERLAP_SENTENCES = 1
-        
-        paragraph_chunks = chunk_text_by_paragraph(
-            extracted_text, 
-            sentences_per_chunk=SENTENCES_PER_CHUNK, 
-            overlap_sentences=OVERLAP_SENTENCES
-        )
-        
         # --- Output ---
         # Print the first 3 chunks as an example
-        print(f"\n--- Displaying the first 3 (out of {len(paragraph_chunks)}) generated chunks ---")
-        for i, chunk in enumerate(paragraph_chunks[:3]):
-            print(f"\n[Chunk {i+1}]")
-            print(chunk)
+        print("\n--- Displaying the first 3 generated chunks ---")
+        for i, chunk in enumerate(paragraph_chunks):
+            if i == 3:
+                break
+            print(f"\n[Chunk {i+1}, pages {chunk['page_number']}-{chunk['end_page_number']}]")
+            print(chunk["chunk_text"])
             print("-" * 25)
-            
-        # You can now take the 'paragraph_chunks' list and use it for your embedding process.
+
+        # 'paragraph_chunks' is a generator: iterate it to feed your embedding process one chunk at a time.